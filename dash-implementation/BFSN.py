@@ -1,41 +1,183 @@
-from collections import defaultdict
-import pandas as pd
-def BFS4(cur_number, queue,df,visited,graph):
-    queue.append(cur_number)
-    visited[cur_number] = 0
-
-    # Initialize the list of tuples(component reachable from this number)
-    this_comp = set()
-    while queue:
-        cur_vertex = queue.pop(0)
-        cur_distance = visited[cur_vertex]
-
-        for node in graph[cur_vertex]:
-            if node not in visited:
-                queue.append(node)
-                # Add to a this component
-              #  tup = (cur_vertex, node) # what is tup doing?
-                this_comp.add(node)
-                this_comp.add(cur_vertex)
-                visited[node] = cur_distance + 1
-    return this_comp,visited
-
-
-## Using the BFS4 function and finding all components
-def bfs(numbers,df):
-    queue = []
-    visited = {}
-    graph = defaultdict(list)
-    #if df.at[i,'DateTime'] >= start_interval and df.at[i,'DateTime'] <= end_interval:
-    df.apply(lambda x:graph[x['Caller']].append(x['Receiver']),axis=1)
-    df.apply(lambda x:graph[x['Receiver']].append(x['Caller']),axis=1)
-    unique_callers = df["Caller"].unique()
-    unique_receivers = df["Receiver"].unique()
-    numbers_status = {numbers[i]: False for i in range(len(numbers))}
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+
+## Sparse (CSR) adjacency of the call graph, caller node -> receiver node
+def adjacency(df, n_nodes=None):
+    src = df['Caller_node'].to_numpy(dtype=np.int64)
+    dst = df['Receiver_node'].to_numpy(dtype=np.int64)
+    if n_nodes is None:
+        n_nodes = int(max(src.max(), dst.max())) + 1 if len(df) else 0
+    return csr_matrix((np.ones(len(src), dtype=np.int32), (src, dst)), shape=(n_nodes, n_nodes))
+
+
+## Memory held by sparse matrices and arrays
+def nbytes(*arrays):
+    return sum(a.data.nbytes + a.indices.nbytes + a.indptr.nbytes if hasattr(a, 'indptr') else a.nbytes
+               for a in arrays)
+
+
+## Connected components of every node of a call frame, computed in bulk.
+## connection is 'weak' (calls in either direction) or 'strong' (reachable both ways).
+class Components:
+    def __init__(self, df, connection='weak'):
+        self.count, self.labels = connected_components(adjacency(df), directed=True, connection=connection)
+        # Members of component c are order[offsets[c]:offsets[c+1]]
+        self.order = np.argsort(self.labels, kind='stable')
+        self.offsets = np.zeros(self.count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.labels, minlength=self.count), out=self.offsets[1:])
+
+    @property
+    def nbytes(self):
+        return nbytes(self.labels, self.order, self.offsets)
+
+    def label(self, node):
+        return int(self.labels[node]) if node < len(self.labels) else -1
+
+    # Node numbers in the same component as node (just node if it made no calls)
+    def members(self, node):
+        c = self.label(node)
+        if c < 0:
+            return np.array([node])
+        return self.order[self.offsets[c]:self.offsets[c + 1]]
+
+    # Members of each distinct component containing one of nodes, in order of first appearance
+    def of(self, nodes):
+        seen = set()
+        components = []
+        for node in nodes:
+            c = self.label(node)
+            if c >= 0 and c in seen:
+                continue
+            seen.add(c)
+            components.append(self.members(node))
+        return components
+
+
+## Using Components to find the components (sets of phone numbers) of the given numbers
+def bfs(numbers, df, connection='weak'):
+    codes = np.concatenate([df['Caller_node'].to_numpy(dtype=np.int64), df['Receiver_node'].to_numpy(dtype=np.int64)])
+    phones = np.concatenate([df['Caller'].to_numpy(), df['Receiver'].to_numpy()])
+    to_number = dict(zip(codes.tolist(), phones.tolist()))
+    to_code = {v: k for k, v in to_number.items()}
+    components = Components(df, connection)
+    seen = set()
     list_of_components = []
-    for it in range(len(numbers_status)):
-        if numbers_status[numbers[it]] == False:
-            numbers_status[numbers[it]] = True
-            cur_component,visited = BFS4( numbers[it], queue,df,visited,graph)
-            list_of_components.append(cur_component)
+    for number in numbers:
+        if number not in to_code:
+            list_of_components.append({number})  # Made no calls in df
+            continue
+        c = components.label(to_code[number])
+        if c not in seen:
+            seen.add(c)
+            list_of_components.append({to_number[n] for n in components.members(to_code[number]).tolist()})
     return list_of_components
+
+
+## Neighbourhood queries on a call frame: everyone within k hops, the shortest call chain
+## between two numbers (bidirectional BFS) and time-respecting paths, where every call of the
+## chain starts after the previous one. connection is 'weak' (calls in either direction) or
+## 'directed' (caller -> receiver only).
+class Neighbourhood:
+    def __init__(self, df, connection='weak'):
+        src = df['Caller_node'].to_numpy(dtype=np.int64)
+        dst = df['Receiver_node'].to_numpy(dtype=np.int64)
+        ts = df['Timestamp'].to_numpy().astype('datetime64[ns]').view(np.int64)
+        self.n_nodes = int(max(src.max(), dst.max())) + 1 if len(df) else 0
+        self.forward = adjacency(df, self.n_nodes)
+        if connection == 'weak':
+            self.forward = (self.forward + self.forward.T).tocsr()
+            src, dst, ts = np.concatenate([src, dst]), np.concatenate([dst, src]), np.concatenate([ts, ts])
+        self.backward = self.forward.T.tocsr()
+        # Calls in time order, for time-respecting paths
+        order = np.argsort(ts, kind='stable')
+        self.call_src, self.call_dst, self.call_ts = src[order], dst[order], ts[order]
+
+    @property
+    def nbytes(self):
+        return nbytes(self.forward, self.backward, self.call_src, self.call_dst, self.call_ts)
+
+    def _valid(self, nodes):
+        nodes = np.asarray(nodes, dtype=np.int64)
+        return nodes[(nodes >= 0) & (nodes < self.n_nodes)]
+
+    # Nodes within k hops of sources and their distance in hops, nearest first
+    def within(self, sources, k):
+        sources = np.unique(self._valid(sources))
+        distance = np.full(self.n_nodes, -1, dtype=np.int64)
+        distance[sources] = 0
+        frontier = sources
+        for hop in range(1, k + 1):
+            frontier = np.unique(self.forward[frontier].indices)
+            frontier = frontier[distance[frontier] < 0]
+            if not len(frontier):
+                break
+            distance[frontier] = hop
+        nodes = np.flatnonzero(distance >= 0)
+        order = np.argsort(distance[nodes], kind='stable')
+        return nodes[order], distance[nodes[order]]
+
+    # One BFS step from frontier, recording the parent of every newly reached node
+    @staticmethod
+    def _step(matrix, frontier, seen, parent):
+        step = matrix[frontier].tocoo()
+        new = ~seen[step.col]
+        reached, first = np.unique(step.col[new], return_index=True)
+        parent[reached] = frontier[step.row[new][first]]
+        seen[reached] = True
+        return reached
+
+    # Shortest call chain from a to b as a list of nodes, None if there is none
+    def shortest_path(self, a, b):
+        if len(self._valid([a, b])) < 2:
+            return None
+        if a == b:
+            return [a]
+        seen = [np.zeros(self.n_nodes, dtype=bool), np.zeros(self.n_nodes, dtype=bool)]
+        parent = [np.full(self.n_nodes, -1, dtype=np.int64), np.full(self.n_nodes, -1, dtype=np.int64)]
+        frontier = [np.array([a]), np.array([b])]
+        seen[0][a] = seen[1][b] = True
+        while len(frontier[0]) and len(frontier[1]):
+            # Grow the smaller side, forward from a or backward from b
+            side = 0 if len(frontier[0]) <= len(frontier[1]) else 1
+            matrix = self.forward if side == 0 else self.backward
+            frontier[side] = self._step(matrix, frontier[side], seen[side], parent[side])
+            meet = frontier[side][seen[1 - side][frontier[side]]]
+            if len(meet):
+                path, node = [], int(meet[0])
+                while node != -1:
+                    path.insert(0, node)
+                    node = int(parent[0][node])
+                node = int(parent[1][path[-1]])
+                while node != -1:
+                    path.append(node)
+                    node = int(parent[1][node])
+                return path
+        return None
+
+    # Earliest arriving chain of calls from a to b, each starting after the previous one, as
+    # (caller node, receiver node, timestamp ns) hops; None if b cannot be reached in max_hops calls.
+    # Every round relaxes all calls at once, so round r finds the earliest arrivals in r calls.
+    def time_respecting_path(self, a, b, max_hops=10):
+        if len(self._valid([a, b])) < 2 or a == b:
+            return None
+        arrival = np.full(self.n_nodes, np.iinfo(np.int64).max, dtype=np.int64)
+        arrival[a] = np.iinfo(np.int64).min
+        reached_by = np.full(self.n_nodes, -1, dtype=np.int64)  # Call reaching each node
+        for _ in range(max_hops):
+            candidates = np.flatnonzero((arrival[self.call_src] < self.call_ts) & (self.call_ts < arrival[self.call_dst]))
+            if not len(candidates):
+                break
+            # Calls are in time order, so the first candidate of each node is its earliest arrival
+            nodes, first = np.unique(self.call_dst[candidates], return_index=True)
+            arrival[nodes] = self.call_ts[candidates[first]]
+            reached_by[nodes] = candidates[first]
+        if reached_by[b] < 0:
+            return None
+        hops, node = [], b
+        while node != a:
+            call = reached_by[node]
+            hops.insert(0, (int(self.call_src[call]), int(self.call_dst[call]), int(self.call_ts[call])))
+            node = int(self.call_src[call])
+        return hops
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+from ingest import load_calls
+from query import CallIndex
+from stats import nodeStats
+from BFSN import Components
+
+#### Analysis Core ####
+# The call store and the per-subscriber analyses behind the app's statistics panel, usable
+# without the app. Importing this loads numpy, pandas and scipy only (no Dash, plotly,
+# matplotlib or graphviz) and reads no data; dash_script.py and the batch report
+# (report.py) both open their calls through open_calls.
+
+
+# Calls (query.CallIndex, or sql_store.SQLCallStore for the sqlite/duckdb backends) and the subscriber dictionary.
+# read_only opens the database read-only, for several processes reading it at once.
+def open_calls(data_path, backend='pandas', read_only=False):
+    if backend == 'pandas':
+        df, subscribers = load_calls(data_path)
+        return CallIndex(df), subscribers
+    from sql_store import open_store
+    return open_store(data_path, backend, read_only)
+
+
+# start <= Timestamp < end, every day of the calls by default (end is a day, inclusive)
+def time_window(calls, start=None, end=None):
+    start = pd.Timestamp(start if start is not None else calls.days[0]).normalize()
+    end = pd.Timestamp(end if end is not None else calls.days[-1]).normalize() + pd.Timedelta(days=1)
+    return start, end
+
+
+# The k numbers each node in codes talked to most (calls either way, ties to the one seen first)
+# as topTalker1..k with their call counts topTalkerCalls1..k
+def top_talkers(df, codes, k=3):
+    caller = df['Caller_node'].to_numpy(dtype=np.int64)
+    receiver = df['Receiver_node'].to_numpy(dtype=np.int64)
+    rows = np.arange(len(df))
+    other = receiver != caller
+    pairs = pd.DataFrame({'node': np.concatenate([caller, receiver[other]]),
+                          'other': np.concatenate([df['Receiver'].to_numpy(), df['Caller'].to_numpy()[other]]),
+                          'row': np.concatenate([rows, rows[other]])})
+    pairs = pairs[np.isin(pairs['node'].to_numpy(), codes)]
+    g = pairs.groupby(['node', 'other'])['row'].agg(['size', 'min']).reset_index()
+    g = g.sort_values(['node', 'size', 'min'], ascending=[True, False, True])
+    g['rank'] = g.groupby('node').cumcount() + 1
+    g = g[g['rank'] <= k]
+    table = pd.DataFrame(index=pd.Index(np.asarray(codes, dtype=np.int64)))
+    for i in range(1, k + 1):
+        top = g[g['rank'] == i].set_index('node')
+        other = top['other'].astype(object).reindex(table.index)
+        table['topTalker' + str(i)] = other.where(other.notna(), "None")
+        table['topTalkerCalls' + str(i)] = top['size'].reindex(table.index).fillna(0).astype(np.int64)
+    return table
+
+
+# Statistics (stats.nodeStats) and top talkers of the nodes in codes over their calls in a time window.
+# Only the calls of these nodes are loaded; nodes without calls in the window are left out.
+def subscriber_report(calls, codes, start, end, talkers=3):
+    codes = np.unique(np.asarray(codes, dtype=np.int64))
+    df = calls.select(start, end, (0, calls.max_duration), 3, list(codes), list(codes))
+    stats = nodeStats(df)
+    stats = stats[stats.index.isin(codes)]
+    return stats.join(top_talkers(df, stats.index.to_numpy(), talkers))
+
+
+# Component label and size of every node in codes in the call graph of a time window
+# (all calls when the window covers every day); nodes without calls are their own component
+def component_table(calls, codes, start, end):
+    if start <= pd.Timestamp(calls.days[0]) and end > pd.Timestamp(calls.days[-1]):
+        df = pd.DataFrame(calls.edges(), columns=['Caller_node', 'Receiver_node'])
+    else:
+        df = calls.select(start, end, (0, calls.max_duration))
+    n_nodes = int(max(np.max(codes, initial=-1), df['Caller_node'].max() if len(df) else -1,
+                      df['Receiver_node'].max() if len(df) else -1)) + 1
+    # A self loop on the largest id makes the graph cover every target, with or without calls
+    loops = pd.DataFrame({'Caller_node': [n_nodes - 1], 'Receiver_node': [n_nodes - 1]})
+    components = Components(pd.concat([df[['Caller_node', 'Receiver_node']], loops]))
+    sizes = np.bincount(components.labels)
+    labels = components.labels[np.asarray(codes, dtype=np.int64)]
+    return pd.DataFrame({'component': labels, 'componentSize': sizes[labels]},
+                        index=pd.Index(np.asarray(codes, dtype=np.int64)))
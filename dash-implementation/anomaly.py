@@ -0,0 +1,174 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+#### Suspicious Patterns ####
+# Nightly pass that computes a feature matrix with one row per number and flags outliers:
+#   burst     many calls packed into one window (busiest window vs. the number's average over
+#             every window of the time range, the empty ones included)
+#   callOnly  makes calls but never receives any
+#   imeiChurn switches handsets (IMEI) between its calls far more than others do
+#   night     unusual share of its calls at night
+# Every feature is computed for all numbers at once with unique/bincount over the calls of
+# the time range, one sweep per feature and no per-number loops. Outliers are scored with
+# robust z-scores (median and MAD of the numbers with enough calls to be flagged) so a few
+# extreme numbers do not hide each other. Live-ingested batches are scored as well. The
+# matrix and the scores are stored as a Feather file next to the data (calls.csv ->
+# calls.anomalies.feather); the app offers the flagged numbers as caller presets.
+#
+#   python anomaly.py                                   (every day, 1h and 1D burst windows)
+#   python anomaly.py --start 2020-06-01 --end 2020-06-30 --windows 15min 1h
+
+windows = ['1h', '1D']  # Burst windows
+night_hours = (0, 5)  # Night is start <= hour < end
+min_calls = 5  # Calls a number needs before it can be flagged
+threshold = 3.5  # Robust z-score above which a number is flagged
+patterns = ['burst', 'callOnly', 'imeiChurn', 'night']
+
+
+def scores_path(data_path):
+    return os.path.splitext(data_path)[0] + '.anomalies.feather'
+
+
+# Per-node feature matrix (indexed by node) of the calls in df, which is in time order.
+# start <= Timestamp < end is the time range scored, the range of the calls by default.
+def features(df, windows=windows, night_hours=night_hours, start=None, end=None):
+    caller = df['Caller_node'].to_numpy(dtype=np.int64)
+    receiver = df['Receiver_node'].to_numpy(dtype=np.int64)
+    ts = df['Timestamp'].to_numpy().astype('datetime64[ns]').view(np.int64)
+    dur = df['Duration'].to_numpy(dtype=np.int64)
+    start = pd.Timestamp(start).value if start is not None else int(ts.min(initial=0))
+    end = pd.Timestamp(end).value if end is not None else int(ts.max(initial=0)) + 1
+    # Every call counts once for each of its (distinct) ends, as in stats.nodeStats
+    other = receiver != caller
+    node = np.concatenate([caller, receiver[other]])
+    row = np.concatenate([np.arange(len(df)), np.flatnonzero(other)])
+    nodes, inv = np.unique(node, return_inverse=True)
+    inv = inv.ravel()
+    k = len(nodes)
+    at_caller = np.searchsorted(nodes, caller)
+    at_receiver = np.searchsorted(nodes, receiver)
+
+    def pairs(at, values):  # Distinct (node, value) pairs, with their counts
+        values = values - values.min(initial=0)
+        span = int(values.max(initial=0)) + 1
+        keys, counts = np.unique(at * span + values, return_counts=True)
+        return keys // span, counts
+
+    def distinct(at, values):  # Distinct values per node
+        return np.bincount(pairs(at, values)[0], minlength=k)
+
+    calls = np.bincount(inv, minlength=k)
+    table = pd.DataFrame({'calls': calls,
+                          'outgoing': np.bincount(at_caller, minlength=k),
+                          'incoming': np.bincount(at_receiver, minlength=k)}, index=nodes)
+    table['outShare'] = table['outgoing'] / np.maximum(table['outgoing'] + table['incoming'], 1)
+    table['callees'] = distinct(at_caller, receiver)
+    table['callers'] = distinct(at_receiver, caller)
+    table['meanDur'] = np.bincount(inv, weights=dur[row], minlength=k) / calls
+    hour = (ts // (3600 * 10**9)) % 24
+    night = (hour >= night_hours[0]) & (hour < night_hours[1])
+    table['nightShare'] = np.bincount(inv, weights=night[row], minlength=k) / calls
+    # Handsets and towers belong to the caller
+    imei = pd.factorize(df['IMEI'].astype(str))[0]
+    table['imeis'] = distinct(at_caller, imei)
+    table['towers'] = distinct(at_caller, pd.factorize(df['TowerID'].astype(str))[0])
+    order = np.argsort(at_caller, kind='stable')  # Each caller's calls in time order
+    switched = (at_caller[order][1:] == at_caller[order][:-1]) & (imei[order][1:] != imei[order][:-1])
+    table['imeiSwitches'] = np.bincount(at_caller[order][1:][switched], minlength=k)
+    for window in windows:
+        width = pd.Timedelta(window).value
+        at, counts = pairs(inv, ts[row] // width)
+        busiest = np.zeros(k, dtype=np.int64)
+        np.maximum.at(busiest, at, counts)
+        n_windows = max((end - 1) // width - start // width + 1, 1)  # Windows of the range, empty or not
+        table['maxCalls_' + window] = busiest
+        table['burst_' + window] = busiest / (calls / n_windows)
+    return table
+
+
+# Robust z-scores of x: (x - median) / (1.4826 MAD), falling back to the standard deviation.
+# The median and MAD are taken over x[reference] (all of x by default).
+def robust_z(x, reference=None):
+    x = np.asarray(x, dtype=np.float64)
+    base = x if reference is None else x[reference]
+    if not len(base):
+        return np.zeros_like(x)
+    median = np.median(base)
+    scale = 1.4826 * np.median(np.abs(base - median))
+    if scale == 0:
+        scale = base.std()
+    return (x - median) / (scale or 1.0)
+
+
+# Pattern scores, flagged patterns ('burst,night') and an overall score (highest pattern score) for a feature matrix
+def score(table, threshold=threshold, min_calls=min_calls):
+    busy = table['calls'].to_numpy() >= min_calls
+    bursts = [c for c in table.columns if c.startswith('burst_')]
+    scores = pd.DataFrame(index=table.index)
+    # Numbers with a handful of calls have extreme ratios by chance, they do not set the baseline
+    scores['burst'] = np.max([robust_z(np.log1p(table[c]), busy) for c in bursts], axis=0) if bursts else 0.0
+    scores['callOnly'] = np.where((table['incoming'] == 0) & (table['outgoing'] >= min_calls),
+                                  threshold + np.log1p(np.maximum(table['outgoing'] - min_calls, 0)), 0.0)
+    scores['imeiChurn'] = robust_z(np.log1p(table['imeiSwitches']), busy)
+    scores['night'] = robust_z(table['nightShare'], busy)
+    flagged = (scores[patterns].to_numpy() >= threshold) & busy[:, None]
+    scores['flagged'] = [','.join(p for p, f in zip(patterns, row) if f) for row in flagged]
+    scores['score'] = np.where(flagged, scores[patterns].to_numpy(), 0.0).max(axis=1, initial=0.0)
+    return scores
+
+
+def save_scores(table, path):
+    table.rename_axis('node').reset_index().to_feather(path)
+
+
+def load_scores(path):
+    return pd.read_feather(path).set_index('node')
+
+
+# Flagged numbers of a pattern (any pattern for 'all'), highest score first
+def flagged_numbers(table, pattern='all', limit=None):
+    if pattern == 'all':
+        hits = table[table['flagged'] != '']
+    else:
+        hits = table[table['flagged'].str.split(',').apply(lambda f: pattern in f)]
+    hits = hits.sort_values('score', ascending=False, kind='stable')
+    return hits['number'].tolist()[:limit]
+
+
+def main(argv=None):
+    from analysis import open_calls, time_window
+    from ingest import cache_paths
+    from stream import LiveData, stream_dir
+    parser = argparse.ArgumentParser(description='Feature matrix and suspicious pattern scores of every number')
+    parser.add_argument('--data', default=os.environ.get('CDR_DATA', './data/data.csv'), help='calls (.csv or .parquet)')
+    parser.add_argument('--backend', default=os.environ.get('CDR_BACKEND', 'pandas'), help='pandas, sqlite or duckdb')
+    parser.add_argument('--start', help='first day (default: first day of the calls)')
+    parser.add_argument('--end', help='last day, inclusive (default: last day of the calls)')
+    parser.add_argument('--windows', nargs='+', default=windows, help='burst windows (pandas offsets, e.g. 15min 1h 1D)')
+    parser.add_argument('--night', type=int, nargs=2, default=night_hours, help='night hours, start end')
+    parser.add_argument('--threshold', type=float, default=threshold, help='robust z-score flagged as an outlier')
+    parser.add_argument('--out', help='output Feather file (default: next to the data, <name>.anomalies.feather)')
+    args = parser.parse_args(argv)
+
+    began = time.perf_counter()
+    calls, subscribers = open_calls(args.data, args.backend)
+    if args.backend == 'pandas':
+        # With the batches live ingestion appended since the data was loaded (the databases hold them already)
+        calls = LiveData(calls, subscribers, cache_paths(args.data)[1], stream_dir(args.data)).calls
+    start, end = time_window(calls, args.start, args.end)
+    table = features(calls.select(start, end, (0, calls.max_duration)), args.windows, args.night, start, end)
+    table = table.join(score(table, args.threshold))
+    table.insert(0, 'number', subscribers.decode(table.index.to_numpy()))
+    out = args.out or scores_path(args.data)
+    save_scores(table, out)
+    counts = ', '.join('%s %d' % (p, table['flagged'].str.contains(p).sum()) for p in patterns)
+    print('%d numbers, %d flagged (%s) -> %s in %.1f s' % (len(table), int((table['flagged'] != '').sum()), counts,
+                                                          out, time.perf_counter() - began), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
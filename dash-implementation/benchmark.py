@@ -0,0 +1,242 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+#### Benchmarks ####
+# Drives the ingest -> filter -> layout/render -> hover/selection -> stats pipeline of
+# dash_script headlessly over generated datasets of increasing size. Every size runs in
+# its own process so peak RSS is per dataset. Results are written as JSON baselines and
+# can be compared against an earlier baseline.
+#
+#   python benchmark.py --sizes 1000 10000 100000 --out baseline.json
+#   python benchmark.py --sizes 1000 10000 100000 --compare baseline.json
+#   python benchmark.py --sizes 1000000 --backend sqlite
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, here)
+sys.path.insert(0, os.path.join(here, '..', 'data'))
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Stage:
+    def __init__(self):
+        self.times = []
+        self.rows = []
+        self.payload = []
+
+    def run(self, f, *args):
+        start = time.perf_counter()
+        out = f(*args)
+        self.times.append(time.perf_counter() - start)
+        return out
+
+    def summary(self, rss_before):
+        ms = np.array(self.times) * 1000
+        s = {'n': len(ms), 'p50_ms': float(np.percentile(ms, 50)), 'p90_ms': float(np.percentile(ms, 90)),
+             'p99_ms': float(np.percentile(ms, 99)), 'max_ms': float(ms.max()),
+             'peak_rss_mb': peak_rss_mb(), 'rss_growth_mb': peak_rss_mb() - rss_before}
+        if self.rows:
+            s['mean_rows'] = float(np.mean(self.rows))
+        if self.payload:
+            s['mean_payload_bytes'] = float(np.mean(self.payload))
+            s['max_payload_bytes'] = int(np.max(self.payload))
+        return s
+
+
+# Undecorated callback function of dash_script
+def callback(ds, name):
+    f = getattr(ds, name)
+    return getattr(f, '__wrapped__', f)
+
+
+# Runs inside the per-dataset process
+def run_dataset(path, repeat, layout, seed, backend='pandas'):
+    os.environ['CDR_DATA'] = path
+    os.environ['CDR_BACKEND'] = backend
+    os.environ['CDR_LAYOUT_WORKERS'] = '0'  # Time the full layout in the callback
+    os.chdir(here)
+    results = {}
+    rss = peak_rss_mb()
+
+    # Ingest: cold (parse CSV, write cache or database) on import, then warm (open the cache)
+    start = time.perf_counter()
+    import dash_script as ds
+    results['import_cold'] = {'n': 1, 'p50_ms': (time.perf_counter() - start) * 1000, 'peak_rss_mb': peak_rss_mb(),
+                              'rss_growth_mb': peak_rss_mb() - rss}
+    import plotly.io as pio
+    import stats
+    import BFSN
+    stage = Stage()
+    for _ in range(3):
+        stage.run(ds.open_calls, path, backend)
+    results['ingest_warm'] = stage.summary(rss)
+
+    rng = np.random.default_rng(seed)
+    days = ds.live.calls.days
+    numbers = ds.subscribers.numbers
+    queries = []
+    for i in range(repeat):
+        date = str(days[rng.integers(0, len(days))])
+        t0 = int(rng.integers(0, 40))
+        option = int(rng.integers(1, 5)) if i % 2 else 3
+        picked = [int(x) for x in rng.choice(numbers, 3)]
+        queries.append((date, [0, ds.live.calls.max_duration], [t0, 48], option,
+                        picked if i % 2 else 'None', picked[::-1] if i % 2 else 'None'))
+
+    filter_cb = callback(ds, 'update_filtered_div_caller')
+    plot_cb = callback(ds, 'update_network_plot_caller')
+    hover_cb = callback(ds, 'display_hover_data')
+    select_cb = callback(ds, 'display_selected_data')
+
+    # Filter (cold: the result store is emptied before every query)
+    rss = peak_rss_mb()
+    stage = Stage()
+    keys = []
+    for q in queries:
+        ds.results.clear()
+        key, message = stage.run(filter_cb, *q, None, None)
+        if isinstance(key, str):
+            keys.append(key)
+            stage.rows.append(len(ds.filtered_view(key)))
+    results['filter'] = stage.summary(rss)
+    if not keys:
+        return results
+
+    # Layout + figure (cold layout cache), figure payload size
+    rss = peak_rss_mb()
+    stage = Stage()
+    figures = []
+    for key in keys:
+        ds.layouts.cache.clear()
+        fig, final = stage.run(plot_cb, key, layout, None, 'auto', [], None, None, 'off', None, None)
+        stage.payload.append(len(pio.to_json(fig)))
+        figures.append(fig)
+    results['plot'] = stage.summary(rss)
+
+    # Hourly playback of the day of each view (cold figure cache), figure payload size
+    rss = peak_rss_mb()
+    stage = Stage()
+    for key in keys:
+        ds.results.clear()
+        fig, final = stage.run(plot_cb, key, layout, None, 'auto', [], None, None, '1h/1h', None, None)
+        stage.payload.append(len(pio.to_json(fig)))
+    results['playback'] = stage.summary(rss)
+
+    # Hover: first hover of a view builds its stats, later hovers reuse them
+    rss = peak_rss_mb()
+    first, later = Stage(), Stage()
+    for key, fig in zip(keys, figures):
+        nodes = fig.data[-1].customdata
+        ds.filtered_view(key)
+        points = [{'points': [{'customdata': int(n)}]} for n in rng.choice(nodes, 5)]
+        first.run(hover_cb, points[0], key)
+        for p in points[1:]:
+            later.run(hover_cb, p, key)
+    results['hover_first'] = first.summary(rss)
+    results['hover_cached'] = later.summary(rss)
+
+    # Lasso selection of a few nodes
+    rss = peak_rss_mb()
+    stage = Stage()
+    for key, fig in zip(keys, figures):
+        nodes = fig.data[-1].customdata
+        selection = {'points': [{'customdata': int(n)} for n in rng.choice(nodes, min(10, len(nodes)))]}
+        stage.run(select_cb, selection, key, 'components', 2)
+    results['select'] = stage.summary(rss)
+
+    # Neighbourhood and call chain modes of the lasso selection
+    rss = peak_rss_mb()
+    stage = Stage()
+    for key, fig in zip(keys, figures):
+        nodes = fig.data[-1].customdata
+        selection = {'points': [{'customdata': int(n)} for n in rng.choice(nodes, min(2, len(nodes)))]}
+        for mode in ('hops', 'path', 'time-path'):
+            stage.run(select_cb, selection, key, mode, 2)
+    results['select_paths'] = stage.summary(rss)
+
+    # stats.py and BFSN.py on their own
+    rss = peak_rss_mb()
+    table, single, components = Stage(), Stage(), Stage()
+    for key in keys:
+        view = ds.filtered_view(key)
+        node = int(view['Caller_node'].iloc[0])
+        table.run(stats.nodeStats, view)
+        table.rows.append(len(view))
+        single.run(lambda: (stats.meanDur(node, view), stats.peakHours(node, view),
+                            stats.ogIc(node, view), stats.mostCalls(node, view)))
+        components.run(BFSN.bfs, list(view['Caller'].iloc[:10]), view)
+    results['stats_table'] = table.summary(rss)
+    results['stats_single_node'] = single.summary(rss)
+    results['bfs'] = components.summary(rss)
+    return results
+
+
+# Prints the p50 change of every stage against a baseline, flags slowdowns above threshold
+def compare(current, baseline, threshold):
+    regressions = 0
+    for size, stages in current['results'].items():
+        for name, s in stages.items():
+            old = baseline['results'].get(size, {}).get(name)
+            if not old:
+                continue
+            ratio = s['p50_ms'] / max(old['p50_ms'], 1e-9)
+            flag = '  REGRESSION' if ratio > threshold else ''
+            regressions += bool(flag)
+            print('%10s %-18s %10.2f ms -> %10.2f ms  x%.2f%s' % (size, name, old['p50_ms'], s['p50_ms'], ratio, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the CDR analysis pipeline')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=20, help='queries per size')
+    parser.add_argument('--layout', default='neato', help='layout engine used for the plot stage')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backend', default='pandas', help='pandas, sqlite or duckdb')
+    parser.add_argument('--out', help='write results as JSON')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio reported as regression')
+    parser.add_argument('--run', help=argparse.SUPPRESS)  # internal: benchmark one dataset
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_dataset(args.run, args.repeat, args.layout, args.seed, args.backend)))
+        return
+
+    import data_generator
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            os.mkdir(os.path.join(tmp, str(size)))
+            path = os.path.join(tmp, str(size), 'calls.csv')
+            data_generator.write(path, size, seed=args.seed)
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', path, '--repeat', str(args.repeat),
+                                  '--layout', args.layout, '--seed', str(args.seed), '--backend', args.backend],
+                                 stdout=subprocess.PIPE, check=True, universal_newlines=True)
+            results[str(size)] = json.loads(out.stdout.strip().splitlines()[-1])
+            print('%d rows: %s' % (size, ', '.join('%s %.1f ms' % (k, v['p50_ms']) for k, v in results[str(size)].items())))
+    current = {'meta': {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                        'machine': platform.machine(), 'repeat': args.repeat, 'layout': args.layout,
+                        'seed': args.seed, 'backend': args.backend},
+               'results': results}
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(current, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(current, json.load(f), args.threshold):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+#### Level of Detail ####
+# Large views are drawn as communities: every community is one super-node and the calls
+# between two communities are one aggregated edge (call count, total duration), so the
+# figure size depends on how much is expanded rather than on the size of the view.
+# Communities come from label propagation over the view's calls, vectorized with numpy.
+# Super-node ids are negative (-1 - community), so they never clash with node ids.
+
+lod_nodes = 2000  # Views with more nodes are drawn as communities in 'auto' detail mode
+
+
+def super_id(community):
+    return -1 - np.asarray(community, dtype=np.int64)
+
+
+def community_of(super_ids):
+    return -1 - np.asarray(super_ids, dtype=np.int64)
+
+
+# Community label of each of n nodes. Every round a random half of the nodes takes the label
+# most frequent among its neighbours (ties broken at random); updating half at a time stops
+# labels from oscillating between the two sides of bipartite parts.
+def label_propagation(src, dst, n, iterations=20, seed=0):
+    a = np.concatenate([src, dst]).astype(np.int64)
+    b = np.concatenate([dst, src]).astype(np.int64)
+    labels = np.arange(n, dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    for _ in range(iterations):
+        keys, counts = np.unique(a * n + labels[b], return_counts=True)
+        node, label = np.divmod(keys, n)
+        score = counts + 0.5 * rng.random(len(counts))
+        order = np.lexsort((-score, node))
+        best = order[np.append(True, node[order][1:] != node[order][:-1])]
+        # Stop once no node would take another label (not just the half updated this round)
+        best = best[labels[node[best]] != label[best]]
+        if not len(best):
+            break
+        update = best[rng.random(len(best)) < 0.5]
+        labels[node[update]] = label[update]
+    return np.unique(labels, return_inverse=True)[1].ravel()
+
+
+class Communities:
+    def __init__(self, df):
+        src = df['Caller_node'].to_numpy(dtype=np.int64)
+        dst = df['Receiver_node'].to_numpy(dtype=np.int64)
+        self.nodes = np.union1d(src, dst)  # Sorted node ids of the view
+        self.labels = label_propagation(np.searchsorted(self.nodes, src), np.searchsorted(self.nodes, dst),
+                                        len(self.nodes))
+        self.sizes = np.bincount(self.labels)
+        # Members of community c are nodes[order[offsets[c]:offsets[c+1]]]
+        self.order = np.argsort(self.labels, kind='stable')
+        self.offsets = np.append(0, np.cumsum(self.sizes))
+
+    def __len__(self):
+        return len(self.sizes)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.nodes, self.labels, self.sizes, self.order, self.offsets))
+
+    def of(self, nodes):
+        return self.labels[np.searchsorted(self.nodes, nodes)]
+
+    def members(self, community):
+        return self.nodes[self.order[self.offsets[community]:self.offsets[community + 1]]]
+
+    # Node ids with the super-node ids among them replaced by their members
+    def expand(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        parts = [ids[ids >= 0]] + [self.members(c) for c in community_of(ids[ids < 0])]
+        return np.unique(np.concatenate(parts))
+
+    # Id each node is drawn as: itself when its community is expanded, else its super-node
+    def display_ids(self, nodes, expanded=()):
+        community = self.of(nodes)
+        ids = super_id(community)
+        if len(expanded):
+            shown = np.isin(community, list(expanded))
+            ids[shown] = np.asarray(nodes, dtype=np.int64)[shown]
+        return ids
+
+    # Positions {super-node id: (x, y)} of every community at the centre of its members' positions in pos
+    def centres(self, pos):
+        xy = np.array([pos[n] for n in self.nodes.tolist()], dtype=np.float64).reshape(-1, 2)
+        x = np.bincount(self.labels, weights=xy[:, 0], minlength=len(self)) / self.sizes
+        y = np.bincount(self.labels, weights=xy[:, 1], minlength=len(self)) / self.sizes
+        return dict(zip(super_id(np.arange(len(self))).tolist(), zip(x.tolist(), y.tolist())))
+
+    # Calls between drawn ids: src, dst, calls and total duration, calls inside a collapsed community dropped
+    def aggregate(self, df, expanded=()):
+        edges = pd.DataFrame({
+            'src': self.display_ids(df['Caller_node'].to_numpy(dtype=np.int64), expanded),
+            'dst': self.display_ids(df['Receiver_node'].to_numpy(dtype=np.int64), expanded),
+            'duration': df['Duration'].to_numpy(dtype=np.int64)})
+        edges = edges[edges['src'] != edges['dst']]
+        return edges.groupby(['src', 'dst'], sort=True)['duration'].agg(['size', 'sum']) \
+            .rename(columns={'size': 'calls', 'sum': 'duration'}).reset_index()
+
+
+# Distance from each point to its nearest other point (1 when there is no other point)
+def spacing(xy):
+    if len(xy) < 2:
+        return np.ones(len(xy))
+    from scipy.spatial import cKDTree
+    distance = cKDTree(xy).query(xy, k=2)[0][:, 1]
+    return np.where(distance > 0, distance, distance.max() or 1.0)
+
+
+# Positions {node: (x, y)} of members inside the unit disc: their own layout (local) centred
+# and scaled, members missing from it spread around the rim
+def disc(members, local):
+    pos = {}
+    if local:
+        xy = np.array(list(local.values()), dtype=np.float64)
+        xy -= xy.mean(axis=0)
+        xy /= max(float(np.sqrt((xy ** 2).sum(axis=1)).max()), 1e-9)
+        pos = dict(zip(local.keys(), map(tuple, xy)))
+    rest = [n for n in members if n not in pos]
+    for i, n in enumerate(rest):
+        angle = 2 * np.pi * i / len(rest)
+        pos[n] = (np.cos(angle), np.sin(angle))
+    return pos
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from BFSN import nbytes
+
+#### Tower and Handset Co-location ####
+# The tower and handset (IMEI) of a call belong to its caller. Two sparse incidence matrices
+# are built once per view: node x (tower, time window) sightings and node x IMEI uses.
+# Numbers seen at the same tower in the same window as a node are then one sparse row
+# product with the transposed matrix, counting the windows they shared; numbers that used
+# one of its handsets are the same product over the IMEI matrix. No query scans the calls.
+
+window_minutes = 15  # Width of the time windows towers are bucketed by
+top_matches = 10  # Matches listed per number
+
+
+# Binary (rows x columns) incidence matrix of the given pairs, duplicates counted once
+def incidence(rows, columns, shape):
+    matrix = csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, columns)), shape=shape)
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return matrix
+
+
+class Colocation:
+    def __init__(self, df, window_minutes=window_minutes):
+        node = df['Caller_node'].to_numpy(dtype=np.int64)
+        n_nodes = int(node.max()) + 1 if len(df) else 0
+        self.window = pd.Timedelta(minutes=window_minutes)
+        ts = df['Timestamp'].to_numpy().astype('datetime64[ns]').view(np.int64)
+        window = ts // self.window.value
+        self.start = int(window.min()) if len(df) else 0  # First window of the view
+        window -= self.start
+        tower, self.towers = pd.factorize(df['TowerID'].astype(str))
+        imei, self.imeis = pd.factorize(df['IMEI'].astype(str))
+        self.n_windows = int(window.max()) + 1 if len(df) else 0
+        # Column of a sighting is tower * n_windows + window
+        self.sightings = incidence(node, tower * self.n_windows + window, (n_nodes, len(self.towers) * self.n_windows))
+        self.handsets = incidence(node, imei, (n_nodes, len(self.imeis)))
+        self._sightings_t = self.sightings.T.tocsr()
+        self._handsets_t = self.handsets.T.tocsr()
+
+    @property
+    def nbytes(self):
+        return nbytes(self.sightings, self.handsets, self._sightings_t, self._handsets_t, self.towers, self.imeis)
+
+    def _valid(self, node):
+        return 0 <= node < self.sightings.shape[0]
+
+    # Up to limit (node, shared count) pairs of row node of matrix @ transposed, most shared first
+    @staticmethod
+    def _shared(matrix, transposed, node, limit):
+        counts = (matrix[node] @ transposed).tocsr()
+        others, shared = counts.indices.astype(np.int64), counts.data.astype(np.int64)
+        keep = others != node
+        others, shared = others[keep], shared[keep]
+        order = np.lexsort((others, -shared))[:limit]
+        return others[order], shared[order]
+
+    # Numbers that called from the same tower in the same window as node, with the number of
+    # such windows, most first
+    def colocated(self, node, limit=top_matches):
+        if not self._valid(node):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return self._shared(self.sightings, self._sightings_t, node, limit)
+
+    # (tower, window start) of the shared windows of two nodes, in time order
+    def meetings(self, a, b):
+        if not (self._valid(a) and self._valid(b)):
+            return []
+        places = np.intersect1d(self.sightings[a].indices, self.sightings[b].indices)
+        tower, window = np.divmod(places, self.n_windows)
+        order = np.argsort(window, kind='stable')
+        return [(self.towers[t], pd.Timestamp((self.start + int(w)) * self.window.value))
+                for t, w in zip(tower[order], window[order])]
+
+    # IMEIs node called from
+    def handsets_of(self, node):
+        if not self._valid(node):
+            return []
+        return list(self.imeis[self.handsets[node].indices])
+
+    # Numbers that called from one of node's handsets, with the number of handsets shared
+    def sharing_handset(self, node, limit=top_matches):
+        if not self._valid(node):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return self._shared(self.handsets, self._handsets_t, node, limit)
+
+    # Numbers that called from imei
+    def users_of(self, imei):
+        column = np.flatnonzero(self.imeis == str(imei))
+        if not len(column):
+            return np.empty(0, dtype=np.int64)
+        return self._handsets_t[int(column[0])].indices.astype(np.int64)
@@ -1,32 +1,78 @@
 #### Import Libraries #########
+import os
+import hashlib
+import uuid
 import pandas as pd
 import numpy as np
 import json
-import networkx as nx
+from urllib.parse import urlencode
 import plotly.graph_objects as go
-from matplotlib import cm
-from matplotlib.colors import ListedColormap, LinearSegmentedColormap
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
+import dash_table
+from flask import request, Response
 from dash.dependencies import Input, Output, State
 from datetime import datetime as dt
 from stats import *
-import pygraphviz as pgv
 import dash_bootstrap_components as dbc
 ### Import functions for Breadth First Search ###
 
-from BFSN import bfs
+from BFSN import Components, Neighbourhood
+from number_search import NumberIndex, option_limit
+from anomaly import scores_path, load_scores, flagged_numbers, patterns
+from colocation import Colocation, window_minutes
+from clusters import Communities, lod_nodes, super_id, community_of, spacing, disc
+from ingest import display_records, cache_paths, data_columns
+from analysis import open_calls
+from result_store import ResultStore, SharedResultStore
+from query import PostingLists, edge_array
+from stream import LiveData, SpoolWatcher, SocketFeed, stream_dir
+from layout import LayoutEngine, JobBoard, layout_options
+from render import node_positions, edge_traces, node_trace, webgl_threshold
+from raster import Raster, raster_calls, raster_points
+from timeline import SlidingWindow, window_starts, playback_window, playback_options
+import instrument
+from instrument import span, instrumented
 
 ##### Stylesheet #####
 external_stylesheets = [dbc.themes.SANDSTONE]
 
 
-# Load  Data
-df = pd.read_csv('./data/data.csv')
+# Load  Data (typed, cached columnar copy of data.csv) and the phone number <-> node number dictionary
+# CDR_DATA points the app at another dataset (.csv or .parquet)
+# CDR_BACKEND=sqlite|duckdb keeps the calls in an on-disk database (sql_store.py) instead of memory
+data_path = os.environ.get('CDR_DATA', './data/data.csv')
+backend = os.environ.get('CDR_BACKEND', 'pandas')
+# wsgi.py sets CDR_WSGI: several worker processes read the calls, none ingests any
+wsgi = bool(os.environ.get('CDR_WSGI'))
+calls, subscribers = open_calls(data_path, backend, read_only=wsgi)
+# Live ingestion (stream.py): CDR_SPOOL=<dir> watches a spool directory, CDR_STREAM_PORT=<port> reads rows from a socket
+spool_dir = os.environ.get('CDR_SPOOL')
+stream_port = os.environ.get('CDR_STREAM_PORT')
+streaming = bool(spool_dir or stream_port) and not wsgi
+# live.calls is the current snapshot of the calls (query.CallIndex or sql_store.SQLCallStore);
+# the database keeps appended calls itself, the in-memory index keeps them in data/<name>.stream
+live = LiveData(calls, subscribers, cache_paths(data_path)[1],
+                store_dir=stream_dir(data_path) if backend == 'pandas' else None)
+
+# CDR_SHARED_CACHE=<dir> keeps filter results and layouts in files under <dir>, shared by the
+# workers of a multi-worker server (wsgi.py); entries are kept apart per dataset
+shared_cache = os.environ.get('CDR_SHARED_CACHE')
+if shared_cache:
+    dataset = '%s:%s:%s:%d' % (os.path.abspath(data_path), os.path.getmtime(data_path), backend, len(live.calls))
+    shared_cache = os.path.join(shared_cache, hashlib.sha1(dataset.encode('utf-8')).hexdigest()[:12])
+
+
+def result_store(name, max_entries=64):
+    if shared_cache:
+        return SharedResultStore(os.path.join(shared_cache, name))
+    return ResultStore(max_entries=max_entries)
 #### Create App ###
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets)
 app.title = 'CDR/IPDR Analyser'
+instrument.register(app.server)  # /metrics endpoint
+debug_panel = bool(os.environ.get('CDR_DEBUG_PANEL'))  # Show span timings in the app
 #### Default Variables ####
 default_duration_slider_val = [0, 100]
 default_time_slider_val = ['00:00', '24:00']
@@ -43,77 +89,241 @@ for i in range(0, 48):
             str(int("".join(time_str[0:2])) + 1).zfill(2) + str(':00'))
         times[i+1] = {'label': "".join(time_str),
                       "style": {"transform": "rotate(-90deg) translateY(-15px)"}}
+# Offset from midnight of each time mark
+time_offsets = {i: pd.to_timedelta(times[i]['label'] + ':00') for i in times}
 # Generating marks for duration slider
-durations = {}
-for i in range(0, df['Duration'].max(), 5):
-    durations[i] = str(i)
-
+def duration_marks(max_duration):
+    durations = {}
+    for i in range(0, max_duration, 5):
+        durations[i] = str(i)
+    return durations
 
-coords_to_node = {}  # Dictionary that stores coordinates to node number
-node_to_num = {}  # Dictionary that stores node number to phone number
-data_columns = ["Caller", "Receiver", "Date",
-                "Time", "Duration", "TowerID", "IMEI"]
-nodes = np.union1d(df['Caller'].unique(), df['Receiver'].unique())  # nodes
 
+max_duration = live.calls.max_duration
+durations = duration_marks(max_duration)
 
-# Color scale of edges
-viridis = cm.get_cmap('viridis', 12)
-# Define Color
-df['Dura_color'] = (df['Duration']/df['Duration'].max()).apply(viridis)
-df['Date'] = df['Date'].apply(pd.to_datetime).dt.date
+# Cached graph layouts; large ones run in CDR_LAYOUT_WORKERS background processes (0 to lay out in the request)
+# Under a shared cache, layout jobs in progress are seen by every worker process
+layouts = LayoutEngine(lambda: live.calls.edges(), workers=int(os.environ.get('CDR_LAYOUT_WORKERS', 2)),
+                       cache=result_store('layouts', max_entries=32),
+                       board=JobBoard(os.path.join(shared_cache, 'layout-jobs') if shared_cache else None))
 
-
-df['Caller_node'] = df['Caller'].apply(
-    lambda x: list(nodes).index(x))  # Caller Nodes
-df['Receiver_node'] = df['Receiver'].apply(lambda x: list(nodes).index(x))
 #### Plots ####
 # Plot Graph of calls
 
 
-def plot_network(df):
-    G = nx.DiGraph()  # networkX Graph
-    # Reciever Nodes
-
-    def make_graph(x):
-        G.add_edge(x["Caller_node"], x["Receiver_node"])
-
-    df.apply(make_graph, axis=1)  # Make a graph
-    pos = nx.nx_agraph.graphviz_layout(G)  # Position of Points
-
-    # Add Edges to Plot
-    edge_trace = []
-
-    def add_coords(x):
-        x0, y0 = pos[x['Caller_node']]
-        x1, y1 = pos[x['Receiver_node']]
-
-        node_to_num[x['Caller_node']] = x['Caller']
-        node_to_num[x['Receiver_node']] = x['Receiver']
-        edge_trace.append(dict(type='scatter',
-                               x=[x0, x1], y=[y0, y1],
-                               line=dict(
-                                   width=0.5, color='rgba'+str(x['Dura_color']).replace(']', ')').replace('[', '(')),
-                               hoverinfo='none',
-                               mode='lines'))  # Graph object for each connection
-
-    df.apply(add_coords, axis=1)  # Adding edges
-
-    # adding points
-    node_x = []
-    node_y = []
-    for node in pos:
-        x, y = pos[node]
-        coords_to_node[(x, y)] = node
-        node_x.append(x)
-        node_y.append(y)
-    node_trace = go.Scatter(
-        x=node_x, y=node_y,
-        mode='markers',
-        hoverinfo='text',
-        marker=dict(
-            size=10,
-            line_width=2))  # Object for point scatter plot
-    fig = go.Figure(data=edge_trace+[node_trace],
+# Returns (figure, final); final is False while the figure shows a coarse layout
+# (or no figure at all without coarse). session is the page asking (see LayoutEngine.request).
+def plot_network(df, engine='neato', coarse=True, session=None):
+    # Position of Points, cached per edge set
+    edges = edge_array(df)
+    with span('layout', engine=engine, edges=len(edges)) as counts:
+        pos, final = layouts.request(edges, engine, coarse, session)
+        counts['final'] = final
+    if pos is None:
+        return None, final
+
+    with span('render', calls=len(df), nodes=len(pos)) as counts:
+        nodes, xy = node_positions(pos)
+        # Add Edges to Plot, one trace per duration color
+        edge_trace = edge_traces(nodes, xy, df['Caller_node'], df['Receiver_node'],
+                                 df['Duration'], live.calls.max_duration)
+        # adding points, each carrying its node number as customdata
+        fig = network_figure(edge_trace+[node_trace(xy, nodes)])
+        counts['traces'] = len(fig.data)
+    return fig, final
+
+
+# Level of detail (clusters.py): the view drawn as communities, those in expanded drawn as their members.
+# Communities are laid out once per view, and an expanded community's members are laid out on their
+# own inside a disc around its position, so expanding never moves anything else.
+def plot_communities(key, engine='neato', coarse=True, expanded=(), session=None):
+    communities = view_communities(key)
+    df = filtered_view(key)
+    with span('layout', engine=engine, communities=len(communities), expanded=len(expanded)) as counts:
+        pos, final = community_layout(key, engine, coarse, session)
+        counts['final'] = final
+    if pos is None:
+        return None, final
+
+    pos = dict(pos)
+    if len(expanded):
+        centres = np.array([pos[s] for s in super_id(np.arange(len(communities)))])
+        radius = 0.4 * spacing(centres)
+        for c in expanded:
+            members = communities.members(c)
+            inner = df[np.isin(df['Caller_node'], members) & np.isin(df['Receiver_node'], members)]
+            local = layouts.positions(edge_array(inner), 'spring', warm=False) if len(inner) else {}
+            for n, (x, y) in disc(members, local).items():
+                pos[n] = (centres[c, 0] + radius[c] * x, centres[c, 1] + radius[c] * y)
+            del pos[int(super_id(c))]
+
+    with span('render', calls=len(df), nodes=len(pos)) as counts:
+        links = communities.aggregate(df, expanded)  # Edge colour is the total duration of the calls
+        nodes, xy = node_positions(pos)
+        edge_trace = edge_traces(nodes, xy, links['src'], links['dst'], links['duration'],
+                                 int(links['duration'].max()) if len(links) else 1)
+        fig = network_figure(edge_trace+[node_trace(xy, nodes)])
+        # Super-nodes sized by their number of members
+        sizes = np.full(len(nodes), 20.0)
+        collapsed = nodes < 0
+        sizes[collapsed] = 10 + 40 * np.sqrt(communities.sizes[community_of(nodes[collapsed])] / communities.sizes.max())
+        fig.data[-1].marker.size = sizes
+        fig.update_layout(uirevision=key)  # Keep the zoom while communities expand
+        counts['traces'] = len(fig.data)
+    return fig, final
+
+
+# Playback (timeline.py): the calls of a date range matching the duration and number filters
+# of the view, one animation frame per sliding window. All frames share one layout of the range.
+def plot_timeline(key, start_date, end_date, playback, engine='neato', coarse=True, session=None):
+    version, date, duration, time, option, caller, receiver = json.loads(key)
+    start = pd.to_datetime(start_date or date).normalize()
+    end = pd.to_datetime(end_date or date).normalize() + pd.Timedelta(days=1)
+    range_key = json.dumps(['timeline', version, str(start), str(end), duration, option, caller, receiver])
+
+    def select():
+        with span('filter') as counts:
+            view = live.calls.select(start, end, duration, option, selection_codes(caller), selection_codes(receiver))
+            counts['rows'] = len(view)
+        return view
+    df = results.get_or_compute(range_key, select)
+    edges = edge_array(df)
+    with span('layout', engine=engine, edges=len(edges)) as counts:
+        pos, final = layouts.request(edges, engine, coarse, session)
+        counts['final'] = final
+    if pos is None:
+        return None, final
+    figure_key = json.dumps([range_key, playback, engine])
+    fig = results.get(figure_key)
+    if fig is not None:
+        return fig, final
+
+    step, width = playback_window(playback)
+    with span('render', calls=len(df), nodes=len(pos)) as counts:
+        window = SlidingWindow(df)
+        nodes, xy = node_positions(pos)
+        webgl = len(edges) > webgl_threshold  # The same trace types in every frame
+        frames = []
+        for s in window_starts(start, end, step):
+            window.move(s.value, min(s + width, end).value)
+            src, dst, calls, total = window.edges()
+            active, node_calls, node_duration = window.active_nodes()
+            at = np.searchsorted(nodes, active)
+            points = node_trace(xy[at], active, webgl=webgl)
+            points['marker']['size'] = 8 + 4 * np.log2(1 + node_calls)  # Sized by calls in the window
+            points['text'] = ['%d<br>%d calls, %d min' % t for t in zip(subscribers.decode(active), node_calls, node_duration)]
+            # Edges coloured by the mean duration of their calls in the window
+            traces = edge_traces(nodes, xy, src, dst, total // np.maximum(calls, 1), live.calls.max_duration,
+                                 webgl=webgl, every_bin=True)
+            frames.append(dict(data=traces + [points], name=s.strftime('%d-%m-%Y %H:%M')))
+        fig = network_figure(frames[0]['data'])
+        fig.data[-1].marker.size = frames[0]['data'][-1]['marker']['size']
+        play = dict(frame=dict(duration=700, redraw=True), transition=dict(duration=0), fromcurrent=True)
+        pause = dict(mode='immediate', frame=dict(duration=0, redraw=False), transition=dict(duration=0))
+        scrub = dict(mode='immediate', frame=dict(duration=0, redraw=True), transition=dict(duration=0))
+        margin = 0.05 * max(float(np.ptp(xy, axis=0).max()), 1e-9) if len(xy) else 1
+        fig.update_layout(
+            transition_duration=0,
+            xaxis_range=[xy[:, 0].min() - margin, xy[:, 0].max() + margin] if len(xy) else None,
+            yaxis_range=[xy[:, 1].min() - margin, xy[:, 1].max() + margin] if len(xy) else None,
+            updatemenus=[dict(type='buttons', direction='left', x=0, y=0, xanchor='left', yanchor='top',
+                              buttons=[dict(label='Play', method='animate', args=[None, play]),
+                                       dict(label='Pause', method='animate', args=[[None], pause])])],
+            sliders=[dict(x=0.15, len=0.85, y=0, yanchor='top', currentvalue=dict(prefix='Window from '),
+                          steps=[dict(label=f['name'], method='animate', args=[[f['name']], scrub]) for f in frames])],
+            uirevision=range_key)
+        # Frames are added as plain dicts, validating hundreds of them as graph objects costs seconds
+        fig = fig.to_dict()
+        fig['frames'] = frames
+        counts['frames'] = len(frames)
+    if final:
+        results.put(figure_key, fig)
+    return fig, final
+
+
+# Layout of the communities of a view (every community linked to itself so none is left out).
+# In the global layout a community sits at the centre of its members.
+def community_layout(key, engine='neato', coarse=True, session=None):
+    if engine == 'global':
+        communities = view_communities(key)
+        return communities.centres(layouts.positions(communities.nodes, 'global')), True
+    supers = super_id(np.arange(len(view_communities(key))))
+    links = results.get_or_compute(key + ':links', lambda: view_communities(key).aggregate(filtered_view(key)))
+    edges = np.unique(np.concatenate([links[['src', 'dst']].to_numpy(dtype=np.int64),
+                                      np.stack([supers, supers], axis=1)]), axis=0)
+    return layouts.request(edges, engine, coarse, session)
+
+
+# Raster tiles (raster.py) of a view and whether its layout is final. The tiles of the
+# coarse layout shown while a background layout runs are kept apart from the final ones.
+def view_raster(key, engine='neato', coarse=True, session=None):
+    raster = results.get(json.dumps([key, 'raster', engine, True]))
+    if raster is not None:
+        return raster, True
+    df = filtered_view(key)
+    edges = edge_array(df)
+    with span('layout', engine=engine, edges=len(edges)) as counts:
+        pos, final = layouts.request(edges, engine, coarse, session)
+        counts['final'] = final
+    if pos is None:
+        return None, final
+
+    def compute():
+        with span('raster', calls=len(df), nodes=len(pos)):
+            return Raster(pos, df['Caller_node'], df['Receiver_node'], df['Duration'], live.calls.max_duration)
+    return results.get_or_compute(json.dumps([key, 'raster', engine, final]), compute), final
+
+
+# Very large views as raster tiles under the visible range, with interactive points for the
+# nodes in range once there are few enough of them (relayout carries the zoomed axis ranges)
+def plot_raster(key, engine='neato', coarse=True, relayout=None, session=None):
+    raster, final = view_raster(key, engine, coarse, session)
+    if raster is None:
+        return None, final
+    relayout = relayout or {}
+    if 'xaxis.range[0]' in relayout and 'yaxis.range[0]' in relayout:
+        x_range = [relayout['xaxis.range[0]'], relayout['xaxis.range[1]']]
+        y_range = [relayout['yaxis.range[0]'], relayout['yaxis.range[1]']]
+    else:
+        x_range = [raster.origin[0], raster.origin[0] + raster.size]
+        y_range = [raster.origin[1], raster.origin[1] + raster.size]
+    z, tiles = raster.tiles(x_range, y_range)
+    query = urlencode({'view': key, 'engine': engine, 'layout': 'final' if final else 'coarse'})
+    images = []
+    for x, y in tiles:
+        (left, bottom), width = raster.tile_bounds(z, x, y)
+        images.append(dict(source='/tiles/%d/%d/%d.png?%s' % (z, x, y, query), xref='x', yref='y',
+                           x=left, y=bottom + width, sizex=width, sizey=width, sizing='stretch', layer='below'))
+    nodes, xy = raster.points(x_range, y_range)
+    if len(nodes) > raster_points:
+        nodes, xy = nodes[:0], xy[:0]
+    fig = network_figure([node_trace(xy, nodes)])
+    fig.data[-1].marker.size = 8
+    fig.update_layout(images=images, xaxis_range=x_range, yaxis_range=y_range, uirevision=key)
+    return fig, final
+
+
+# Whether a view is drawn as raster tiles in a detail mode
+def use_raster(key, detail):
+    if detail == 'auto':
+        return len(filtered_view(key)) > raster_calls
+    return detail == 'image'
+
+
+# Whether a view is drawn as communities in a detail mode
+def use_communities(key, detail):
+    if detail == 'auto':
+        if use_raster(key, detail):
+            return False
+        view = filtered_view(key)
+        return len(np.union1d(view['Caller_node'], view['Receiver_node'])) > lod_nodes
+    return detail == 'communities'
+
+
+# Figure with the common layout of the network plot
+def network_figure(traces):
+    fig = go.Figure(data=traces,
                     layout=go.Layout(
                    
                     titlefont_size=16,
@@ -139,7 +349,7 @@ def plot_network(df):
 
 
 ##### Layout of App #####
-app.layout = html.Div(children=[
+page = html.Div(children=[
     html.Div(children=[
         html.H1(children='CDR Analyser'),  # Title
         html.H3(children='''
@@ -161,15 +371,30 @@ app.layout = html.Div(children=[
             ),
             dcc.DatePickerSingle(
                 id='date-picker',
-                min_date_allowed=df['Date'].min(),
-                max_date_allowed=df['Date'].max(),
+                min_date_allowed=pd.Timestamp(live.calls.days[0]).date(),
+                max_date_allowed=pd.Timestamp(live.calls.days[-1]).date(),
                 initial_visible_month=dt(2020, 6, 5),
                 date=str(dt(2020, 6, 17, 0, 0, 0))
             ),  # Data Picker
+            html.H5(
+                'Playback:'
+            ),
+            dcc.DatePickerRange(
+                id='date-range',
+                min_date_allowed=pd.Timestamp(live.calls.days[0]).date(),
+                max_date_allowed=pd.Timestamp(live.calls.days[-1]).date(),
+                initial_visible_month=dt(2020, 6, 5),
+            ),  # Days played back (the picked date when empty)
+            dcc.Dropdown(
+                id='playback',
+                options=playback_options,
+                value='off',
+                clearable=False,
+            ),  # Window of the playback; the time slider does not apply to it
             dcc.RangeSlider(
                 id='duration-slider',
                 min=0,
-                max=df['Duration'].max(),
+                max=max_duration,
                 step=None,
                 marks=durations,
 
@@ -189,6 +414,24 @@ app.layout = html.Div(children=[
                 pushable=1
 
             ),  # Time Slider
+            html.H5(
+                'Layout:'
+            ),
+            dcc.Dropdown(
+                id='layout-select',
+                options=layout_options,
+                value='neato',
+                clearable=False,
+            ),  # Layout algorithm of the network graph
+            html.H5(
+                'Detail:'
+            ),
+            dcc.RadioItems(
+                id='detail-mode',
+                options=[{'label': 'Auto', 'value': 'auto'}, {'label': 'Communities', 'value': 'communities'},
+                         {'label': 'Every number', 'value': 'all'}, {'label': 'Image', 'value': 'image'}],
+                value='auto',
+            ),  # Draw large views as communities (click or zoom to expand them)
             html.H5(
                 'Condition for Caller/Reciever'
             ),
@@ -202,10 +445,16 @@ app.layout = html.Div(children=[
             html.H5(
                 'Select Caller:'
             ),
+            dcc.Dropdown(
+                id='preset',
+                options=[],
+                placeholder='Preset: flagged numbers...',
+            ),  # Numbers flagged by the nightly anomaly.py pass, picked as callers
+            dcc.Interval(id='preset-interval', interval=60000),
+            # Pick up a new anomaly.py run
             dcc.Dropdown(
                 id='caller-dropdown',
-                options=[{'label': 'None', 'value': 'None'}] + \
-                [{'label': k, 'value': k} for k in df['Caller'].unique()],
+                options=[{'label': 'None', 'value': 'None'}],
                 value='None',
                 multi=True,
             ),  # Dropdown for Caller
@@ -214,8 +463,7 @@ app.layout = html.Div(children=[
             ),
             dcc.Dropdown(
                 id='receiver-dropdown',
-                options=[{'label': 'None', 'value': 'None'}] + \
-                [{'label': k, 'value': k} for k in df['Receiver'].unique()],
+                options=[{'label': 'None', 'value': 'None'}],
                 value='None',
                 multi=True,
             )],  # Dropdown for Reciever,
@@ -243,6 +491,19 @@ app.layout = html.Div(children=[
                 Click on points in the graph to get the call data records.
             """),
                 html.Pre(id='click-data', ),
+                dash_table.DataTable(
+                    id='click-table',
+                    columns=[{'name': c, 'id': c} for c in data_columns],
+                    data=[],
+                    page_current=0,
+                    page_size=20,
+                    page_action='custom',
+                    sort_action='custom',
+                    sort_mode='single',
+                    sort_by=[],
+                ),  # Records of the clicked number in the current view, fetched a page at a time
+                html.A('Download as CSV', id='click-export', href='', download='calls.csv'),
+                dcc.Store(id='clicked-nodes'),
             ], ),  # Click Data Container
 
             html.Div([
@@ -250,6 +511,16 @@ app.layout = html.Div(children=[
                 **Select to see connected people** \n
                 Select using rectangle/lasso or by using your mouse.(Use Shift for multiple selections)
             """),
+                dcc.RadioItems(
+                    id='selection-mode',
+                    options=[{'label': 'Connected people', 'value': 'components'},
+                             {'label': 'Within hops:', 'value': 'hops'},
+                             {'label': 'Shortest call chain (first two selected)', 'value': 'path'},
+                             {'label': 'Calls in time order (first two selected)', 'value': 'time-path'},
+                             {'label': 'Same tower / handset', 'value': 'colocation'}],
+                    value='components',
+                ),  # What to show for the selected numbers
+                dcc.Input(id='hops', type='number', min=1, max=6, step=1, value=2),
                 html.Pre(id='selected-data', ),
             ], )  # Selection Data Container
 
@@ -262,54 +533,184 @@ app.layout = html.Div(children=[
         style={'display': 'none'}
     ),
     # Filtered Data
-])
+    dcc.Interval(id='refresh-interval', interval=5000, disabled=not streaming),
+    # Refresh while streaming
+    dcc.Interval(id='layout-poll', interval=500, disabled=True),
+    # Poll for a background layout while a coarse one is shown
+    dcc.Store(id='expanded-communities', data=[]),
+    # Communities drawn as their members
+] + ([
+    html.Details([
+        html.Summary('Debug: timings'),
+        html.Pre(id='debug-metrics'),
+        dcc.Interval(id='debug-interval', interval=2000),
+    ])  # Debug Panel
+] if debug_panel else []))
+
+
+# Every page load gets its own session id, so moving to another view only cancels the layout jobs of that page
+def serve_layout():
+    return html.Div(children=page.children + [dcc.Store(id='session-id', data=uuid.uuid4().hex)])
+
+
+app.layout = serve_layout
 
 #### Callbacks ####
+# Node numbers of the points in hover/click/selection data (only node points carry customdata)
+def point_nodes(data):
+    if data is None:
+        return []
+    return [point['customdata'] for point in data['points'] if 'customdata' in point]
+
+
 # Callback to update df used for plotting
 # Callback to filter dataframe
 # REMEMBER WHILE EDITING (RWI): THIS IS A TWO OUTPUT FUNCTION
 
 
+# Filtered views live server side; the browser only carries the key of the view,
+# which is the JSON encoded filter tuple so any miss can be recomputed from the key alone.
+results = result_store('results')
+
+
+# Node codes of the numbers chosen in a caller/receiver dropdown, None if nothing is chosen
+def selection_codes(selected):
+    if selected is None or selected == 'None':
+        return None
+    numbers = [k for k in selected if k not in ('', 'None')]
+    if not numbers:
+        return None
+    codes = subscribers.encode(numbers)
+    return list(codes[codes >= 0])
+
+
+def filter_calls(selected_date, selected_duration, selected_time, selected_option, selected_caller, selected_receiver):
+    # Date,Time,Duration and Number Filter, resolved on the call index (or in SQL)
+    day = pd.to_datetime(selected_date).normalize()
+    with span('filter') as counts:
+        view = live.calls.select(day + time_offsets[selected_time[0]], day + time_offsets[selected_time[1]],
+                                 selected_duration, selected_option,
+                                 selection_codes(selected_caller), selection_codes(selected_receiver))
+        counts['rows'] = len(view)
+        return view
+
+
+# Whether a view key sent by the browser (export and tile URLs) is one the filter callback could
+# have made, checked before anything is filtered or cached for it
+def valid_view(key):
+    try:
+        version, date, duration, time, option, caller, receiver = json.loads(key)
+        pd.Timestamp(date)
+    except (TypeError, ValueError):
+        return False
+    numbers = [s for s in (caller, receiver) if s is not None and s != 'None']
+    return (isinstance(version, int) and isinstance(date, str) and option in (1, 2, 3, 4)
+            and isinstance(duration, list) and len(duration) == 2
+            and all(isinstance(d, (int, float)) and not isinstance(d, bool) for d in duration)
+            and isinstance(time, list) and len(time) == 2
+            and all(isinstance(t, int) and not isinstance(t, bool) and t in time_offsets for t in time)
+            and all(isinstance(s, list) and all(isinstance(n, (int, str)) for n in s) for s in numbers))
+
+
+# Filtered dataframe for a view key
+def filtered_view(key):
+    return results.get_or_compute(key, lambda: filter_calls(*json.loads(key)[1:]))
+
+
+# Statistics of every node in a view (stats.py), computed once per view
+def view_stats(key):
+    def compute():
+        view = filtered_view(key)
+        with span('stats', rows=len(view)):
+            return nodeStats(view)
+    return results.get_or_compute(key + ':stats', compute)
+
+
+# Communities of a view (clusters.py), computed once per view
+def view_communities(key):
+    def compute():
+        view = filtered_view(key)
+        with span('communities', rows=len(view)):
+            return Communities(view)
+    return results.get_or_compute(key + ':communities', compute)
+
+
+# Tower/handset co-location index of a view (colocation.py), computed once per view
+def view_colocation(key):
+    def compute():
+        view = filtered_view(key)
+        with span('colocation', rows=len(view)):
+            return Colocation(view)
+    return results.get_or_compute(key + ':colocation', compute)
+
+
+# Co-location of a node as text: numbers met at a tower and numbers sharing a handset
+def colocation_text(key, node, limit=5):
+    index = view_colocation(key)
+    s = "Same tower, same " + str(window_minutes) + " min:\n"
+    nodes, shared = index.colocated(node, limit)
+    for number, n in zip(subscribers.decode(nodes), shared):
+        s += "\t\t  " + str(number) + " (" + str(n) + " times)\n"
+    if not len(nodes):
+        s += "\t\t  None\n"
+    s += "Handsets (IMEI): " + (", ".join(index.handsets_of(node)) or "None") + "\n"
+    s += "Shares a handset with:\n"
+    nodes, shared = index.sharing_handset(node, limit)
+    for number, n in zip(subscribers.decode(nodes), shared):
+        s += "\t\t  " + str(number) + " (" + str(n) + " handsets)\n"
+    if not len(nodes):
+        s += "\t\t  None\n"
+    return s
+
+
+# Feature matrix and anomaly scores written by anomaly.py (None before its first run), indexed by
+# phone number and reloaded when it changes
+def anomaly_scores():
+    path = scores_path(data_path)
+    if not os.path.exists(path):
+        return None
+    return results.get_or_compute(json.dumps(['anomalies', os.path.getmtime(path)]), lambda: load_scores(path).set_index('number', drop=False))
+
+
+# Neighbourhood index of a view (BFSN.py), computed once per view
+def view_neighbourhood(key):
+    def compute():
+        view = filtered_view(key)
+        with span('neighbourhood', rows=len(view)):
+            return Neighbourhood(view)
+    return results.get_or_compute(key + ':neighbourhood', compute)
+
+
+# Connected components of a view (BFSN.py), computed once per view
+def view_components(key):
+    def compute():
+        view = filtered_view(key)
+        with span('components', rows=len(view)):
+            return Components(view)
+    return results.get_or_compute(key + ':components', compute)
+
+
 @app.callback(
     [Output(component_id='filtered-data', component_property='children'),
      Output(component_id='message', component_property='children')],
     [Input(component_id='date-picker', component_property='date'), Input(component_id='duration-slider', component_property='value'), Input(component_id='time-slider', component_property='value'),
-     Input(component_id='select-caller-receiver', component_property='value'), Input(component_id='caller-dropdown', component_property='value'), Input(component_id='receiver-dropdown', component_property='value')]
+     Input(component_id='select-caller-receiver', component_property='value'), Input(component_id='caller-dropdown', component_property='value'), Input(component_id='receiver-dropdown', component_property='value'),
+     Input(component_id='refresh-interval', component_property='n_intervals')],
+    [State(component_id='filtered-data', component_property='children')]
 )
-def update_filtered_div_caller(selected_date, selected_duration, selected_time, selected_option, selected_caller, selected_receiver):
-    # Date,Time,Duration Filter
-
-    filtered_df = df[(df['Date'] == pd.to_datetime(selected_date))
-                     & ((df['Duration'] >= selected_duration[0]) & (df['Duration'] <= selected_duration[1]))
-                     & ((df['Time'] < times[selected_time[1]]['label']) & (df['Time'] >= times[selected_time[0]]['label']))].reset_index(drop=True)
-
-    # Number Filter
-    # If Caller is Selected
-    if(selected_option == 1):
-        if selected_caller != 'None':
-            filtered_df = filtered_df[(filtered_df['Caller'].isin(
-                list(selected_caller)))].reset_index(drop=True)
-   # If Receiver is selected
-    if(selected_option == 2):
-        if selected_receiver != 'None':
-            filtered_df = filtered_df[(filtered_df['Receiver'].isin(
-                (selected_receiver)))].reset_index(drop=True)
-   # If the option either is selected
-    if(selected_option == 3):
-        if selected_caller != 'None' or selected_receiver != 'None':
-            filtered_df = filtered_df[((filtered_df['Caller'].isin(list(selected_caller))) | (
-                filtered_df['Receiver'].isin(list(selected_receiver))))].reset_index(drop=True)
-    # If option both is selected
-    if(selected_option == 4):
-        if selected_caller != 'None' and selected_receiver != 'None':
-            filtered_df = df[((filtered_df['Caller'].isin(list(selected_caller))) & (
-                filtered_df['Receiver'].isin(list(selected_receiver))))].reset_index(drop=True)
-    if filtered_df.shape[0] == 0:
+@instrumented('update_filtered_div_caller')
+def update_filtered_div_caller(selected_date, selected_duration, selected_time, selected_option, selected_caller, selected_receiver, n_intervals, current_key):
+    # The key carries the snapshot version, so appended calls give a new view
+    key = json.dumps([live.calls.version, selected_date, selected_duration, selected_time,
+                      selected_option, selected_caller, selected_receiver])
+    if key == current_key:
+        return dash.no_update, dash.no_update
+    if filtered_view(key).shape[0] == 0:
         # No update since nothing matches
         return dash.no_update, 'Nothing Matches that Query'
     else:
-        # Update Filtered Dataframe
-        return filtered_df.to_json(date_format='iso', orient='split'), 'Updated'
+        # Update key of the Filtered Dataframe
+        return key, 'Updated'
 # Callback for hover data
 # Display Stats in hoverdata
 
@@ -317,30 +718,38 @@ def update_filtered_div_caller(selected_date, selected_duration, selected_time,
 @app.callback(
     Output('hover-data', 'children'),
     [Input('network-plot', 'hoverData'), Input(component_id='filtered-data', component_property='children')])
+@instrumented('display_hover_data')
 def display_hover_data(hoverData, filtered_data):
-
-    df = pd.read_json(filtered_data, orient='split')
-    if hoverData is not None:
+    nodes = point_nodes(hoverData)
+    if nodes:
         # Get node number corresponding to the point.
-
-        nodeNumber = coords_to_node[(
-            hoverData['points'][0]['x'], hoverData['points'][0]['y'])]
+        nodeNumber = nodes[0]
+        if nodeNumber < 0:
+            size = view_communities(filtered_data).sizes[community_of(nodeNumber)]
+            return "Community of " + str(size) + " numbers\nClick to expand it, or zoom in"
+        stats = view_stats(filtered_data)
+        if nodeNumber not in stats.index:
+            return "Hover data..."  # Point of a figure drawn for an older view
+        z = stats.loc[nodeNumber]
         hd = 'Selected Number: ' + \
-            str(node_to_num[nodeNumber]) + '\n'  # hd: Hover Data string
+            str(subscribers.number(nodeNumber)) + '\n'  # hd: Hover Data string
 
-        # Functions are from stats.py
-        hd += "Mean Duration : " + str(meanDur(nodeNumber, df)) + "\n"
+        hd += "Mean Duration : " + str(z['meanDur']) + "\n"
         hd += "Peak Hours(duration):\n"
-        m = peakHours(nodeNumber, df)
-        for x in m:
-            hd += "\t\t  " + str(x)+"-"+str(x+1)+" : "+str(m[x])+"\n"
-        z = ogIc(nodeNumber, df)  # Outgoing Incoming
-        hd += "No. of Outgoing Calls: " + str(z[0])+"\n"
-        hd += "No. of Incomming Calls: " + str(z[1])+"\n"
-        z = mostCalls(nodeNumber, df)  # Most Calls
-        hd += "Most Calls to: " + str(z[0]) + "\n"
-        hd += "Most Calls from: " + str(z[1]) + "\n"
-        hd += "Most Calls: " + str(z[2]) + "\n"
+        for i in range(1, 4):
+            x = z['peakHour'+str(i)]
+            hd += "\t\t  " + str(x)+"-"+str(x+1)+" : "+str(z['peakMinutes'+str(i)])+"\n"
+        hd += "No. of Outgoing Calls: " + str(z['outgoing'])+"\n"
+        hd += "No. of Incomming Calls: " + str(z['incoming'])+"\n"
+        hd += "Most Calls to: " + str(z['mostCallsTo']) + "\n"
+        hd += "Most Calls from: " + str(z['mostCallsFrom']) + "\n"
+        hd += "Most Calls: " + str(z['mostCalls']) + "\n"
+        hd += colocation_text(filtered_data, nodeNumber)
+        scores = anomaly_scores()
+        number = subscribers.number(nodeNumber)
+        if scores is not None and number in scores.index and scores.at[number, 'flagged']:
+            hd += "Flagged: " + scores.at[number, 'flagged'].replace(',', ', ') + \
+                " (score " + str(round(float(scores.at[number, 'score']), 1)) + ")\n"
         return hd
     return "Hover data..."
 
@@ -348,73 +757,365 @@ def display_hover_data(hoverData, filtered_data):
 # Show table for the clicked phone number
 
 
+# Per number row indexes of a view: rows of the calls each node made and received
+def view_rows(key):
+    def compute():
+        view = filtered_view(key)
+        n_nodes = int(max(view['Caller_node'].max(), view['Receiver_node'].max())) + 1 if len(view) else 0
+        return (PostingLists(view['Caller_node'].to_numpy(), n_nodes),
+                PostingLists(view['Receiver_node'].to_numpy(), n_nodes))
+    return results.get_or_compute(key + ':rows', compute)
+
+
+# Calls of the given nodes in a view, or of the members of a community of it, sorted as a
+# DataTable sort_by asks (time order by default)
+def node_records(key, nodes=(), sort_by=(), community=None):
+    def compute():
+        members = nodes if community is None else view_communities(key).members(community)
+        made, received = view_rows(key)
+        records = filtered_view(key).take(np.union1d(made.union(members), received.union(members)))
+        if sort_by:
+            column = sort_by[0]['column_id']
+            records = records.sort_values('Timestamp' if column in ('Date', 'Time') else column,
+                                          ascending=sort_by[0]['direction'] == 'asc', kind='stable')
+        return records
+    return results.get_or_compute(json.dumps([key, 'records', list(nodes), community, sort_by]), compute)
+
+
+@app.callback(
+    [Output('click-data', 'children'), Output('clicked-nodes', 'data'),
+     Output('click-table', 'page_current'), Output('click-export', 'href')],
+    [Input('network-plot', 'clickData'), Input('filtered-data', 'children')])
+@instrumented('display_click_data')
+def display_click_data(clickData, filtered_data):
+    nodes = point_nodes(clickData)
+    if not nodes or filtered_data is None:
+        return "Click on a node to view more data", None, 0, ''
+    if nodes[0] < 0:
+        # Super-node: list the members of the community, the table shows all their calls. The
+        # community goes by its id, its members (maybe thousands) are looked up server side.
+        community = int(community_of(nodes[0]))
+        members = view_communities(filtered_data).members(community)
+        s = "Community of " + str(len(members)) + " numbers (click again to collapse):\n"
+        for number in subscribers.decode(members):
+            s += "\t" + str(number) + "\n"
+        clicked = {'view': filtered_data, 'nodes': [], 'community': community}
+        query = {'view': filtered_data, 'community': community}
+    else:
+        s = "Selected Number: " + str(subscribers.number(nodes[0])) + "\n"
+        clicked = {'view': filtered_data, 'nodes': nodes[:1], 'community': None}
+        query = {'view': filtered_data, 'nodes': nodes[0]}
+    s += str(len(node_records(clicked['view'], clicked['nodes'], community=clicked['community']))) + " calls in this view"
+    return s, clicked, 0, '/export/calls.csv?' + urlencode(query)
+
+
+# Callback for one page of the records table
 @app.callback(
-    Output('click-data', 'children'),
-    [Input('network-plot', 'clickData')])
-def display_click_data(clickData):
-    if clickData is not None:
-        nodeNumber = coords_to_node[(
-            clickData['points'][0]['x'], clickData['points'][0]['y'])]
-        # Filtering DF
-        return df[(df['Caller_node'] == nodeNumber) | (df['Receiver_node'] == nodeNumber)][data_columns].to_string(index=False)
-    return "Click on a node to view more data"
+    [Output('click-table', 'data'), Output('click-table', 'page_count')],
+    [Input('clicked-nodes', 'data'), Input('click-table', 'page_current'),
+     Input('click-table', 'page_size'), Input('click-table', 'sort_by')])
+@instrumented('update_click_table')
+def update_click_table(clicked, page_current, page_size, sort_by):
+    if not clicked:
+        return [], 1
+    records = node_records(clicked['view'], clicked['nodes'], sort_by or [], clicked.get('community'))
+    start = (page_current or 0) * page_size
+    page = display_records(records.iloc[start:start + page_size])
+    return page.to_dict('records'), max(1, -(-len(records) // page_size))
+
+
+# GET /export/calls.csv?view=<view key>&nodes=<node ids> (or &community=<community of the view>):
+# calls of the nodes in the view (every call of the view without either) as CSV, streamed in chunks
+export_chunk = 50000
+
+
+@app.server.route('/export/calls.csv')
+def export_calls():
+    key = request.args.get('view', '')
+    try:
+        nodes = [int(n) for n in request.args.get('nodes', '').split(',') if n]
+        community = int(request.args['community']) if 'community' in request.args else None
+    except ValueError:
+        return Response('Bad nodes or community', status=400)
+    if not valid_view(key):
+        return Response('Bad view', status=400)
+    if community is not None and not 0 <= community < len(view_communities(key)):
+        return Response('No such community', status=404)
+    if nodes or community is not None:
+        records = node_records(key, nodes, community=community)
+    else:
+        records = filtered_view(key)
+
+    def generate():
+        for start in range(0, max(len(records), 1), export_chunk):
+            yield display_records(records.iloc[start:start + export_chunk]).to_csv(index=False, header=start == 0)
+    return Response(generate(), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=calls.csv'})
+
+
+# GET /tiles/<z>/<x>/<y>.png?view=<view key>&engine=<layout engine>&layout=final|coarse: one raster tile of a view
+@app.server.route('/tiles/<int:z>/<int:x>/<int:y>.png')
+def raster_tile(z, x, y):
+    key, engine = request.args.get('view', ''), request.args.get('engine', 'neato')
+    if not valid_view(key) or engine not in [o['value'] for o in layout_options]:
+        return Response('Bad view', status=400)
+    final = request.args.get('layout') == 'final'
+    raster = results.get(json.dumps([key, 'raster', engine, final]))
+    if raster is None:
+        raster, final = view_raster(key, engine)
+    if raster is None:
+        return Response(status=404)
+    png = results.get_or_compute(json.dumps([key, 'tile', engine, final, z, x, y]), lambda: raster.png(z, x, y))
+    return Response(png, mimetype='image/png', headers={'Cache-Control': 'max-age=86400' if final else 'no-cache'})
 
 
 # Callback for Selected Data
 @app.callback(
     Output('selected-data', 'children'),
-    [Input('network-plot', 'selectedData'), Input(component_id='filtered-data', component_property='children')])
-def display_selected_data(selectedData, filtered_data):
-    df = pd.read_json(filtered_data, orient='split')
+    [Input('network-plot', 'selectedData'), Input(component_id='filtered-data', component_property='children'),
+     Input('selection-mode', 'value'), Input('hops', 'value')])
+@instrumented('display_selected_data')
+def display_selected_data(selectedData, filtered_data, mode, hops):
     # TODO #3 Graph should also be filtered and only nodes in component should be displayed
     if selectedData is not None:
-        l = []
-        for point in selectedData['points']:
-            l.append(node_to_num[coords_to_node[point['x'], point['y']]])
-        components = bfs(l, df)
+        l = point_nodes(selectedData)
+        if any(n < 0 for n in l):
+            l = view_communities(filtered_data).expand(l)  # Selected super-nodes stand for their members
+        if mode == 'hops':
+            nodes, distance = view_neighbourhood(filtered_data).within(l, int(hops or 1))
+            s = "Within " + str(int(hops or 1)) + " hops:\n"
+            for number, d in zip(subscribers.decode(nodes), distance):
+                s += "\t" + str(number) + " (" + str(d) + " hops)\n"
+            return s
+        if mode == 'colocation':
+            index = view_colocation(filtered_data)
+            s = ""
+            for node in l[:20]:
+                s += "Number " + str(subscribers.number(node)) + ":\n" + colocation_text(filtered_data, node, limit=10)
+                for other in index.colocated(node, 3)[0]:
+                    s += "\tMet " + str(subscribers.number(other)) + " at:\n"
+                    for tower, start in index.meetings(node, other)[:5]:
+                        s += "\t\t  tower " + str(tower) + ", " + start.strftime('%d-%m-%Y %H:%M') + "\n"
+            return s
+        if mode in ('path', 'time-path'):
+            if len(l) < 2:
+                return "Select two numbers"
+            a, b = int(l[0]), int(l[1])
+            ends = str(subscribers.number(a)) + " and " + str(subscribers.number(b))
+            if mode == 'path':
+                path = view_neighbourhood(filtered_data).shortest_path(a, b)
+                if path is None:
+                    return "No call chain between " + ends + " in this view"
+                return "Shortest call chain:\n\t" + " -> ".join(str(n) for n in subscribers.decode(path))
+            hops = view_neighbourhood(filtered_data).time_respecting_path(a, b)
+            if hops is None:
+                return "No chain of calls in time order between " + ends + " in this view"
+            s = "Calls in time order:\n"
+            for caller, receiver, ts in hops:
+                s += "\t" + str(subscribers.number(caller)) + " -> " + str(subscribers.number(receiver)) + \
+                    " at " + pd.Timestamp(ts).strftime('%d-%m-%Y %H:%M:%S') + "\n"
+            return s
+        components = view_components(filtered_data)
         s = ""
         i = 1
-        for component in components:
-            if not component:
-                continue
+        for component in components.of(l):
             s += "Component "+str(i)+":\n"
             i += 1
-            for number in component:
+            for number in subscribers.decode(component):
                 s += "\t" + str(number) + "\n"
         return s
     return json.dumps(selectedData, indent=2)
 
 
 # Callback to update network plot
+# A view whose layout is still computing gets a coarse figure first and polls until the refined one is ready
 @app.callback(
-    Output(component_id='network-plot', component_property='figure'),
-    [Input(component_id='filtered-data', component_property='children')]
+    [Output(component_id='network-plot', component_property='figure'), Output(component_id='layout-poll', component_property='disabled')],
+    [Input(component_id='filtered-data', component_property='children'), Input(component_id='layout-select', component_property='value'),
+     Input(component_id='layout-poll', component_property='n_intervals'), Input(component_id='detail-mode', component_property='value'),
+     Input(component_id='expanded-communities', component_property='data'),
+     Input(component_id='date-range', component_property='start_date'), Input(component_id='date-range', component_property='end_date'),
+     Input(component_id='playback', component_property='value'), Input(component_id='network-plot', component_property='relayoutData')],
+    [State(component_id='session-id', component_property='data')]
 )
-def update_network_plot_caller(filtered_data):
-    return plot_network(pd.read_json(filtered_data, orient='split'))
+@instrumented('update_network_plot_caller')
+def update_network_plot_caller(filtered_data, layout_engine, n_intervals, detail, expanded, start_date, end_date, playback,
+                               relayoutData, session):
+    polling = n_intervals is not None and triggered_by('layout-poll')
+    raster = use_raster(filtered_data, detail) and not (playback and playback != 'off')
+    if relayoutData is not None and triggered_by('network-plot.relayoutData'):
+        # Zooming only redraws raster views, for their tiles and points in range
+        zoomed = any(k.startswith(('xaxis.', 'yaxis.')) for k in relayoutData)
+        if not (raster and zoomed):
+            return dash.no_update, dash.no_update
+    if raster:
+        fig, final = plot_raster(filtered_data, layout_engine, not polling, relayoutData, session)
+    elif playback and playback != 'off':
+        fig, final = plot_timeline(filtered_data, start_date, end_date, playback, layout_engine, not polling, session)
+    elif use_communities(filtered_data, detail):
+        fig, final = plot_communities(filtered_data, layout_engine, not polling, expanded or [], session)
+    else:
+        fig, final = plot_network(filtered_view(filtered_data), layout_engine, not polling, session)
+    if fig is None:
+        # The coarse figure is already shown: poll on while its layout is computing, stop if it no longer is
+        return dash.no_update, final
+    return fig, final
+
+
+# Whether a component ('network-plot') or one property of it ('network-plot.clickData') triggered the callback
+def triggered_by(component_id):
+    return any(t['prop_id'] == component_id or t['prop_id'].startswith(component_id + '.')
+               for t in dash.callback_context.triggered)
+
 
-# TODO UPDATE THESE CALLBACKS TO INCLUDE TIME AND DURATION UPDATES
-# Callback to change selectors including caller no. according to date
+# Callback to expand communities: clicking a super-node toggles it, zooming in expands the
+# communities in view (as long as they add up to at most lod_nodes numbers), a new view collapses all
+@app.callback(
+    Output('expanded-communities', 'data'),
+    [Input('network-plot', 'clickData'), Input('network-plot', 'relayoutData'),
+     Input('filtered-data', 'children'), Input('detail-mode', 'value')],
+    [State('expanded-communities', 'data'), State('layout-select', 'value'), State('session-id', 'data')])
+@instrumented('update_expanded_communities')
+def update_expanded_communities(clickData, relayoutData, filtered_data, detail, expanded, layout_engine, session):
+    if filtered_data is None or not (triggered_by('network-plot.clickData') or triggered_by('network-plot.relayoutData')):
+        return [] if expanded else dash.no_update
+    if not use_communities(filtered_data, detail):
+        return dash.no_update
+    communities = view_communities(filtered_data)
+    expanded = list(expanded or [])
+    if triggered_by('network-plot.clickData'):
+        nodes = point_nodes(clickData)
+        if not nodes:
+            return dash.no_update
+        if nodes[0] >= 0:
+            # A member: clicking it collapses its community again
+            c = int(communities.of([nodes[0]])[0])
+            return [e for e in expanded if e != c] if c in expanded else dash.no_update
+        c = int(community_of(nodes[0]))
+        if communities.sizes[c] > lod_nodes:
+            return dash.no_update
+        return sorted(expanded + [c])
+    relayout = relayoutData or {}
+    if 'xaxis.autorange' in relayout:
+        return []
+    if 'xaxis.range[0]' not in relayout or 'yaxis.range[0]' not in relayout:
+        return dash.no_update
+    x0, x1 = relayout['xaxis.range[0]'], relayout['xaxis.range[1]']
+    y0, y1 = relayout['yaxis.range[0]'], relayout['yaxis.range[1]']
+    pos, final = community_layout(filtered_data, layout_engine, session=session)
+    centres = np.array([pos[s] for s in super_id(np.arange(len(communities)))])
+    inside = np.flatnonzero((centres[:, 0] >= x0) & (centres[:, 0] <= x1) & (centres[:, 1] >= y0) & (centres[:, 1] <= y1))
+    # Nearest to the middle of the view first
+    inside = inside[np.argsort(np.hypot(centres[inside, 0] - (x0 + x1) / 2, centres[inside, 1] - (y0 + y1) / 2))]
+    shown = communities.sizes[inside].cumsum() <= lod_nodes
+    return sorted(int(c) for c in inside[shown])
+
+# Prefix index of the numbers in column ('Caller' or 'Receiver') of the calls matching the date, time and duration filters
+def number_index(column, selected_date, selected_time, selected_duration):
+    day = pd.to_datetime(selected_date).normalize()
+    calls = live.calls
+    key = json.dumps(['numbers', calls.version, column, selected_date, selected_time, selected_duration])
+    return results.get_or_compute(key, lambda: NumberIndex(*calls.number_counts(
+        day + time_offsets[selected_time[0]], day + time_offsets[selected_time[1]], selected_duration, column)))
+
+
+# Dropdown options: the numbers matching what was typed (busiest first), keeping the chosen ones
+def number_options(column, search_value, selected_date, selected_time, selected_duration, selected):
+    chosen = [k for k in selected if k not in ('', 'None')] if isinstance(selected, list) else []
+    with span('search', column=column) as counts:
+        index = number_index(column, selected_date, selected_time, selected_duration)
+        matches = [int(n) for n in index.search(search_value, option_limit) if int(n) not in chosen]
+        counts['numbers'] = len(index)
+    return [{'label': 'None', 'value': 'None'}] + [{'label': str(k), 'value': k} for k in chosen + matches]
+
+
+# Callbacks to search the caller/receiver numbers of the current date, time and duration filters as the user types
 
 
 @app.callback(
     Output(component_id='caller-dropdown', component_property='options'),
-    [Input(component_id='date-picker', component_property='date')]
+    [Input(component_id='caller-dropdown', component_property='search_value'), Input(component_id='date-picker', component_property='date'),
+     Input(component_id='time-slider', component_property='value'), Input(component_id='duration-slider', component_property='value'),
+     Input(component_id='refresh-interval', component_property='n_intervals'), Input(component_id='caller-dropdown', component_property='value')]
 )
-def update_phone_div_caller(selected_date):
-    return [{'label': 'None', 'value': ''}]+[{'label': k, 'value': k} for k in df[df['Date'] == pd.to_datetime(selected_date)]['Caller'].unique()]
-
-# Callback to change reciever according  to dates
+@instrumented('update_phone_div_caller')
+def update_phone_div_caller(search_value, selected_date, selected_time, selected_duration, n_intervals, selected):
+    return number_options('Caller', search_value, selected_date, selected_time, selected_duration, selected)
 
 
 @app.callback(
     Output(component_id='receiver-dropdown', component_property='options'),
-    [Input(component_id='date-picker', component_property='date')]
+    [Input(component_id='receiver-dropdown', component_property='search_value'), Input(component_id='date-picker', component_property='date'),
+     Input(component_id='time-slider', component_property='value'), Input(component_id='duration-slider', component_property='value'),
+     Input(component_id='refresh-interval', component_property='n_intervals')],
+    [State(component_id='receiver-dropdown', component_property='value')]
 )
-def update_phone_div_receiver(selected_date):
-    return [{'label': 'None', 'value': ''}]+[{'label': k, 'value': k} for k in df[df['Date'] == pd.to_datetime(selected_date)]['Receiver'].unique()]
+@instrumented('update_phone_div_receiver')
+def update_phone_div_receiver(search_value, selected_date, selected_time, selected_duration, n_intervals, selected):
+    return number_options('Receiver', search_value, selected_date, selected_time, selected_duration, selected)
+
+
+# Presets of flagged numbers, one per pattern (refreshed on load and every minute)
+preset_limit = 50  # Highest scoring numbers a preset picks
+preset_labels = {'all': 'Flagged: any pattern', 'burst': 'Flagged: burst callers', 'callOnly': 'Flagged: only call, never receive',
+                 'imeiChurn': 'Flagged: IMEI churners', 'night': 'Flagged: night-time activity'}
+
+
+@app.callback(
+    Output('preset', 'options'),
+    [Input('preset-interval', 'n_intervals')])
+@instrumented('update_presets')
+def update_presets(n_intervals):
+    scores = anomaly_scores()
+    if scores is None:
+        return [{'label': 'No anomaly scores yet (run anomaly.py)', 'value': '', 'disabled': True}]
+    flagged = scores['flagged'].str.split(',')
+    counts = {p: int(flagged.apply(lambda f: p in f).sum()) for p in patterns}
+    counts['all'] = int((scores['flagged'] != '').sum())
+    return [{'label': '%s (%d)' % (preset_labels[p], counts[p]), 'value': p} for p in ['all'] + patterns]
+
+
+# Callback to pick the numbers of a preset as callers (either caller or receiver)
+@app.callback(
+    [Output('caller-dropdown', 'value'), Output('select-caller-receiver', 'value')],
+    [Input('preset', 'value')])
+@instrumented('apply_preset')
+def apply_preset(preset):
+    scores = anomaly_scores()
+    if not preset or scores is None:
+        return dash.no_update, dash.no_update
+    numbers = flagged_numbers(scores, preset, preset_limit)
+    return (numbers or 'None'), 3
+
+
+# Callback to widen the date and duration bounds as calls are appended
+@app.callback(
+    [Output('date-picker', 'min_date_allowed'), Output('date-picker', 'max_date_allowed'),
+     Output('date-range', 'min_date_allowed'), Output('date-range', 'max_date_allowed'),
+     Output('duration-slider', 'max'), Output('duration-slider', 'marks')],
+    [Input('refresh-interval', 'n_intervals')])
+@instrumented('update_bounds')
+def update_bounds(n_intervals):
+    calls = live.calls
+    return (pd.Timestamp(calls.days[0]).date(), pd.Timestamp(calls.days[-1]).date(),
+            pd.Timestamp(calls.days[0]).date(), pd.Timestamp(calls.days[-1]).date(),
+            calls.max_duration, duration_marks(calls.max_duration))
+
+
+# Callback for the debug panel
+if debug_panel:
+    @app.callback(
+        Output('debug-metrics', 'children'),
+        [Input('debug-interval', 'n_intervals')])
+    def display_debug_metrics(n):
+        return instrument.text_report(instrument.metrics.summary())
 
 
 #### Run Server ####
 if __name__ == '__main__':
-    app.run_server(debug=True, host='0.0.0.0')
+    if spool_dir:
+        SpoolWatcher(live, spool_dir).start()
+    if stream_port:
+        SocketFeed(live, int(stream_port)).start()
+    # The reloader would start a second process with its own feeds
+    app.run_server(debug=True, host='0.0.0.0', use_reloader=not streaming)
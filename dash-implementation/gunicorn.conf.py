@@ -0,0 +1,20 @@
+import multiprocessing
+import os
+
+#### gunicorn settings for wsgi.py ####
+# CDR_BIND, CDR_WORKERS and CDR_THREADS override the defaults.
+
+bind = os.environ.get('CDR_BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('CDR_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('CDR_THREADS', 4))
+preload_app = True  # Load the dataset once, before forking the workers
+timeout = 120
+
+
+# Workers open their own database connections (sql_store.py); the master lets go of its own
+# first, DuckDB does not survive a fork
+def pre_fork(server, worker):
+    import dash_script
+    close = getattr(dash_script.live.calls, 'close', None)
+    if close is not None:
+        close()
@@ -0,0 +1,82 @@
+import os
+import pandas as pd
+from subscribers import SubscriberDict
+
+#### CDR Ingestion ####
+# Parses the raw CSV once into compact typed columns and caches the result as an
+# uncompressed Feather (Arrow IPC) file. Later starts memory-map that file instead
+# of re-parsing the CSV, so several app instances share the same page cache.
+
+csv_dtypes = {'Caller': 'int64', 'Receiver': 'int64', 'Date': str, 'Time': str,
+              'Duration': 'uint16', 'TowerID': 'category', 'IMEI': 'category'}
+data_columns = ["Caller", "Receiver", "Date",
+                "Time", "Duration", "TowerID", "IMEI"]
+
+
+# Raw CSV rows -> typed frame, sorted by time
+def parse_calls(raw, subscribers):
+    df = pd.DataFrame({
+        'Caller': raw['Caller'].astype('int64'),
+        'Receiver': raw['Receiver'].astype('int64'),
+        'Timestamp': pd.to_datetime(raw['Date'] + ' ' + raw['Time'], format='%d-%m-%Y %H:%M:%S'),
+        'Duration': raw['Duration'].astype('uint16'),
+        'TowerID': raw['TowerID'].astype('category'),
+        'IMEI': raw['IMEI'].astype('category'),
+    })
+    df['Caller_node'] = subscribers.add(df['Caller'].to_numpy()).astype('uint32')
+    df['Receiver_node'] = subscribers.add(df['Receiver'].to_numpy()).astype('uint32')
+    return df.sort_values('Timestamp', kind='stable').reset_index(drop=True)
+
+
+# Raw rows of a CSV file, or of a Parquet file with the same columns (see data/data_generator.py)
+def read_raw(path):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path).astype({'TowerID': str, 'IMEI': str}).astype(csv_dtypes)
+    return pd.read_csv(path, dtype=csv_dtypes)
+
+
+# Raw rows of a CSV file chunk rows at a time, or of a Parquet file one row group at a time
+def read_raw_chunks(path, chunk=10**6):
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        parquet = pq.ParquetFile(path)
+        for i in range(parquet.num_row_groups):
+            yield parquet.read_row_group(i).to_pandas().astype({'TowerID': str, 'IMEI': str}).astype(csv_dtypes)
+    else:
+        for raw in pd.read_csv(path, dtype=csv_dtypes, chunksize=chunk):
+            yield raw
+
+
+def cache_paths(csv_path):
+    base = os.path.splitext(csv_path)[0]
+    return base + '.feather', os.path.join(os.path.dirname(csv_path), 'subscribers.npy')
+
+
+# Load calls (and the subscriber dictionary) for csv_path, using the binary cache when it is fresh
+def load_calls(csv_path):
+    from pyarrow import feather
+    cache_path, subscribers_path = cache_paths(csv_path)
+    if (os.path.exists(cache_path) and os.path.exists(subscribers_path)
+            and os.path.getmtime(cache_path) >= os.path.getmtime(csv_path)):
+        table = feather.read_table(cache_path, memory_map=True)
+        return table.to_pandas(split_blocks=True), SubscriberDict.load(subscribers_path)
+
+    if os.path.exists(subscribers_path):
+        subscribers = SubscriberDict.load(subscribers_path)
+    else:
+        subscribers = SubscriberDict()
+    df = parse_calls(read_raw(csv_path), subscribers)
+    subscribers.save(subscribers_path)
+    tmp = cache_path + '.tmp'
+    # Uncompressed, so it can be memory-mapped (DataFrame.to_feather takes no options before pandas 1.1)
+    feather.write_feather(df, tmp, compression='uncompressed')
+    os.replace(tmp, cache_path)
+    return df, subscribers
+
+
+# Typed frame -> the columns shown to analysts, formatted like the source CSV
+def display_records(df):
+    records = df[['Caller', 'Receiver', 'Duration', 'TowerID', 'IMEI']].copy()
+    records.insert(2, 'Date', df['Timestamp'].dt.strftime('%d-%m-%Y'))
+    records.insert(3, 'Time', df['Timestamp'].dt.strftime('%H:%M:%S'))
+    return records[data_columns]
@@ -0,0 +1,116 @@
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+import numpy as np
+
+#### Instrumentation ####
+# Span timings with row/edge/payload counts for every callback and pipeline stage,
+# kept in small per-span ring buffers (a perf_counter call and a deque append per span).
+# The payload of a callback is the size in bytes of the JSON response Dash sends for it.
+# Served as JSON on /metrics. Setting CDR_PROFILE=<dir> also dumps a cProfile file per
+# callback call into <dir>.
+
+profile_dir = os.environ.get('CDR_PROFILE')
+if profile_dir:
+    os.makedirs(profile_dir, exist_ok=True)
+_request = threading.local()  # Counts of the callback span of the current request
+
+
+class Metrics:
+    def __init__(self, window=500):
+        self.window = window
+        self._spans = defaultdict(lambda: deque(maxlen=self.window))  # name -> (seconds, counts)
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, counts):
+        with self._lock:
+            self._spans[name].append((seconds, counts))
+
+    def summary(self):
+        with self._lock:
+            spans = {name: list(values) for name, values in self._spans.items()}
+        out = {}
+        for name, values in sorted(spans.items()):
+            ms = np.array([v[0] for v in values]) * 1000
+            out[name] = {'count': len(ms), 'p50_ms': float(np.percentile(ms, 50)),
+                         'p90_ms': float(np.percentile(ms, 90)), 'p99_ms': float(np.percentile(ms, 99)),
+                         'max_ms': float(ms.max()), 'last': values[-1][1]}
+        return out
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+
+
+metrics = Metrics()
+
+
+# with span('layout', edges=n) as s: ... s['nodes'] = m
+@contextmanager
+def span(name, **counts):
+    start = time.perf_counter()
+    try:
+        yield counts
+    finally:
+        metrics.record(name, time.perf_counter() - start, counts)
+
+
+# Decorator timing a Dash callback (apply below @app.callback)
+def instrumented(name):
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with span('callback.' + name) as counts:
+                if profile_dir:
+                    profiler = cProfile.Profile()
+                    output = profiler.runcall(f, *args, **kwargs)
+                    # Thread id in the name: callbacks of concurrent requests finish in the same millisecond
+                    path = os.path.join(profile_dir, '%s-%d-%d-%d.prof' % (
+                        name, time.time() * 1000, os.getpid(), threading.get_ident()))
+                    try:
+                        profiler.dump_stats(path)
+                    except OSError as e:  # Profiling never fails the callback
+                        print('Could not write profile %s: %s' % (path, e), file=sys.stderr)
+                else:
+                    output = f(*args, **kwargs)
+                _request.counts = counts  # Payload filled in once the response is serialized
+            return output
+        return wrapper
+    return decorator
+
+
+def text_report(summary):
+    lines = ['%-36s %6s %9s %9s %9s  %s' % ('span', 'count', 'p50 ms', 'p99 ms', 'max ms', 'last')]
+    for name, s in summary.items():
+        lines.append('%-36s %6d %9.1f %9.1f %9.1f  %s' % (name, s['count'], s['p50_ms'], s['p99_ms'], s['max_ms'],
+                                                          ' '.join('%s=%s' % kv for kv in s['last'].items())))
+    return '\n'.join(lines)
+
+
+# GET /metrics -> JSON summary of all spans, /metrics?format=text for a table, ?reset=1 to clear
+def register(server):
+    from flask import jsonify, request
+
+    # Bytes of the JSON response of an instrumented callback, recorded on its span
+    @server.after_request
+    def record_payload(response):
+        counts = getattr(_request, 'counts', None)
+        if counts is not None and request.path.endswith('_dash-update-component'):
+            _request.counts = None
+            if not response.direct_passthrough:
+                counts['payload'] = len(response.get_data())
+        return response
+
+    @server.route('/metrics')
+    def metrics_endpoint():
+        summary = metrics.summary()
+        if request.args.get('reset'):
+            metrics.reset()
+        if request.args.get('format') == 'text':
+            return text_report(summary), 200, {'Content-Type': 'text/plain'}
+        return jsonify(summary)
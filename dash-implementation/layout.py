@@ -0,0 +1,322 @@
+import hashlib
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import networkx as nx
+from result_store import ResultStore
+
+#### Graph Layouts ####
+# Layouts are cached by a fingerprint of the edge set, so revisiting a view never
+# recomputes its layout. A new edge set is laid out starting from the last positions
+# computed with the same engine, so on small filter changes only the changed nodes move.
+# The 'global' engine lays out the full call graph once and every view reuses its positions;
+# when appended calls bring in new nodes it is recomputed, warm started from the old one.
+#
+# With workers > 0, layouts of more than sync_edges edges run in a process pool. request()
+# then returns a coarse layout at once (last positions of the engine, new nodes placed next
+# to a neighbour) and the refined one once its job is done. A session (one open page of the
+# app) moving on to another view cancels the job of its previous view if it has not started
+# and no other session waits for it; jobs requested without a session are never cancelled.
+# Polls for the refined layout (coarse=False) only read the cache and the job board, they
+# never start a job. With a shared board (wsgi.py) a view already being laid out by another
+# worker process is waited for instead of laid out again; a worker can only cancel its own jobs.
+
+graphviz_engines = ['neato', 'sfdp', 'fdp', 'dot']  # Need pygraphviz
+layout_options = [{'label': 'Graphviz ' + e, 'value': e} for e in graphviz_engines] + \
+    [{'label': 'Force directed (fast)', 'value': 'spring'},
+     {'label': 'Global (full graph)', 'value': 'global'}]
+
+
+def fingerprint(edges):
+    return hashlib.sha1(np.ascontiguousarray(edges, dtype=np.int64).tobytes()).hexdigest()
+
+
+def _name(text):
+    return hashlib.sha1(str(text).encode('utf-8')).hexdigest()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass  # Exists, owned by another user
+    return True
+
+
+# Background layout jobs in progress and the sessions waiting for them. Kept in memory by
+# default; with a directory every process sharing it sees the jobs of the others. A job is
+# then a directory holding its owner's pid and one empty file per waiting session, so no
+# update rewrites a file another process may be writing; jobs of a dead owner are stale.
+class JobBoard:
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._waiting = {}  # key -> sessions (in memory)
+        self._sessions = {}  # session -> key of the job it waits for (in memory)
+        if directory is not None:
+            os.makedirs(os.path.join(directory, 'sessions'), exist_ok=True)
+
+    def _job(self, key):
+        return os.path.join(self.directory, 'job-' + _name(key))
+
+    def _session(self, session):
+        return os.path.join(self.directory, 'sessions', _name(session))
+
+    def _owner(self, key):
+        try:
+            with open(os.path.join(self._job(key), 'owner')) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return None
+
+    # Whether a live process computes key
+    def pending(self, key):
+        if self.directory is None:
+            return key in self._waiting
+        owner = self._owner(key)
+        return owner is not None and _alive(owner)
+
+    # Claims the job of key for this process, False if another one holds it
+    def open(self, key):
+        if self.directory is None:
+            if key in self._waiting:
+                return False
+            self._waiting[key] = set()
+            return True
+        path = self._job(key)
+        owner = self._owner(key)
+        if owner is not None and not _alive(owner):
+            shutil.rmtree(path, ignore_errors=True)
+        # Written aside and renamed into place, so a job directory always names its owner
+        tmp = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        os.mkdir(tmp)
+        with open(os.path.join(tmp, 'owner'), 'w') as f:
+            f.write(str(os.getpid()))
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            return False
+        return True
+
+    # Adds session to the waiters of key, returns the key it waited for before (None if none)
+    def wait(self, key, session):
+        if self.directory is None:
+            self._waiting.setdefault(key, set()).add(session)
+            if session is None:
+                return None
+            left, self._sessions[session] = self._sessions.get(session), key
+            return left
+        try:
+            open(os.path.join(self._job(key), _name(session)), 'w').close()
+        except OSError:
+            pass  # Finished meanwhile
+        if session is None:
+            return None
+        path = self._session(session)
+        try:
+            with open(path) as f:
+                left = f.read()
+        except OSError:
+            left = None
+        tmp = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        with open(tmp, 'w') as f:
+            f.write(key)
+        os.replace(tmp, path)
+        return left
+
+    # Removes session from the waiters of key; True if the job is left without any
+    def leave(self, key, session):
+        if self.directory is None:
+            waiting = self._waiting.get(key)
+            if waiting is None:
+                return False
+            waiting.discard(session)
+            return not waiting
+        path = self._job(key)
+        try:
+            os.remove(os.path.join(path, _name(session)))
+            return set(os.listdir(path)) <= {'owner'}
+        except OSError:
+            return False
+
+    # Key of the job session waits for, None if none
+    def current(self, session):
+        if self.directory is None:
+            return self._sessions.get(session)
+        try:
+            with open(self._session(session)) as f:
+                key = f.read()
+        except OSError:
+            return None
+        return key if self.pending(key) else None
+
+    # The job of key is over: forget it and which sessions waited for it
+    def close(self, key):
+        if self.directory is None:
+            for session in self._waiting.pop(key, ()):
+                if self._sessions.get(session) == key:
+                    del self._sessions[session]
+            return
+        path = self._job(key)
+        try:
+            names = os.listdir(path)
+        except OSError:
+            return
+        for name in names:
+            session = os.path.join(self.directory, 'sessions', name)
+            try:
+                with open(session) as f:
+                    if f.read() == key:
+                        os.remove(session)
+            except OSError:
+                pass
+        shutil.rmtree(path, ignore_errors=True)
+
+
+class LayoutEngine:
+    def __init__(self, edges, global_engine='spring', max_entries=32, workers=0, sync_edges=300, cache=None,
+                 board=None):
+        self.edges = edges  # Function returning the edges of all calls, only used for the global layout
+        self.global_engine = global_engine
+        self.cache = cache if cache is not None else ResultStore(max_entries=max_entries)  # Or a SharedResultStore
+        self.previous = {}  # engine -> last positions, used to warm start the next layout
+        self.workers = workers
+        self.sync_edges = sync_edges  # Smaller layouts are computed in the request
+        self.jobs = {}  # key -> future of a background layout of this process
+        self.board = board if board is not None else JobBoard()  # Jobs in progress and their sessions
+        self._pool = None
+        self._global = None
+        self._lock = threading.RLock()  # Cancelling a job runs _finished in the cancelling thread
+
+    # Positions {node: (x, y)} of every node in edges. warm=False lays out a graph on its own,
+    # neither starting from nor replacing the last positions of the engine.
+    def positions(self, edges, engine='neato', warm=True):
+        if engine == 'global':
+            nodes = np.unique(edges)
+            if (nodes < 0).any():
+                raise ValueError('Super-nodes have no global position, place them by their members')
+            full = self.global_positions()
+            if any(n not in full for n in nodes):
+                full = self.global_positions(refresh=True)
+            return {n: full[n] for n in nodes}
+        key = engine + ':' + fingerprint(edges)
+        if not warm:
+            return self.cache.get_or_compute(key, lambda: compute_layout(edges, engine, None))
+        return self.cache.get_or_compute(key, lambda: self._layout(edges, engine))
+
+    # (positions, final): the layout if it is ready, else a coarse one (None without coarse)
+    # while a job computes it. session identifies the page asking, see _release.
+    # coarse=False polls: (None, True) when no job computes the layout any more.
+    def request(self, edges, engine='neato', coarse=True, session=None):
+        if engine == 'global' or not self.workers or len(edges) <= self.sync_edges:
+            return self.positions(edges, engine), True
+        key = engine + ':' + fingerprint(edges)
+        with self._lock:
+            pos = self.cache.get(key)
+            if pos is not None:
+                return pos, True
+            job = self.jobs.get(key)
+            submitted = False
+            if job is None and not self.board.pending(key):
+                if not coarse:
+                    return None, True  # Cancelled or failed, nothing to wait for
+                submitted = self.board.open(key)  # Another process may claim it first
+                if submitted:
+                    if self._pool is None:
+                        self._pool = ProcessPoolExecutor(self.workers)
+                    job = self._pool.submit(compute_layout, edges, engine, self.previous.get(engine))
+                    self.jobs[key] = job
+            left = self.board.wait(key, session)
+            if left is not None and left != key:
+                self._release(left, session)
+        if submitted:
+            # Outside the lock: a job that is already done runs the callback right here
+            job.add_done_callback(lambda f: self._finished(key, engine, f))
+        elif job is not None and job.done() and job.exception() is not None:
+            with self._lock:
+                self.jobs.pop(key, None)
+                self.board.close(key)
+            raise job.exception()
+        return (self.coarse(edges, engine) if coarse else None), False
+
+    # A session left the view of job key: cancel the job once nobody waits for it (if it has
+    # not started and runs in this process, a job of another process runs to its end)
+    def _release(self, key, session):
+        job = self.jobs.get(key)
+        if self.board.leave(key, session) and job is not None:
+            job.cancel()
+
+    # Keeps the result of a finished job; failed jobs stay in jobs so request() raises their error
+    def _finished(self, key, engine, job):
+        with self._lock:
+            failed = not job.cancelled() and job.exception() is not None
+            if not job.cancelled() and not failed:
+                pos = job.result()
+                self.cache.put(key, pos)
+                self.previous[engine] = pos
+            if self.jobs.get(key) is job:
+                if not failed:
+                    del self.jobs[key]
+                self.board.close(key)  # After the cache, so a poll finds one or the other
+
+    # Immediate approximation: nodes keep their last positions with this engine (or in the
+    # global layout), new nodes go next to a placed neighbour, the rest on a circle
+    def coarse(self, edges, engine):
+        known = self.previous.get(engine) or self._global or {}
+        nodes = np.unique(edges)
+        pos = {n: known[n] for n in nodes if n in known}
+        if pos:
+            xy = np.array(list(pos.values()), dtype=float)
+            center, scale = xy.mean(axis=0), max(float(np.ptp(xy, axis=0).max()), 1.0)
+        else:
+            center, scale = np.zeros(2), 1.0
+        rng = np.random.default_rng(1)
+        pairs = edges.tolist()
+        for _ in range(3):
+            for a, b in pairs:
+                for n, m in ((a, b), (b, a)):
+                    if n not in pos and m in pos:
+                        angle = rng.uniform(0, 2 * np.pi)
+                        pos[n] = (pos[m][0] + 0.03 * scale * np.cos(angle), pos[m][1] + 0.03 * scale * np.sin(angle))
+        rest = [n for n in nodes if n not in pos]
+        for i, n in enumerate(rest):
+            angle = 2 * np.pi * i / len(rest)
+            pos[n] = (center[0] + 0.6 * scale * np.cos(angle), center[1] + 0.6 * scale * np.sin(angle))
+        return pos
+
+    def global_positions(self, refresh=False):
+        with self._lock:
+            if self._global is None or refresh:
+                self._global = compute_layout(self.edges(), self.global_engine, self._global)
+        return self._global
+
+    def _layout(self, edges, engine):
+        pos = compute_layout(edges, engine, self.previous.get(engine))
+        self.previous[engine] = pos
+        return pos
+
+
+# Layout of edges with engine, starting from the initial positions it has (runs in pool workers too)
+def compute_layout(edges, engine, initial):
+    G = nx.DiGraph()
+    G.add_edges_from(edges.tolist())
+    known = {n: initial[n] for n in G if initial and n in initial}
+    # Known nodes with no new neighbour keep their position, only the others move
+    fixed = [n for n in known if all(m in known for m in nx.all_neighbors(G, n))]
+    if engine in graphviz_engines:
+        if engine in ('neato', 'fdp'):
+            # neato/fdp start from a node's pos attribute (in inches, layouts come back in points), '!' pins it
+            pinned = set(fixed)
+            for n, (x, y) in known.items():
+                G.nodes[n]['pos'] = '%f,%f%s' % (x / 72, y / 72, '!' if n in pinned else '')
+        return nx.nx_agraph.graphviz_layout(G, prog=engine)
+    if engine == 'spring':
+        # Mostly known nodes only need a few iterations to settle
+        iterations = 15 if len(known) > 0.8 * len(G) else 50
+        pos = nx.spring_layout(G, pos=known or None, fixed=fixed or None, iterations=iterations, seed=1)
+        return {n: (float(x), float(y)) for n, (x, y) in pos.items()}
+    raise ValueError('Unknown layout engine: ' + engine)
@@ -0,0 +1,38 @@
+import numpy as np
+
+#### Number Search ####
+# Prefix index over the numbers of the calls matching the date, time and duration
+# filters, for the caller/receiver dropdowns. The decimal strings are kept sorted, so
+# the numbers starting with a prefix are one searchsorted range; the busiest of them
+# are returned first. Only those few options are ever sent to the browser.
+
+option_limit = 50  # Options returned per search
+
+
+class NumberIndex:
+    def __init__(self, numbers, counts):
+        keys = np.asarray(numbers).astype(str)
+        order = np.argsort(keys)
+        self.keys = keys[order]
+        self.numbers = np.asarray(numbers, dtype=np.int64)[order]
+        self.counts = np.asarray(counts, dtype=np.int64)[order]
+
+    def __len__(self):
+        return len(self.numbers)
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.numbers.nbytes + self.counts.nbytes
+
+    # Up to limit numbers starting with prefix (digits only), most calls first
+    def search(self, prefix='', limit=option_limit):
+        prefix = ''.join(c for c in str(prefix or '') if c.isdigit())
+        lo = np.searchsorted(self.keys, prefix, side='left')
+        hi = np.searchsorted(self.keys, prefix + ':', side='left')  # ':' sorts right after '9'
+        counts = self.counts[lo:hi]
+        if len(counts) > limit:
+            top = np.argpartition(-counts, limit)[:limit]
+        else:
+            top = np.arange(len(counts))
+        top = top[np.lexsort((self.keys[lo:hi][top], -counts[top]))]
+        return self.numbers[lo:hi][top]
@@ -0,0 +1,226 @@
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+#### Indexed Filter Engine ####
+# Calls are kept sorted by timestamp, so a day (partition) or any time window is a
+# contiguous row range found by binary search. Per-subscriber posting lists hold the
+# sorted row ids of calls made and received, so number selections are resolved by
+# slicing those lists to the window and merging them, never by scanning every row.
+#
+# A CallIndex is an immutable snapshot made of one or more time sorted segments.
+# Appending a batch adds a segment (sharing the existing ones) instead of re-sorting
+# everything; segments are merged once there are too many of them.
+#
+# select/calls_of/number_counts/edges/append (with days, max_duration and version)
+# are what the app uses, and are also implemented by the SQL backend in sql_store.py.
+
+max_segments = 8
+
+
+# Concatenate call frames, keeping categorical columns categorical
+def concat_calls(frames):
+    frames = list(frames)
+    df = pd.concat(frames, ignore_index=True)
+    for column in df.columns:
+        if len(frames) > 1 and isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            df[column] = union_categoricals([f[column] for f in frames], ignore_order=True)
+    return df
+
+
+# Unique (caller node, receiver node) pairs of a call frame, sorted
+def edge_array(df):
+    edges = np.stack([df['Caller_node'].to_numpy(dtype=np.int64),
+                      df['Receiver_node'].to_numpy(dtype=np.int64)], axis=1)
+    return np.unique(edges, axis=0) if len(edges) else edges.reshape(0, 2)
+
+
+# CSR posting lists: rows of code c are order[offsets[c]:offsets[c+1]], in ascending row order
+class PostingLists:
+    def __init__(self, codes, n_codes):
+        codes = np.asarray(codes, dtype=np.int64)
+        self.order = np.argsort(codes, kind='stable')
+        self.offsets = np.zeros(n_codes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=n_codes), out=self.offsets[1:])
+
+    @property
+    def nbytes(self):
+        return self.order.nbytes + self.offsets.nbytes
+
+    def rows(self, code, start=0, end=None):
+        if code < 0 or code >= len(self.offsets) - 1:
+            return np.empty(0, dtype=np.int64)
+        rows = self.order[self.offsets[code]:self.offsets[code + 1]]
+        if start > 0 or end is not None:
+            lo = np.searchsorted(rows, start)
+            hi = len(rows) if end is None else np.searchsorted(rows, end)
+            rows = rows[lo:hi]
+        return rows
+
+    # Sorted union of the rows of several codes inside [start, end)
+    def union(self, codes, start=0, end=None):
+        parts = [self.rows(c, start, end) for c in codes]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts))
+
+    def count(self, code):
+        if code < 0 or code >= len(self.offsets) - 1:
+            return 0
+        return int(self.offsets[code + 1] - self.offsets[code])
+
+
+# Time sorted block of calls with its own partitions and posting lists
+class Segment:
+    def __init__(self, df):
+        if not df['Timestamp'].is_monotonic_increasing:
+            df = df.sort_values('Timestamp', kind='stable')
+        self.df = df.reset_index(drop=True)
+        self.timestamps = self.df['Timestamp'].to_numpy()
+        self.durations = self.df['Duration'].to_numpy()
+        n_nodes = int(max(df['Caller_node'].max(), df['Receiver_node'].max())) + 1 if len(df) else 0
+        self.made = PostingLists(self.df['Caller_node'].to_numpy(), n_nodes)
+        self.received = PostingLists(self.df['Receiver_node'].to_numpy(), n_nodes)
+        # Date partitions: days[i] spans rows day_offsets[i]:day_offsets[i+1]
+        days = self.timestamps.astype('datetime64[D]')
+        self.days, starts = np.unique(days, return_index=True)
+        self.day_offsets = np.append(starts, len(df))
+
+    def __len__(self):
+        return len(self.df)
+
+    # Row range [start, end) of calls with start_time <= Timestamp < end_time
+    def time_range(self, start_time, end_time):
+        start = np.searchsorted(self.timestamps, np.datetime64(start_time), side='left')
+        end = np.searchsorted(self.timestamps, np.datetime64(end_time), side='left')
+        return int(start), int(end)
+
+    # Row range of one date partition
+    def day_range(self, date):
+        day = np.datetime64(pd.Timestamp(date).date())
+        i = np.searchsorted(self.days, day)
+        if i == len(self.days) or self.days[i] != day:
+            return 0, 0
+        return int(self.day_offsets[i]), int(self.day_offsets[i + 1])
+
+    def query(self, start_time, end_time, duration_range, option=3, callers=None, receivers=None):
+        start, end = self.time_range(start_time, end_time)
+        if option == 1 and callers is not None:
+            rows = self.made.union(callers, start, end)
+        elif option == 2 and receivers is not None:
+            rows = self.received.union(receivers, start, end)
+        elif option == 3 and (callers is not None or receivers is not None):
+            rows = np.union1d(self.made.union(callers or [], start, end),
+                              self.received.union(receivers or [], start, end))
+        elif option == 4 and callers is not None and receivers is not None:
+            rows = np.intersect1d(self.made.union(callers, start, end),
+                                  self.received.union(receivers, start, end), assume_unique=True)
+        else:
+            rows = np.arange(start, end)
+        durations = self.durations[rows]
+        return rows[(durations >= duration_range[0]) & (durations <= duration_range[1])]
+
+
+class CallIndex:
+    def __init__(self, df=None, segments=None, version=0):
+        self.segments = tuple(segments) if segments is not None else (Segment(df),)
+        self.bases = np.cumsum([0] + [len(s) for s in self.segments])  # First global row id of each segment
+        self.version = version  # Bumped on every append
+        self.days = np.unique(np.concatenate([s.days for s in self.segments]))
+        self.max_duration = max((int(s.durations.max()) for s in self.segments if len(s)), default=0)
+        self._df = None
+
+    def __len__(self):
+        return int(self.bases[-1])
+
+    # All calls as one frame (built on first use)
+    @property
+    def df(self):
+        if self._df is None:
+            if len(self.segments) == 1:
+                self._df = self.segments[0].df
+            else:
+                self._df = concat_calls(s.df for s in self.segments)
+        return self._df
+
+    # Global row ids of calls in a time window, duration range and caller/receiver selection.
+    # option: 1 only caller, 2 only receiver, 3 either, 4 both (as in the filter dropdown).
+    # callers/receivers are node codes, None when nothing is selected.
+    # Rows come back in time order.
+    def query(self, start_time, end_time, duration_range, option=3, callers=None, receivers=None):
+        return self._merge([s.query(start_time, end_time, duration_range, option, callers, receivers)
+                            for s in self.segments])
+
+    # Global row ids of one date partition
+    def day_rows(self, date):
+        return self._merge([np.arange(*s.day_range(date)) for s in self.segments])
+
+    # Global row ids of every call made or received by a node, in time order
+    def rows_of(self, code):
+        return self._merge([np.union1d(s.made.rows(code), s.received.rows(code)) for s in self.segments])
+
+    # Calls made and received by a node
+    def call_count(self, code):
+        return sum(s.made.count(code) + s.received.count(code) for s in self.segments)
+
+    # Timestamps of the given row ids
+    def timestamps(self, rows):
+        if len(self.segments) == 1:
+            return self.segments[0].timestamps[rows]
+        seg = np.searchsorted(self.bases, rows, side='right') - 1
+        out = np.empty(len(rows), dtype=self.segments[0].timestamps.dtype)
+        for i, s in enumerate(self.segments):
+            sel = seg == i
+            if sel.any():
+                out[sel] = s.timestamps[rows[sel] - self.bases[i]]
+        return out
+
+    # Frame of the given row ids, reindexed from 0
+    def take(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(self.segments) == 1:
+            return self.segments[0].df.take(rows).reset_index(drop=True)
+        seg = np.searchsorted(self.bases, rows, side='right') - 1
+        order = np.argsort(seg, kind='stable')
+        parts = [s.df.take(rows[seg == i] - self.bases[i]) for i, s in enumerate(self.segments) if (seg == i).any()]
+        if not parts:
+            return self.segments[0].df.iloc[:0].reset_index(drop=True)
+        df = concat_calls(parts)
+        return df.take(np.argsort(order, kind='stable')).reset_index(drop=True)
+
+    # Frame of the calls matched by query(), in time order
+    def select(self, start_time, end_time, duration_range, option=3, callers=None, receivers=None):
+        return self.take(self.query(start_time, end_time, duration_range, option, callers, receivers))
+
+    # Every call made or received by a node, in time order
+    def calls_of(self, code):
+        return self.take(self.rows_of(code))
+
+    # Distinct numbers in column ('Caller' or 'Receiver') of the calls in a time window and
+    # duration range, with their number of calls
+    def number_counts(self, start_time, end_time, duration_range, column):
+        parts = [s.df[column].to_numpy()[s.query(start_time, end_time, duration_range)] for s in self.segments]
+        return np.unique(np.concatenate(parts), return_counts=True)
+
+    # Unique (caller node, receiver node) pairs of all calls
+    def edges(self):
+        return edge_array(self.df)
+
+    # New snapshot with batch added as a segment; the existing segments are shared
+    def append(self, batch):
+        segments = list(self.segments) + [Segment(batch)]
+        if len(segments) > max_segments:
+            # Merge the appended segments, or everything once they rival the first one
+            tail = sum(len(s) for s in segments[1:])
+            if tail * 4 > len(segments[0]):
+                segments = [Segment(concat_calls(s.df for s in segments))]
+            else:
+                segments = [segments[0], Segment(concat_calls(s.df for s in segments[1:]))]
+        return CallIndex(segments=segments, version=self.version + 1)
+
+    # Local row arrays (one per segment) -> global rows, in time order across segments
+    def _merge(self, parts):
+        rows = np.concatenate([p + b for p, b in zip(parts, self.bases)]) if parts else np.empty(0, dtype=np.int64)
+        if len(self.segments) > 1 and len(rows):
+            rows = rows[np.argsort(self.timestamps(rows), kind='stable')]
+        return rows
@@ -0,0 +1,136 @@
+import io
+import numpy as np
+import pandas as pd
+from matplotlib import cm
+import matplotlib.image
+from render import node_positions
+
+#### Raster Tiles ####
+# Very large views are drawn server side as images instead of one shape per edge. The
+# layout is fitted into a square world that is cut into a pyramid of tiles: zoom level z
+# has 2^z x 2^z tiles of tile_size pixels. A tile is rendered by clipping every edge to
+# it and sampling one point per pixel along what is left; the samples are counted per
+# pixel with bincount, weighted by the calls on the edge. Pixels take the viridis colour
+# of the mean duration of their calls (the colour scale of the interactive figure) and
+# get more opaque the more calls cross them. Tile (x, y) counts from the bottom left.
+
+tile_size = 256
+max_zoom = 12
+raster_calls = 200000  # Views with more calls are drawn as tiles in 'auto' detail mode
+raster_points = 3000  # Nodes in the visible range drawn as interactive points up to this many
+max_samples = 2 * 10**6  # Edge samples drawn at once
+max_node_pixels = tile_size * tile_size // 16  # Tiles with more node pixels leave the nodes out
+colours = cm.get_cmap('viridis', 256)(np.arange(256))  # Duration -> RGBA lookup table
+
+
+class Raster:
+    def __init__(self, pos, src, dst, durations, max_duration):
+        self.nodes, self.xy = node_positions(pos)
+        # One segment per (caller, receiver) pair with its call count and mean call duration
+        edges = pd.DataFrame({'src': np.asarray(src, dtype=np.int64), 'dst': np.asarray(dst, dtype=np.int64),
+                              'duration': np.asarray(durations, dtype=np.float64)})
+        edges = edges.groupby(['src', 'dst'])['duration'].agg(['size', 'mean']).reset_index()
+        self.a = self.xy[np.searchsorted(self.nodes, edges['src'].to_numpy())]
+        self.b = self.xy[np.searchsorted(self.nodes, edges['dst'].to_numpy())]
+        self.calls = edges['size'].to_numpy(dtype=np.float64)
+        self.shade = np.clip(edges['mean'].to_numpy() / max(max_duration, 1), 0, 1)
+        if len(self.xy):
+            low, high = self.xy.min(axis=0), self.xy.max(axis=0)
+        else:
+            low, high = np.zeros(2), np.zeros(2)
+        self.size = 1.1 * max(float((high - low).max()), 1e-9)
+        self.origin = (low + high) / 2 - self.size / 2  # Bottom left corner of the world
+
+    def __len__(self):
+        return len(self.calls)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.nodes, self.xy, self.a, self.b, self.calls, self.shade))
+
+    # Bottom left corner and width of a tile
+    def tile_bounds(self, z, x, y):
+        width = self.size / 2 ** z
+        return self.origin + np.array([x, y]) * width, width
+
+    # Zoom level for a visible range (a few tiles across it) and the tiles (x, y) covering it
+    def tiles(self, x_range=None, y_range=None, across=2, limit=36):
+        if x_range is None or y_range is None:
+            return 0, [(0, 0)]
+        span = max(x_range[1] - x_range[0], y_range[1] - y_range[0], 1e-12)
+        z = int(np.clip(np.ceil(np.log2(across * self.size / span)), 0, max_zoom))
+        while True:
+            width = self.size / 2 ** z
+            xs = np.clip(np.floor((np.array(x_range) - self.origin[0]) / width), 0, 2 ** z - 1).astype(int)
+            ys = np.clip(np.floor((np.array(y_range) - self.origin[1]) / width), 0, 2 ** z - 1).astype(int)
+            if (xs[1] - xs[0] + 1) * (ys[1] - ys[0] + 1) <= limit or z == 0:
+                return z, [(x, y) for x in range(xs[0], xs[1] + 1) for y in range(ys[0], ys[1] + 1)]
+            z -= 1
+
+    # Nodes and positions inside a range
+    def points(self, x_range, y_range):
+        inside = ((self.xy[:, 0] >= x_range[0]) & (self.xy[:, 0] <= x_range[1]) &
+                  (self.xy[:, 1] >= y_range[0]) & (self.xy[:, 1] <= y_range[1]))
+        return self.nodes[inside], self.xy[inside]
+
+    # RGBA image (tile_size x tile_size, floats, top row first) of a tile
+    def render(self, z, x, y):
+        corner, width = self.tile_bounds(z, x, y)
+        scale = tile_size / width
+        calls = np.zeros(tile_size * tile_size)
+        shade = np.zeros(tile_size * tile_size)
+        a, b, t0, t1 = clip((self.a - corner) * scale, (self.b - corner) * scale, tile_size)
+        keep = np.flatnonzero(t1 >= t0)
+        d = b[keep] - a[keep]
+        start = a[keep] + t0[keep, None] * d
+        d = (t1[keep] - t0[keep])[:, None] * d
+        steps = np.ceil(np.abs(d).max(axis=1)).astype(np.int64) + 1  # About one sample per pixel
+        ends = np.cumsum(steps)
+        first = 0
+        while first < len(keep):
+            # Edges in chunks of about max_samples samples
+            last = max(int(np.searchsorted(ends, ends[first] - steps[first] + max_samples, side='right')), first + 1)
+            n = steps[first:last]
+            base = ends[first:last] - n  # Index of the first sample of each edge
+            edge = np.repeat(np.arange(first, last), n)
+            t = (np.arange(base[0], ends[last - 1]) - np.repeat(base, n) + 0.5) / np.repeat(n, n)
+            p = np.clip((start[edge] + t[:, None] * d[edge]).astype(np.int64), 0, tile_size - 1)
+            pixel = p[:, 1] * tile_size + p[:, 0]
+            weight = self.calls[keep[edge]]
+            calls += np.bincount(pixel, weights=weight, minlength=len(calls))
+            shade += np.bincount(pixel, weights=weight * self.shade[keep[edge]], minlength=len(shade))
+            first = last
+        image = colours[(255 * shade / np.maximum(calls, 1e-12)).astype(np.int64)]
+        image[:, 3] = np.where(calls > 0, 0.2 + 0.8 * (1 - np.exp(-calls / 4)), 0)
+        # Nodes as small dark squares once they are sparse enough not to hide the edges
+        radius = 0 if z < 4 else 1
+        p = np.floor((self.xy - corner) * scale).astype(np.int64)
+        p = p[(p >= -radius).all(axis=1) & (p < tile_size + radius).all(axis=1)]
+        if len(p) * (2 * radius + 1) ** 2 > max_node_pixels:
+            p = p[:0]
+        for dx in range(-radius, radius + 1):
+            for dy in range(-radius, radius + 1):
+                q = p + [dx, dy]
+                q = q[(q >= 0).all(axis=1) & (q < tile_size).all(axis=1)]
+                image[q[:, 1] * tile_size + q[:, 0]] = [0.15, 0.15, 0.15, 1]
+        return image.reshape(tile_size, tile_size, 4)[::-1]
+
+    def png(self, z, x, y):
+        buffer = io.BytesIO()
+        matplotlib.image.imsave(buffer, self.render(z, x, y), format='png')
+        return buffer.getvalue()
+
+
+# Clip segments a -> b (pixel coordinates) to the box [0, size]^2 (Liang-Barsky).
+# Returns a, b and the parameters t0, t1 of the visible part; t0 > t1 where nothing is visible.
+def clip(a, b, size):
+    d = b - a
+    t0 = np.zeros(len(a))
+    t1 = np.ones(len(a))
+    for p, q in ((-d[:, 0], a[:, 0]), (d[:, 0], size - a[:, 0]), (-d[:, 1], a[:, 1]), (d[:, 1], size - a[:, 1])):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = q / p
+        t0 = np.where(p < 0, np.maximum(t0, r), t0)
+        t1 = np.where(p > 0, np.minimum(t1, r), t1)
+        t1 = np.where((p == 0) & (q < 0), -1.0, t1)
+    return a, b, t0, t1
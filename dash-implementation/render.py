@@ -0,0 +1,76 @@
+import numpy as np
+from matplotlib import cm
+
+#### Figure Rendering ####
+# Edges are drawn as a handful of traces, one per duration colour bin, each holding
+# NaN separated line segments, instead of one trace per call. Large figures switch
+# to WebGL traces.
+
+colour_bins = 12
+viridis = cm.get_cmap('viridis', colour_bins)  # Color scale of edges
+webgl_threshold = 5000  # Segments/points above which WebGL traces are used
+
+
+def rgba(colour):
+    r, g, b, a = colour
+    return 'rgba(%d, %d, %d, %.2f)' % (r * 255, g * 255, b * 255, a)
+
+
+# Duration -> colour bin, the same quantization the 12 colour viridis map applies
+def duration_bins(durations, max_duration, bins=colour_bins):
+    scaled = np.asarray(durations, dtype=np.float64) / max(max_duration, 1)
+    return np.clip((scaled * bins).astype(np.int64), 0, bins - 1)
+
+
+# {node: (x, y)} -> sorted node array and matching (n, 2) coordinate array
+def node_positions(pos):
+    nodes = np.fromiter(pos.keys(), dtype=np.int64, count=len(pos))
+    xy = np.array(list(pos.values()), dtype=np.float64).reshape(len(pos), 2)
+    order = np.argsort(nodes)
+    return nodes[order], xy[order]
+
+
+# Interleave segment endpoints with NaN breaks: x0, x1, nan, x0, x1, nan, ...
+def segments(start, end):
+    coords = np.empty((len(start), 3))
+    coords[:, 0] = start
+    coords[:, 1] = end
+    coords[:, 2] = np.nan
+    return coords.ravel()
+
+
+# every_bin gives one trace per colour bin, empty ones included (animation frames need a fixed set of traces)
+def edge_traces(nodes, xy, src, dst, durations, max_duration, webgl=None, every_bin=False):
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    bins = duration_bins(durations, max_duration)
+    # Identical segments of the same colour draw the same pixels, keep one
+    keys = np.unique((bins * len(nodes) + np.searchsorted(nodes, src)) * len(nodes) + np.searchsorted(nodes, dst))
+    bins, rest = np.divmod(keys, len(nodes) * len(nodes))
+    i, j = np.divmod(rest, len(nodes))
+    if webgl is None:
+        webgl = len(keys) > webgl_threshold
+    traces = []
+    for b in (range(colour_bins) if every_bin else np.unique(bins)):
+        sel = bins == b
+        traces.append(dict(type='scattergl' if webgl else 'scatter',
+                           x=segments(xy[i[sel], 0], xy[j[sel], 0]),
+                           y=segments(xy[i[sel], 1], xy[j[sel], 1]),
+                           line=dict(width=0.5, color=rgba(viridis(int(b)))),
+                           hoverinfo='none',
+                           mode='lines'))  # Graph object for all connections of one colour
+    return traces
+
+
+# Node points, each carrying its node number as customdata
+def node_trace(xy, nodes, webgl=None):
+    if webgl is None:
+        webgl = len(xy) > webgl_threshold
+    return dict(type='scattergl' if webgl else 'scatter',
+                x=xy[:, 0], y=xy[:, 1],
+                customdata=nodes,
+                mode='markers',
+                hoverinfo='text',
+                marker=dict(
+                    size=10,
+                    line=dict(width=2)))  # Object for point scatter plot
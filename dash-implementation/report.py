@@ -0,0 +1,101 @@
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from analysis import open_calls, time_window, subscriber_report, component_table
+
+#### Batch Reports ####
+# Statistics, connected component and top talkers of every number in a target list,
+# computed headlessly for overnight casework. Targets are split into chunks that a
+# process pool works through; every worker opens the calls itself (the pandas backend
+# memory-maps the Feather cache, the SQL backends open their own connection) and only
+# loads the calls of its chunk. The result is one row per target, written as CSV or
+# Parquet by the extension of --out.
+#
+#   python report.py targets.txt --out report.parquet --workers 8
+#   python report.py targets.txt --out report.csv --start 2020-06-01 --end 2020-06-30
+
+_calls = None  # Calls of a pool worker
+
+
+def _open(data_path, backend):
+    global _calls
+    _calls = open_calls(data_path, backend)[0]
+
+
+def _report_chunk(args):
+    codes, start, end, talkers = args
+    return subscriber_report(_calls, codes, start, end, talkers)
+
+
+# Phone numbers in a targets file: every run of digits (one per line, or a CSV column of them)
+def read_targets(path):
+    with open(path) as f:
+        numbers = [int(n) for n in re.findall(r'\d{6,}', f.read())]
+    return list(dict.fromkeys(numbers))
+
+
+def write_table(table, path):
+    if path.endswith('.parquet'):
+        # Number columns holding "None" are mixed, Parquet columns need one type
+        table.astype({c: str for c in table.columns if table[c].dtype == object}).to_parquet(path, index=False)
+    else:
+        table.to_csv(path, index=False)
+
+
+def report(data_path, numbers, backend='pandas', start=None, end=None, workers=os.cpu_count(), chunk=500, talkers=3):
+    calls, subscribers = open_calls(data_path, backend)
+    start, end = time_window(calls, start, end)
+    codes = subscribers.encode(numbers)
+    known = np.unique(codes[codes >= 0])  # Each node once, however often it is listed
+    chunks = [(known[i:i + chunk], start, end, talkers) for i in range(0, len(known), chunk)]
+    if workers and len(chunks) > 1:
+        if backend != 'pandas':
+            calls.close()  # Connections are not shared with forked workers
+        with ProcessPoolExecutor(workers, initializer=_open, initargs=(data_path, backend)) as pool:
+            parts = list(pool.map(_report_chunk, chunks))
+        calls = open_calls(data_path, backend)[0]
+    else:
+        global _calls
+        _calls = calls
+        parts = [_report_chunk(c) for c in chunks]
+    stats = pd.concat(parts) if parts else pd.DataFrame()
+    table = pd.DataFrame({'number': np.asarray(numbers, dtype=np.int64)}, index=codes)
+    table['status'] = np.where(codes < 0, 'unknown number', 'no calls in window')
+    table = table.join(stats)
+    table.loc[table.index.isin(stats.index), 'status'] = 'ok'
+    if len(known):
+        table = table.join(component_table(calls, known, start, end))
+    # Targets without calls leave gaps in the count columns, keep them integers
+    counts = [c for c in table.columns if c in stats.columns and stats[c].dtype.kind in 'iu'] + \
+        [c for c in ('component', 'componentSize') if c in table.columns]
+    return table.astype({c: 'Int64' for c in counts}).reset_index(drop=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Per-number statistics, components and top talkers for a list of targets')
+    parser.add_argument('targets', help='file with the target phone numbers')
+    parser.add_argument('--out', required=True, help='output file, .csv or .parquet')
+    parser.add_argument('--data', default=os.environ.get('CDR_DATA', './data/data.csv'), help='calls (.csv or .parquet)')
+    parser.add_argument('--backend', default=os.environ.get('CDR_BACKEND', 'pandas'), help='pandas, sqlite or duckdb')
+    parser.add_argument('--start', help='first day (default: first day of the calls)')
+    parser.add_argument('--end', help='last day, inclusive (default: last day of the calls)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes (0: none)')
+    parser.add_argument('--chunk', type=int, default=500, help='targets per task')
+    parser.add_argument('--talkers', type=int, default=3, help='top talkers listed per number')
+    args = parser.parse_args(argv)
+
+    began = time.perf_counter()
+    numbers = read_targets(args.targets)
+    table = report(args.data, numbers, args.backend, args.start, args.end, args.workers, args.chunk, args.talkers)
+    write_table(table, args.out)
+    print('%d targets (%d with calls) -> %s in %.1f s' % (len(table), int((table['status'] == 'ok').sum()),
+                                                        args.out, time.perf_counter() - began), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
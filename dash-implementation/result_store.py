@@ -0,0 +1,165 @@
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+#### Server-side Result Store ####
+# LRU cache for filtered views and anything derived from them. Entries are keyed by
+# small strings (the browser only ever holds the key) and evicted least recently used
+# first once either the entry count or the memory budget is exceeded.
+#
+# SharedResultStore keeps entries as pickle files in a directory, so every worker process
+# of a multi-worker server (see wsgi.py) sees what the others computed.
+
+
+# Approximate memory held by a cached value
+def sizeof(value):
+    # Deep, so the strings of object columns (numbers in the stats table) count too
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value.values())
+    # Arrays, and the index and graph objects built per view (PostingLists, Components, ...)
+    nbytes = getattr(value, 'nbytes', None)
+    if nbytes is not None:
+        return int(nbytes)
+    return sys.getsizeof(value)
+
+
+class ResultStore:
+    def __init__(self, max_entries=64, max_bytes=256 * 2**20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        size = sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            # Evict least recently used entries, always keeping the newest one
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self.nbytes > self.max_bytes):
+                self.nbytes -= self._entries.popitem(last=False)[1][1]
+        return value
+
+    # Return the cached value for key, computing and storing it on a miss
+    def get_or_compute(self, key, compute):
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = self.put(key, compute())
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+# Same interface as ResultStore, backed by one pickle file per key in directory, with the
+# values this process used recently kept in memory. The least recently used files are
+# removed once the directory grows past max_bytes.
+class SharedResultStore:
+    def __init__(self, directory, max_bytes=2 * 2**30, local_entries=16):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.local = ResultStore(max_entries=local_entries)
+        self._written = 0  # Bytes written since the directory was last trimmed
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.pkl')
+
+    def __len__(self):
+        return sum(1 for name in os.listdir(self.directory) if name.endswith('.pkl'))
+
+    def __contains__(self, key):
+        return key in self.local or os.path.exists(self._path(key))
+
+    def get(self, key, default=None):
+        value = self.local.get(key, _missing)
+        if value is not _missing:
+            return value
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)  # Recently used, trimmed last
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return default
+        return self.local.put(key, value)
+
+    def put(self, key, value):
+        self.local.put(key, value)
+        path = self._path(key)
+        tmp = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+        with open(tmp, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._written += f.tell()
+        os.replace(tmp, path)
+        if self._written > self.max_bytes // 8:
+            self.trim()
+        return value
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = self.put(key, compute())
+        return value
+
+    # Remove least recently used files until the directory fits in max_bytes
+    def trim(self):
+        self._written = 0
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.pkl'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, name))
+        total = sum(f[1] for f in files)
+        for mtime, size, name in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        self.local.clear()
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+
+_missing = object()
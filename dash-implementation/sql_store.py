@@ -0,0 +1,243 @@
+import copy
+import os
+import threading
+import numpy as np
+import pandas as pd
+from ingest import parse_calls, read_raw_chunks, cache_paths
+from subscribers import SubscriberDict
+
+#### Out-of-core Call Store ####
+# Calls kept in an embedded on-disk database (SQLite, or DuckDB when installed) instead
+# of in memory. The date/time/duration/number predicates of the filters run as SQL, so
+# only the matching calls are ever loaded. Calls carry their day (days since epoch) as a
+# partition column and are indexed on (day, ts), (caller_node, ts) and (receiver_node, ts).
+# Same interface as query.CallIndex: select, calls_of, number_counts, edges, append.
+# Connections are opened on first use in each process and thread, so the forked workers of
+# a preloaded gunicorn master (wsgi.py) open their own instead of sharing the master's.
+#
+#   CDR_BACKEND=sqlite python dash_script.py      (or CDR_BACKEND=duckdb)
+
+engines = ['sqlite', 'duckdb']
+day_ns = 86400 * 10**9
+
+schema = '''CREATE TABLE calls (caller BIGINT, receiver BIGINT, ts BIGINT, day INTEGER, duration INTEGER,
+                                tower VARCHAR, imei VARCHAR, caller_node INTEGER, receiver_node INTEGER)'''
+indexes = ['CREATE INDEX calls_day ON calls (day, ts)',
+           'CREATE INDEX calls_caller ON calls (caller_node, ts)',
+           'CREATE INDEX calls_receiver ON calls (receiver_node, ts)']
+columns = 'caller, receiver, ts, duration, tower, imei, caller_node, receiver_node'
+
+
+def db_path(csv_path, engine):
+    return os.path.splitext(csv_path)[0] + '.' + engine
+
+
+# read_only lets several processes open a DuckDB database at once
+def connect(path, engine, read_only=False):
+    if engine == 'duckdb':
+        import duckdb
+        return duckdb.connect(path, read_only=read_only)
+    if engine == 'sqlite':
+        import sqlite3
+        if read_only:
+            return sqlite3.connect('file:%s?mode=ro' % path, uri=True)
+        return sqlite3.connect(path)
+    raise ValueError('Unknown storage engine: ' + engine)
+
+
+# Typed call frame (see ingest.parse_calls) -> table columns
+def table_frame(df):
+    ts = df['Timestamp'].to_numpy().astype('datetime64[ns]').view(np.int64)
+    return pd.DataFrame({
+        'caller': df['Caller'].to_numpy(), 'receiver': df['Receiver'].to_numpy(),
+        'ts': ts, 'day': ts // day_ns, 'duration': df['Duration'].to_numpy(dtype=np.int64),
+        'tower': df['TowerID'].astype(str).to_numpy(), 'imei': df['IMEI'].astype(str).to_numpy(),
+        'caller_node': df['Caller_node'].to_numpy(dtype=np.int64),
+        'receiver_node': df['Receiver_node'].to_numpy(dtype=np.int64)})
+
+
+# Query result -> typed call frame
+def call_frame(raw):
+    return pd.DataFrame({
+        'Caller': raw['caller'].astype('int64'), 'Receiver': raw['receiver'].astype('int64'),
+        'Timestamp': pd.to_datetime(raw['ts'].astype('int64')),
+        'Duration': raw['duration'].astype('uint16'),
+        'TowerID': raw['tower'].astype('category'), 'IMEI': raw['imei'].astype('category'),
+        'Caller_node': raw['caller_node'].astype('uint32'), 'Receiver_node': raw['receiver_node'].astype('uint32')})
+
+
+# "column IN (...)" with its parameters; an empty selection matches nothing
+def in_list(column, codes):
+    if not codes:
+        return '1 = 0', []
+    return '%s IN (%s)' % (column, ', '.join('?' * len(codes))), [int(c) for c in codes]
+
+
+def ns(time):
+    return int(pd.Timestamp(time).value)
+
+
+class SQLCallStore:
+    def __init__(self, path, engine='sqlite', read_only=False):
+        self.path = path
+        self.engine = engine
+        self.read_only = read_only
+        self.version = 0  # Bumped on every append
+        self._pid = None  # Process the connections below belong to
+        self._local = None  # One connection (DuckDB: cursor) per thread
+        self._shared = None  # DuckDB database the cursors come from
+        self._open_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.days = self._days()
+        self.max_duration = int(self._execute('SELECT MAX(duration) FROM calls').fetchall()[0][0] or 0)
+
+    def _connection(self):
+        with self._open_lock:
+            if self._pid != os.getpid():
+                # First use, or first use after a fork: connections of the parent are left alone
+                self._pid, self._local, self._shared = os.getpid(), threading.local(), None
+            con = getattr(self._local, 'con', None)
+            if con is None:
+                if self.engine == 'duckdb':
+                    if self._shared is None:
+                        self._shared = connect(self.path, self.engine, self.read_only)
+                    con = self._shared.cursor()
+                else:
+                    con = connect(self.path, self.engine, self.read_only)
+                self._local.con = con
+        return con
+
+    # Closes this thread's connection (and the shared DuckDB database); the next query reopens them
+    def close(self):
+        if self._pid != os.getpid():
+            return
+        with self._open_lock:
+            con = getattr(self._local, 'con', None)
+            if con is not None:
+                con.close()
+                self._local.con = None
+            if self._shared is not None:
+                self._shared.close()
+                self._shared, self._local = None, threading.local()  # Cursors of other threads are gone too
+
+    def _execute(self, sql, params=()):
+        return self._connection().execute(sql, list(params))
+
+    def _fetch(self, sql, params=()):
+        cursor = self._execute(sql, params)
+        names = [d[0] for d in cursor.description]
+        return pd.DataFrame.from_records(cursor.fetchall(), columns=names)
+
+    def _days(self):
+        days = [d for d, in self._execute('SELECT DISTINCT day FROM calls ORDER BY day').fetchall()]
+        return np.array(days, dtype='datetime64[D]')
+
+    def __len__(self):
+        return int(self._execute('SELECT COUNT(*) FROM calls').fetchall()[0][0])
+
+    # Calls with start_time <= Timestamp < end_time, a duration in duration_range and the
+    # caller/receiver selection (option as in CallIndex.query), in time order
+    def select(self, start_time, end_time, duration_range, option=3, callers=None, receivers=None):
+        start, end = ns(start_time), ns(end_time)
+        where = ['day BETWEEN ? AND ?', 'ts >= ?', 'ts < ?', 'duration BETWEEN ? AND ?']
+        params = [start // day_ns, (end - 1) // day_ns, start, end, int(duration_range[0]), int(duration_range[1])]
+        if option == 1 and callers is not None:
+            clauses = [in_list('caller_node', callers)]
+        elif option == 2 and receivers is not None:
+            clauses = [in_list('receiver_node', receivers)]
+        elif option == 3 and (callers is not None or receivers is not None):
+            made, received = in_list('caller_node', callers or []), in_list('receiver_node', receivers or [])
+            clauses = [('(%s OR %s)' % (made[0], received[0]), made[1] + received[1])]
+        elif option == 4 and callers is not None and receivers is not None:
+            clauses = [in_list('caller_node', callers), in_list('receiver_node', receivers)]
+        else:
+            clauses = []
+        for clause, values in clauses:
+            where.append(clause)
+            params += values
+        return call_frame(self._fetch('SELECT %s FROM calls WHERE %s ORDER BY ts, rowid'
+                                      % (columns, ' AND '.join(where)), params))
+
+    # Every call made or received by a node, in time order
+    def calls_of(self, code):
+        return call_frame(self._fetch('SELECT %s FROM calls WHERE caller_node = ? OR receiver_node = ? ORDER BY ts, rowid'
+                                      % columns, [int(code), int(code)]))
+
+    # Distinct numbers in column ('Caller' or 'Receiver') of the calls in a time window and
+    # duration range, with their number of calls
+    def number_counts(self, start_time, end_time, duration_range, column):
+        start, end = ns(start_time), ns(end_time)
+        name = column.lower()
+        rows = self._execute('SELECT %s, COUNT(*) FROM calls WHERE day BETWEEN ? AND ? AND ts >= ? AND ts < ? '
+                             'AND duration BETWEEN ? AND ? GROUP BY %s ORDER BY %s' % (name, name, name),
+                             [start // day_ns, (end - 1) // day_ns, start, end,
+                              int(duration_range[0]), int(duration_range[1])]).fetchall()
+        rows = np.array(rows, dtype=np.int64).reshape(-1, 2)
+        return rows[:, 0], rows[:, 1]
+
+    # Unique (caller node, receiver node) pairs of all calls
+    def edges(self):
+        rows = self._execute('SELECT DISTINCT caller_node, receiver_node FROM calls ORDER BY 1, 2').fetchall()
+        return np.array(rows, dtype=np.int64).reshape(-1, 2)
+
+    # Write typed calls to the table
+    def insert(self, df):
+        if not len(df):
+            return
+        table = table_frame(df)
+        with self._write_lock:
+            con = self._connection()
+            if self.engine == 'duckdb':
+                con.register('batch', table)
+                con.execute('INSERT INTO calls SELECT * FROM batch')
+                con.unregister('batch')
+            else:
+                con.executemany('INSERT INTO calls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                zip(*[table[c].tolist() for c in table.columns]))
+                con.commit()
+
+    # Inserts batch and returns a handle with a new version. Unlike CallIndex snapshots the
+    # table is shared, so older handles see the new calls too; the version only keys caches.
+    def append(self, batch):
+        self.insert(batch)
+        store = copy.copy(self)
+        store.version = self.version + 1
+        store.days = np.union1d(self.days, batch['Timestamp'].to_numpy().astype('datetime64[D]'))
+        store.max_duration = max(self.max_duration, int(batch['Duration'].max()) if len(batch) else 0)
+        return store
+
+
+# Load csv_path into a new database chunk by chunk, never holding all calls in memory
+def build(csv_path, path, engine, subscribers, chunk=10**6):
+    con = connect(path, engine)
+    con.execute(schema)
+    con.close()
+    store = SQLCallStore(path, engine)
+    for raw in read_raw_chunks(csv_path, chunk):
+        store.insert(parse_calls(raw, subscribers))
+    con = store._connection()
+    for sql in indexes:
+        con.execute(sql)
+    if engine == 'sqlite':
+        con.execute('ANALYZE')
+        con.commit()
+    store.close()
+
+
+# Store (and subscriber dictionary) for csv_path, built on first use or when the source is newer
+def open_store(csv_path, engine='sqlite', read_only=False):
+    path = db_path(csv_path, engine)
+    subscribers_path = cache_paths(csv_path)[1]
+    if not (os.path.exists(path) and os.path.exists(subscribers_path)
+            and os.path.getmtime(path) >= os.path.getmtime(csv_path)):
+        if os.path.exists(subscribers_path):
+            subscribers = SubscriberDict.load(subscribers_path)
+        else:
+            subscribers = SubscriberDict()
+        tmp = path + '.tmp'
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        build(csv_path, tmp, engine, subscribers)
+        subscribers.save(subscribers_path)
+        os.replace(tmp, path)
+    return SQLCallStore(path, engine, read_only), SubscriberDict.load(subscribers_path)
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 def meanDur(nodeNumber,df):
     #print(df['Caller_node'].unique(),df['Receiver_node'].unique(),nodeNumber)
@@ -13,9 +14,9 @@ def peakHours(nodeNumber,df):
         m[i] = 0
     df1 = df[(df['Caller_node'] == nodeNumber) | (df['Receiver_node'] == nodeNumber) ]
     for i in list(df1.index):
-        h = int(df1.at[i,'Time'][0:2])
-        min = int(df1.at[i,'Time'][3:5])
-        dur = df1.at[i,'Duration']
+        h = df1.at[i,'Timestamp'].hour
+        min = df1.at[i,'Timestamp'].minute
+        dur = int(df1.at[i,'Duration'])
         min = 60-min
         if(dur>min):
              m[h]+=min
@@ -90,3 +91,61 @@ def mostCalls(nodeNumber,df):
 
     return z
 
+
+#### Vectorized statistics for every node at once ####
+
+# Minutes of talk time of each call falling in each hour of the day, shape (calls, 24).
+# start is the minute of the day the call starts at; calls spill over hour
+# (and day) boundaries just like in peakHours.
+def hourMinutes(start, dur):
+    bins = 60*np.arange(24)
+    def covered(t):  # minutes in each hour bin between minute 0 and t
+        t = t[:, None]
+        return (t//1440)*60 + np.clip(t%1440 - bins, 0, 60)
+    return covered(start + dur) - covered(start)
+
+#returns the counterpart number talked to most for each node in nodes,
+#ties go to the counterpart seen first, "None" when there is none
+def topCounterparty(nodes, node, other, row):
+    g = pd.DataFrame({'node': node, 'other': other, 'row': row}).groupby(['node', 'other'])['row'].agg(['size', 'min']).reset_index()
+    g = g.sort_values(['node', 'size', 'min'], ascending=[True, False, True]).drop_duplicates('node')
+    top = pd.Series(g['other'].to_numpy(), index=g['node'].to_numpy(), dtype=object).reindex(nodes)
+    return top.where(top.notna(), "None").to_numpy()
+
+#returns a table indexed by node number with the statistics of every node in df:
+#meanDur, the top 3 peakHours (peakHour1..3 with their minutes peakMinutes1..3),
+#outgoing and incoming call counts, and mostCallsTo/From/mostCalls as in mostCalls
+def nodeStats(df, chunk=2**20):
+    caller = df['Caller_node'].to_numpy(dtype=np.int64)
+    receiver = df['Receiver_node'].to_numpy(dtype=np.int64)
+    dur = df['Duration'].to_numpy(dtype=np.int64)
+    start = (df['Timestamp'].dt.hour*60 + df['Timestamp'].dt.minute).to_numpy(dtype=np.int64)
+    rows = np.arange(len(df))
+    # Every call counts once for each of its (distinct) ends
+    other = receiver != caller
+    node = np.concatenate([caller, receiver[other]])
+    row = np.concatenate([rows, rows[other]])
+    nodes, inv = np.unique(node, return_inverse=True)
+    k = len(nodes)
+
+    calls = np.bincount(inv, minlength=k)
+    meanDur = np.bincount(inv, weights=dur[row], minlength=k)/calls
+    hist = np.zeros((k, 24))
+    for i in range(0, len(row), chunk):
+        minutes = hourMinutes(start[row[i:i+chunk]], dur[row[i:i+chunk]])
+        for h in range(24):
+            hist[:, h] += np.bincount(inv[i:i+chunk], weights=minutes[:, h], minlength=k)
+    peak = np.argsort(-hist, axis=1, kind='stable')[:, :3]
+
+    table = pd.DataFrame({'meanDur': meanDur,
+                          'outgoing': np.bincount(np.searchsorted(nodes, caller), minlength=k),
+                          'incoming': np.bincount(np.searchsorted(nodes, receiver), minlength=k)}, index=nodes)
+    for i in range(3):
+        table['peakHour'+str(i+1)] = peak[:, i]
+        table['peakMinutes'+str(i+1)] = hist[np.arange(k), peak[:, i]].astype(np.int64)
+    callerNumber = df['Caller'].to_numpy()
+    receiverNumber = df['Receiver'].to_numpy()
+    table['mostCallsTo'] = topCounterparty(nodes, caller, receiverNumber, rows)
+    table['mostCallsFrom'] = topCounterparty(nodes, receiver[other], callerNumber[other], rows[other])
+    table['mostCalls'] = topCounterparty(nodes, node, np.concatenate([receiverNumber, callerNumber[other]]), row)
+    return table
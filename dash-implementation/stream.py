@@ -0,0 +1,124 @@
+import glob
+import io
+import os
+import socketserver
+import sys
+import threading
+import time
+import pandas as pd
+from ingest import parse_calls, read_raw, csv_dtypes, data_columns
+from query import concat_calls
+
+#### Live Ingestion ####
+# Appends micro-batches of CDR rows to the running app. Every batch extends the
+# subscriber dictionary and is added to the call index as a new segment, giving a new
+# CallIndex snapshot; callbacks pick up the new snapshot on their next run.
+# Sources: a spool directory polled for new .csv/.parquet files (write them under a
+# temporary name starting with '.' and rename when complete) and a TCP socket taking
+# one CSV row (Caller,Receiver,Date,Time,Duration,TowerID,IMEI) per line.
+
+
+# Directory the batches appended to the in-memory calls of data_path are kept in, one per
+# dataset (data/calls.csv -> data/calls.stream) like its cache
+def stream_dir(data_path):
+    return os.path.splitext(data_path)[0] + '.stream'
+
+
+class LiveData:
+    def __init__(self, calls, subscribers, subscribers_path, store_dir=None):
+        self.calls = calls  # Current CallIndex snapshot, replaced on every append
+        self.subscribers = subscribers
+        self.subscribers_path = subscribers_path
+        self.store_dir = store_dir  # Appended batches are kept here and reloaded on restart
+        self._lock = threading.Lock()
+        if store_dir and os.path.isdir(store_dir):
+            saved = sorted(glob.glob(os.path.join(store_dir, '*.feather')))
+            if saved:
+                self.calls = self.calls.append(concat_calls(pd.read_feather(p) for p in saved))
+
+    # Parse raw rows (columns of data.csv) and append them, returns the number of rows added
+    def append_raw(self, raw):
+        if not len(raw):
+            return 0
+        with self._lock:
+            batch = parse_calls(raw, self.subscribers)
+            self.subscribers.save(self.subscribers_path)
+            if self.store_dir:
+                os.makedirs(self.store_dir, exist_ok=True)
+                path = os.path.join(self.store_dir, 'batch-%d-%d.feather' % (time.time() * 1000, self.calls.version + 1))
+                batch.to_feather(path + '.tmp')
+                os.replace(path + '.tmp', path)
+            self.calls = self.calls.append(batch)
+        return len(batch)
+
+
+# Polls spool_dir for new files, appends them and moves them to spool_dir/done (or failed)
+class SpoolWatcher(threading.Thread):
+    def __init__(self, live, spool_dir, interval=2.0):
+        super().__init__(daemon=True)
+        self.live = live
+        self.spool_dir = spool_dir
+        self.interval = interval
+        for sub in ('done', 'failed'):
+            os.makedirs(os.path.join(spool_dir, sub), exist_ok=True)
+
+    def poll(self):
+        paths = sorted(glob.glob(os.path.join(self.spool_dir, '*.csv')) + glob.glob(os.path.join(self.spool_dir, '*.parquet')))
+        for path in paths:
+            name = os.path.basename(path)
+            try:
+                self.live.append_raw(read_raw(path))
+                os.replace(path, os.path.join(self.spool_dir, 'done', name))
+            except Exception as e:
+                print('Could not ingest %s: %s' % (path, e), file=sys.stderr)
+                os.replace(path, os.path.join(self.spool_dir, 'failed', name))
+
+    def run(self):
+        while True:
+            self.poll()
+            time.sleep(self.interval)
+
+
+# Accepts CSV rows over TCP and appends them in batches of batch_rows or every flush_interval seconds
+class SocketFeed(threading.Thread):
+    def __init__(self, live, port, host='127.0.0.1', batch_rows=5000, flush_interval=1.0):
+        super().__init__(daemon=True)
+        self.live = live
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self._lines = []
+        self._lock = threading.Lock()
+        feed = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    line = line.decode('utf-8').strip()
+                    if line and not line.startswith('Caller'):
+                        feed.add(line)
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def add(self, line):
+        with self._lock:
+            self._lines.append(line)
+            full = len(self._lines) >= self.batch_rows
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            lines, self._lines = self._lines, []
+        if lines:
+            try:
+                raw = pd.read_csv(io.StringIO('\n'.join(lines)), names=data_columns, dtype=csv_dtypes)
+                self.live.append_raw(raw)
+            except Exception as e:
+                print('Could not ingest %d streamed rows: %s' % (len(lines), e), file=sys.stderr)
+
+    def run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
@@ -0,0 +1,69 @@
+import os
+import numpy as np
+import pandas as pd
+
+#### Subscriber Dictionary ####
+# Maps phone numbers to stable integer node ids (and back).
+# Ids are assigned once and never change: new numbers are appended at the end,
+# so anything that stores node ids (layouts, caches) stays valid across restarts.
+
+
+class SubscriberDict:
+    def __init__(self, numbers=None):
+        if numbers is None:
+            numbers = np.empty(0, dtype=np.int64)
+        self.numbers = np.asarray(numbers, dtype=np.int64)  # node id -> phone number
+        self._index = pd.Index(self.numbers)  # phone number -> node id (hash lookup)
+
+    def __len__(self):
+        return len(self.numbers)
+
+    # Build from a dataframe of calls in a single vectorized pass
+    @classmethod
+    def from_calls(cls, df):
+        return cls(np.union1d(df['Caller'].unique(), df['Receiver'].unique()))
+
+    # phone numbers -> node ids, -1 for unknown numbers
+    def encode(self, numbers):
+        return self._index.get_indexer(np.asarray(numbers, dtype=np.int64))
+
+    # node ids -> phone numbers
+    def decode(self, codes):
+        return self.numbers[np.asarray(codes)]
+
+    def number(self, code):
+        return int(self.numbers[code])
+
+    # Add unseen numbers without touching existing ids, returns ids of all given numbers
+    def add(self, numbers):
+        numbers = np.asarray(numbers, dtype=np.int64)
+        new = pd.unique(numbers[self.encode(numbers) == -1])
+        if len(new):
+            self.numbers = np.concatenate([self.numbers, new])
+            self._index = pd.Index(self.numbers)
+        return self.encode(numbers)
+
+    # Persistence
+    def save(self, path):
+        tmp = path + '.tmp.npy'
+        np.save(tmp, self.numbers)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        return cls(np.load(path))
+
+    # Reuse the dictionary saved at path, extending it with any numbers seen in df
+    @classmethod
+    def load_or_build(cls, path, df):
+        if os.path.exists(path):
+            subscribers = cls.load(path)
+            size = len(subscribers)
+            subscribers.add(df['Caller'].to_numpy())
+            subscribers.add(df['Receiver'].to_numpy())
+            if len(subscribers) != size:
+                subscribers.save(path)
+        else:
+            subscribers = cls.from_calls(df)
+            subscribers.save(path)
+        return subscribers
@@ -0,0 +1,59 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import parse_calls, csv_dtypes, data_columns, display_records  # noqa: E402
+from subscribers import SubscriberDict  # noqa: E402
+
+
+# Typed calls frame (as ingest.load_calls returns it) from rows of
+# (caller, receiver, 'dd-mm-yyyy', 'HH:MM:SS', duration, tower, imei)
+def make_calls(rows, subscribers=None):
+    raw = pd.DataFrame(rows, columns=data_columns).astype(csv_dtypes)
+    return parse_calls(raw, subscribers if subscribers is not None else SubscriberDict())
+
+
+# n random calls between a few dozen numbers over a week
+def random_calls(n=600, numbers=40, seed=0):
+    rng = np.random.default_rng(seed)
+    pool = 9000000000 + np.arange(numbers)
+    start = pd.Timestamp('2020-06-01') + pd.to_timedelta(rng.integers(0, 7 * 86400, n), unit='s')
+    caller = rng.choice(pool, n)
+    return make_calls({'Caller': caller, 'Receiver': rng.choice(pool, n),
+                       'Date': start.strftime('%d-%m-%Y'), 'Time': start.strftime('%H:%M:%S'),
+                       'Duration': rng.integers(1, 150, n), 'TowerID': rng.integers(100, 110, n).astype(str),
+                       'IMEI': (10**14 + caller % 10**6).astype(str)})  # One handset per number
+
+
+@pytest.fixture
+def calls():
+    return random_calls()
+
+
+# dash_script loads its dataset (CDR_DATA) on import, so it is imported once per test run,
+# over calls written to a temporary directory, with layouts computed in the request
+@pytest.fixture(scope='session')
+def ds(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('app') / 'calls.csv')
+    display_records(random_calls()).to_csv(path, index=False)
+    saved = {k: os.environ.get(k) for k in ('CDR_DATA', 'CDR_BACKEND', 'CDR_LAYOUT_WORKERS')}
+    os.environ.update(CDR_DATA=path, CDR_BACKEND='pandas', CDR_LAYOUT_WORKERS='0')
+    try:
+        import dash_script
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+    return dash_script
+
+
+# Callback of dash_script without the instrumentation wrapper, as benchmark.py calls them
+def callback(ds, name):
+    f = getattr(ds, name)
+    return getattr(f, '__wrapped__', f)
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+from anomaly import features, score, flagged_numbers, save_scores, load_scores
+from subscribers import SubscriberDict
+from conftest import make_calls, random_calls
+
+pool = 9000000000 + np.arange(40)  # Numbers of random_calls
+planted = 9100000000
+
+
+def with_calls(rows):
+    background = random_calls()
+    subscribers = SubscriberDict()
+    subscribers.add(background['Caller'].to_numpy())
+    subscribers.add(background['Receiver'].to_numpy())
+    background = make_calls(pd.DataFrame({'Caller': background['Caller'], 'Receiver': background['Receiver'],
+                                          'Date': background['Timestamp'].dt.strftime('%d-%m-%Y'),
+                                          'Time': background['Timestamp'].dt.strftime('%H:%M:%S'),
+                                          'Duration': background['Duration'], 'TowerID': background['TowerID'],
+                                          'IMEI': background['IMEI']}), subscribers)
+    extra = make_calls(rows, subscribers)
+    df = pd.concat([background.astype({'TowerID': str, 'IMEI': str}), extra.astype({'TowerID': str, 'IMEI': str})])
+    df = df.sort_values('Timestamp', kind='stable').reset_index(drop=True)
+    table = features(df, start='2020-06-01', end='2020-06-08')
+    table = table.join(score(table))
+    table.insert(0, 'number', subscribers.decode(table.index.to_numpy()))
+    return table.set_index('number', drop=False)
+
+
+def test_burst_from_an_otherwise_silent_number():
+    rng = np.random.default_rng(1)
+    rows = [(planted, int(rng.choice(pool)), '03-06-2020', '14:%02d:00' % m, 2, '101', '7') for m in range(40)]
+    table = with_calls(rows)
+    assert table.at[planted, 'maxCalls_1h'] == 40
+    assert table.at[planted, 'burst_1h'] == pytest.approx(7 * 24)  # 40 calls against 40 spread over a week
+    assert {'burst', 'callOnly'} <= set(table.at[planted, 'flagged'].split(','))
+    assert (table.loc[table.index != planted, 'flagged'].str.contains('burst')).sum() <= 1
+    assert flagged_numbers(table, 'burst')[0] == planted
+
+
+def test_call_only_night_and_imei_churn():
+    night, churn = planted + 1, planted + 2
+    rows = ([(night, int(n), '0%d-06-2020' % (d + 1), '0%d:30:00' % (d % 4), 3, '101', '8')
+             for d, n in enumerate(pool[:7])] + [(int(n), night, '0%d-06-2020' % (d + 1), '02:00:00', 3, '101', '9')
+                                                 for d, n in enumerate(pool[7:10])] +
+            [(churn, int(n), '05-06-2020', '1%d:00:00' % i, 3, '101', str(100 + i)) for i, n in enumerate(pool[:8])] +
+            [(int(pool[9]), churn, '06-06-2020', '10:00:00', 3, '101', '1')])
+    table = with_calls(rows)
+    assert table.at[night, 'nightShare'] == 1 and 'night' in table.at[night, 'flagged']
+    assert table.at[churn, 'imeiSwitches'] == 7 and 'imeiChurn' in table.at[churn, 'flagged']
+    assert 'callOnly' not in table.at[churn, 'flagged']
+    assert table.at[night, 'incoming'] == 3 and 'callOnly' not in table.at[night, 'flagged']
+
+
+def test_features_count_calls_per_number(calls, tmp_path):
+    table = features(calls)
+    node = int(calls['Caller_node'].iloc[0])
+    made, received = calls[calls['Caller_node'] == node], calls[calls['Receiver_node'] == node]
+    assert table.at[node, 'outgoing'] == len(made) and table.at[node, 'incoming'] == len(received)
+    assert table.at[node, 'callees'] == made['Receiver'].nunique()
+    assert table.at[node, 'imeis'] == made['IMEI'].nunique()
+    save_scores(table, str(tmp_path / 'scores.feather'))
+    pd.testing.assert_frame_equal(load_scores(str(tmp_path / 'scores.feather')), table.rename_axis('node'),
+                                  check_index_type=False)
+
+
+def test_nightly_run_scores_live_batches(calls, tmp_path):
+    import anomaly
+    from ingest import display_records, load_calls, cache_paths
+    from stream import LiveData, stream_dir
+    from query import CallIndex
+    csv = str(tmp_path / 'calls.csv')
+    display_records(calls).to_csv(csv, index=False)
+    df, subscribers = load_calls(csv)
+    rows = display_records(calls.iloc[:40]).assign(Caller=planted, Date='03-06-2020', Time='14:00:00')
+    LiveData(CallIndex(df), subscribers, cache_paths(csv)[1], stream_dir(csv)).append_raw(rows)
+    anomaly.main(['--data', csv])
+    assert anomaly.scores_path(csv) == str(tmp_path / 'calls.anomalies.feather')  # One per dataset
+    table = load_scores(anomaly.scores_path(csv)).set_index('number')
+    assert table.at[planted, 'outgoing'] == 40 and 'burst' in table.at[planted, 'flagged']
@@ -0,0 +1,18 @@
+import json
+import os
+import subprocess
+import sys
+import benchmark
+import data_generator
+
+
+# Every stage of the benchmark drives the undecorated callbacks, so a changed callback
+# signature shows up here instead of in the next baseline run
+def test_run_dataset_drives_every_stage(tmp_path):
+    path = str(tmp_path / 'calls.csv')
+    data_generator.write(path, 300, seed=0)
+    out = subprocess.run([sys.executable, os.path.abspath(benchmark.__file__), '--run', path, '--repeat', '2',
+                          '--layout', 'spring'], stdout=subprocess.PIPE, check=True, universal_newlines=True)
+    results = json.loads(out.stdout.strip().splitlines()[-1])
+    assert {'filter', 'plot', 'playback', 'hover_first', 'select', 'stats_table', 'bfs'} <= set(results)
+    assert results['plot']['mean_payload_bytes'] > 0
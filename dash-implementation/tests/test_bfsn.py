@@ -0,0 +1,65 @@
+import pandas as pd
+import pytest
+from BFSN import Neighbourhood
+from subscribers import SubscriberDict
+from conftest import make_calls, random_calls
+
+A, B, C, D, E, F = 9000000001, 9000000002, 9000000003, 9000000004, 9000000005, 9000000006
+
+
+@pytest.fixture
+def chain():
+    # A -> B -> C -> D -> E, but C only calls D before B calls C (and again later); F is on its own
+    subscribers = SubscriberDict()
+    df = make_calls([(A, B, '01-06-2020', '10:00:00', 5, '1', '1'),
+                     (B, C, '01-06-2020', '11:00:00', 5, '1', '1'),
+                     (C, D, '01-06-2020', '09:00:00', 5, '1', '1'),
+                     (D, E, '01-06-2020', '12:00:00', 5, '1', '1'),
+                     (C, D, '01-06-2020', '13:00:00', 5, '1', '1'),
+                     (F, F, '01-06-2020', '13:00:00', 5, '1', '1')], subscribers)
+    return df, dict(zip((A, B, C, D, E, F), subscribers.encode([A, B, C, D, E, F]).tolist()))
+
+
+def test_within_k_hops(chain):
+    df, id = chain
+    nodes, distance = Neighbourhood(df).within([id[C]], 2)
+    assert dict(zip(nodes.tolist(), distance.tolist())) == {id[C]: 0, id[B]: 1, id[D]: 1, id[A]: 2, id[E]: 2}
+    nodes, distance = Neighbourhood(df, 'directed').within([id[C]], 5)
+    assert sorted(nodes.tolist()) == sorted([id[C], id[D], id[E]])
+
+
+def test_shortest_path(chain):
+    df, id = chain
+    weak, directed = Neighbourhood(df), Neighbourhood(df, 'directed')
+    assert weak.shortest_path(id[E], id[A]) == [id[E], id[D], id[C], id[B], id[A]]
+    assert directed.shortest_path(id[A], id[E]) == [id[A], id[B], id[C], id[D], id[E]]
+    assert directed.shortest_path(id[E], id[A]) is None
+    assert weak.shortest_path(id[A], id[F]) is None and weak.shortest_path(id[A], 10**6) is None
+
+
+def test_time_respecting_path(chain):
+    df, id = chain
+    path = Neighbourhood(df, 'directed').time_respecting_path(id[A], id[D])
+    ts = [pd.Timestamp(h[2]).strftime('%H:%M') for h in path]
+    assert [(h[0], h[1]) for h in path] == [(id[A], id[B]), (id[B], id[C]), (id[C], id[D])]
+    assert ts == ['10:00', '11:00', '13:00']  # Not the 09:00 call
+    # D only calls E at 12:00, before the chain gets to D
+    assert Neighbourhood(df, 'directed').time_respecting_path(id[A], id[E]) is None
+    assert Neighbourhood(df, 'directed').time_respecting_path(id[A], id[D], max_hops=2) is None
+
+
+def test_components_match_bfs():
+    from BFSN import Components, bfs
+    import networkx as nx
+    calls = random_calls(40, numbers=60)  # Sparse enough for several components
+    components = Components(calls)
+    G = nx.Graph()
+    G.add_edges_from(zip(calls['Caller'], calls['Receiver']))
+    expected = {frozenset(c) for c in nx.connected_components(G)}
+    numbers = calls['Caller'].unique().tolist() + [12345]
+    found = bfs(numbers, calls)
+    assert {12345} in found
+    assert {frozenset(c) for c in found if c != {12345}} == {c for c in expected if c & set(numbers)}
+    node = int(calls['Caller_node'].iloc[0])
+    assert components.label(10**6) == -1 and list(components.members(10**6)) == [10**6]
+    assert node in components.members(node)
@@ -0,0 +1,40 @@
+import numpy as np
+from clusters import Communities, super_id, community_of
+from layout import LayoutEngine
+from query import edge_array
+
+
+def two_cliques():
+    from conftest import make_calls
+    numbers = [[9000000000 + i for i in range(4)], [9000000100 + i for i in range(4)]]
+    rows = [(a, b, '01-06-2020', '10:00:00', 5, '1', '1') for group in numbers for a in group for b in group if a != b]
+    return make_calls(rows + [(numbers[0][0], numbers[1][0], '01-06-2020', '11:00:00', 5, '1', '1')])
+
+
+def test_communities_of_two_cliques():
+    df = two_cliques()
+    communities = Communities(df)
+    assert len(communities) == 2 and list(communities.sizes) == [4, 4]
+    assert len(set(communities.of([0, 1, 2, 3]))) == 1
+    assert list(communities.expand(super_id([0]))) == list(communities.members(0))
+    links = communities.aggregate(df)
+    assert len(links) == 1 and links['calls'].iloc[0] == 1
+
+
+def test_global_layout_of_communities():
+    df = two_cliques()
+    communities = Communities(df)
+    engine = LayoutEngine(lambda: edge_array(df))
+    pos = engine.positions(communities.nodes, 'global')
+    centres = communities.centres(pos)
+    for c in range(len(communities)):
+        members = np.array([pos[n] for n in communities.members(c)])
+        assert np.allclose(centres[int(super_id(c))], members.mean(axis=0))
+    assert community_of(list(centres)).tolist() == [0, 1]
+
+
+def test_laying_out_a_part_on_its_own_keeps_the_warm_start():
+    engine = LayoutEngine(lambda: None)
+    view = engine.positions(np.array([[0, 1], [1, 2]]), 'spring')
+    engine.positions(np.array([[5, 6]]), 'spring', warm=False)
+    assert engine.previous['spring'] is view
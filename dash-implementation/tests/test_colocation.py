@@ -0,0 +1,34 @@
+from colocation import Colocation
+from conftest import make_calls
+
+
+def test_colocation_against_a_scan(calls):
+    index = Colocation(calls)
+    window = calls['Timestamp'].dt.floor('15min')
+    seen = calls.assign(window=window).groupby('Caller_node')
+    places = {n: set(zip(g['TowerID'].astype(str), g['window'])) for n, g in seen}
+    handsets = {n: set(g['IMEI'].astype(str)) for n, g in seen}
+    for node in places:
+        shared = {m: len(places[node] & p) for m, p in places.items() if m != node}
+        expected = sorted((-c, m) for m, c in shared.items() if c)[:10]
+        others, counts = index.colocated(node)
+        assert [(-c, m) for m, c in zip(others, counts)] == expected
+        for m in others[:2]:
+            assert set(index.meetings(node, m)) == places[node] & places[m]
+        assert set(index.handsets_of(node)) == handsets[node]
+    assert index.nbytes > 0
+
+
+def test_shared_handsets():
+    df = make_calls([(1, 2, '01-06-2020', '10:00:00', 5, 'T1', 'A'),
+                     (3, 2, '01-06-2020', '11:00:00', 5, 'T2', 'A'),
+                     (3, 1, '01-06-2020', '12:00:00', 5, 'T2', 'B'),
+                     (4, 1, '01-06-2020', '13:00:00', 5, 'T3', 'B')])
+    code = dict(zip(df['Caller'], df['Caller_node']))
+    index = Colocation(df)
+    others, shared = index.sharing_handset(code[3])
+    assert sorted(zip(others, shared)) == sorted([(code[1], 1), (code[4], 1)])
+    assert set(index.users_of('A')) == {code[1], code[3]}
+    assert len(index.users_of('Z')) == 0
+    assert index.meetings(code[3], code[4]) == []
+    assert len(index.colocated(10**6)[0]) == 0
@@ -0,0 +1,43 @@
+import os
+import sys
+import pandas as pd
+import pandas.testing as pdt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '..', 'data'))
+import data_generator  # noqa: E402
+
+
+def generated(**options):
+    return pd.concat(data_generator.generate(**options), ignore_index=True)
+
+
+def test_same_seed_and_options_give_the_same_calls():
+    options = dict(n=2000, seed=3, chunk=700)
+    pdt.assert_frame_equal(generated(**options), generated(**options))
+    assert not generated(n=2000, seed=4, chunk=700).equals(generated(**options))
+    assert not generated(n=2000, seed=3, chunk=500).equals(generated(**options))  # chunk is part of the seed
+
+
+def test_calls_fall_inside_the_time_range():
+    df = generated(n=5000, start='2-6-2020 10:00:00', end='4-6-2020 09:30:00')
+    ts = pd.to_datetime(df['Date'] + ' ' + df['Time'], format='%d-%m-%Y %H:%M:%S')
+    assert ts.min() >= pd.Timestamp('2020-06-02 10:00:00') and ts.max() <= pd.Timestamp('2020-06-04 09:30:00')
+    assert (df['Caller'] != df['Receiver']).all()
+
+
+def test_each_caller_has_one_handset_a_few_share_theirs():
+    for shared in (0.0, 0.2):
+        df = generated(n=20000, subscribers=1000, shared_imei=shared)
+        assert (df.groupby('Caller')['IMEI'].nunique() == 1).all()
+        handsets = df.groupby('Caller')['IMEI'].first()
+        sharing = handsets.duplicated(keep=False).mean()  # Callers whose handset another caller uses too
+        assert sharing == 0 if shared == 0 else 0 < sharing <= 2 * shared
+
+
+def test_csv_and_parquet_output_match(tmp_path):
+    csv, parquet = str(tmp_path / 'calls.csv'), str(tmp_path / 'calls.parquet')
+    data_generator.write(csv, 2500, seed=1, chunk=1000)
+    data_generator.write(parquet, 2500, seed=1, chunk=1000)
+    from_csv = pd.read_csv(csv, dtype={'Date': str, 'Time': str})
+    pdt.assert_frame_equal(from_csv, pd.read_parquet(parquet), check_dtype=False)
+    pdt.assert_frame_equal(from_csv, generated(n=2500, seed=1, chunk=1000), check_dtype=False)
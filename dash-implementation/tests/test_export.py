@@ -0,0 +1,55 @@
+import io
+import json
+import pandas as pd
+import pytest
+from conftest import callback
+from ingest import data_columns
+
+
+@pytest.fixture(scope='module')
+def view(ds):
+    key, message = callback(ds, 'update_filtered_div_caller')('2020-06-02', [0, ds.max_duration], [0, 48], 3,
+                                                                'None', 'None', None, None)
+    assert message == 'Updated'
+    return key
+
+
+def export(ds, **query):
+    return ds.app.server.test_client().get('/export/calls.csv', query_string=query)
+
+
+def test_records_table_and_export_of_a_clicked_number(ds, view):
+    df = ds.filtered_view(view)
+    node = int(df['Caller_node'].iloc[0])
+    mine = df[(df['Caller_node'] == node) | (df['Receiver_node'] == node)]
+    text, clicked, page, href = callback(ds, 'display_click_data')({'points': [{'customdata': node}]}, view)
+    assert clicked == {'view': view, 'nodes': [node], 'community': None}
+    assert text.startswith('Selected Number: %d' % ds.subscribers.number(node))
+    rows, pages = callback(ds, 'update_click_table')(clicked, 0, 2, [{'column_id': 'Duration', 'direction': 'desc'}])
+    assert pages == -(-len(mine) // 2)
+    assert [r['Duration'] for r in rows] == sorted(mine['Duration'], reverse=True)[:2]
+    response = ds.app.server.test_client().get(href)
+    assert response.status_code == 200
+    exported = pd.read_csv(io.StringIO(response.get_data(as_text=True)))
+    assert list(exported.columns) == data_columns
+    assert sorted(exported['Time']) == sorted(mine['Timestamp'].dt.strftime('%H:%M:%S'))
+
+
+def test_export_of_a_whole_view_and_a_community(ds, view):
+    exported = pd.read_csv(io.StringIO(export(ds, view=view).get_data(as_text=True)))
+    assert len(exported) == len(ds.filtered_view(view))
+    members = ds.view_communities(view).members(0)
+    exported = pd.read_csv(io.StringIO(export(ds, view=view, community=0).get_data(as_text=True)))
+    assert set(exported['Caller']) | set(exported['Receiver']) >= set(ds.subscribers.decode(members))
+
+
+def test_malformed_requests_are_rejected(ds, view):
+    version, date, duration, time, option, caller, receiver = json.loads(view)
+    for bad in ('', 'not json', json.dumps([version, date, duration, [[1], [2]], option, caller, receiver]),
+                json.dumps([version, date, duration, [True, 48], option, caller, receiver]),
+                json.dumps([version, 'no date', duration, time, option, caller, receiver]),
+                json.dumps([version, date, duration, time, 7, caller, receiver]),
+                json.dumps([version, date, duration, time, option, [{'a': 1}], receiver])):
+        assert export(ds, view=bad).status_code == 400
+    assert export(ds, view=view, nodes='1,x').status_code == 400
+    assert export(ds, view=view, community=10**6).status_code == 404
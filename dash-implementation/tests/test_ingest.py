@@ -0,0 +1,14 @@
+import pandas.testing as pdt
+from pyarrow import feather
+from ingest import load_calls, display_records, cache_paths
+
+
+def test_cache_is_written_and_read_back(tmp_path, calls):
+    path = str(tmp_path / 'calls.csv')
+    display_records(calls).to_csv(path, index=False)
+    cold, subscribers = load_calls(path)
+    cache_path, subscribers_path = cache_paths(path)
+    assert feather.read_table(cache_path, memory_map=True).num_rows == len(calls)
+    warm, again = load_calls(path)
+    pdt.assert_frame_equal(warm, cold, check_categorical=False)
+    assert list(again.numbers) == list(subscribers.numbers)
@@ -0,0 +1,57 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import flask
+import instrument
+from instrument import instrumented, metrics, register
+
+
+def test_payload_is_the_size_of_the_json_response():
+    server = flask.Flask(__name__)
+    register(server)
+
+    @instrumented('figure')
+    def figure():
+        return {'data': [{'x': list(range(100))}]}
+
+    @server.route('/_dash-update-component', methods=['POST'])
+    def update():
+        return json.dumps({'response': figure()})
+    metrics.reset()
+    body = server.test_client().post('/_dash-update-component').get_data()
+    assert metrics.summary()['callback.figure']['last']['payload'] == len(body)
+
+
+def test_profiles_of_concurrent_callbacks_do_not_collide(tmp_path, monkeypatch):
+    monkeypatch.setattr(instrument, 'profile_dir', str(tmp_path))
+    barrier = threading.Barrier(4)
+
+    @instrumented('slow')
+    def slow():
+        barrier.wait()
+        return 'done'
+    threads = [threading.Thread(target=slow) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len([p for p in os.listdir(str(tmp_path)) if p.startswith('slow-')]) == 4
+
+
+def test_profiling_into_a_missing_directory_does_not_fail_callbacks(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(instrument, 'profile_dir', str(tmp_path / 'missing'))
+
+    @instrumented('plain')
+    def plain():
+        return 'done'
+    assert plain() == 'done'
+    assert 'Could not write profile' in capsys.readouterr().err
+
+
+def test_profile_directory_is_created_when_profiling_is_set_up(tmp_path):
+    env = dict(os.environ, CDR_PROFILE=str(tmp_path / 'profiles'))
+    subprocess.run([sys.executable, '-c', 'import instrument'], cwd=os.path.dirname(instrument.__file__), env=env,
+                   check=True)
+    assert os.path.isdir(str(tmp_path / 'profiles'))
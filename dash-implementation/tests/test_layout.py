@@ -0,0 +1,122 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import networkx as nx
+import layout
+from layout import LayoutEngine, JobBoard, compute_layout, fingerprint
+from result_store import SharedResultStore
+
+
+def test_spring_warm_start_moves_only_changed_nodes():
+    edges = np.array([[0, 1], [1, 2], [2, 3], [3, 4]])
+    before = compute_layout(edges, 'spring', None)
+    after = compute_layout(np.vstack([edges, [[4, 5]]]), 'spring', before)
+    assert all(after[n] == before[n] for n in (0, 1, 2, 3))
+    assert 5 in after
+
+
+def test_neato_starts_from_previous_positions_in_inches(monkeypatch):
+    seen = {}
+
+    def graphviz_layout(G, prog):
+        seen.update({n: G.nodes[n].get('pos') for n in G})
+        return {n: (0.0, 0.0) for n in G}
+    monkeypatch.setattr(nx.nx_agraph, 'graphviz_layout', graphviz_layout)
+    compute_layout(np.array([[0, 1], [1, 2]]), 'neato', {0: (72.0, 144.0), 1: (36.0, 0.0)})
+    assert seen == {0: '1.000000,2.000000!', 1: '0.500000,0.000000', 2: None}
+
+
+def test_layouts_are_cached_by_edge_set():
+    engine = LayoutEngine(lambda: np.empty((0, 2), dtype=np.int64))
+    edges = np.array([[0, 1], [1, 2]])
+    pos = engine.positions(edges, 'spring')
+    assert engine.positions(edges.copy(), 'spring') is pos
+    assert engine.cache.get('spring:' + fingerprint(edges)) is pos
+
+
+def test_a_new_view_only_cancels_jobs_its_own_session_left(monkeypatch):
+    release = threading.Event()
+
+    def blocked(edges, engine, initial):
+        release.wait(5)
+        return {n: (0.0, 0.0) for n in np.unique(edges)}
+    monkeypatch.setattr(layout, 'compute_layout', blocked)
+    engine = LayoutEngine(lambda: None, workers=1, sync_edges=0)
+    engine._pool = ThreadPoolExecutor(1)
+    views = [np.array([[i, i + 1]]) for i in range(5)]
+    key = ['spring:' + fingerprint(v) for v in views]
+    engine.request(views[0], 'spring')  # Keeps the worker busy
+    jobs = {}
+    for view, session in [(1, 'a'), (2, 'b'), (3, 'a'), (3, 'b')]:
+        assert engine.request(views[view], 'spring', session=session)[1] is False
+        jobs.setdefault(view, engine.jobs.get(key[view]))
+    assert jobs[1].cancelled() and jobs[2].cancelled()  # Left by a and b
+    engine.request(views[4], 'spring', session='a')
+    assert not jobs[3].cancelled()  # b still waits for it
+    engine.request(views[2], 'spring', session='c')  # Submitted again
+    assert [engine.board.current(s) for s in 'abc'] == [key[4], key[3], key[2]]
+    release.set()
+    engine._pool.shutdown(wait=True)
+    assert all(engine.cache.get(k) is not None for k in key[2:]) and engine.cache.get(key[1]) is None
+    assert not engine.jobs and not any(engine.board.pending(k) or engine.board.current(s) for k in key for s in 'abc')
+
+
+# Two worker processes of wsgi.py: engines sharing the layout cache and the job board
+def shared_engines(tmp_path, monkeypatch):
+    release = threading.Event()
+
+    def blocked(edges, engine, initial):
+        release.wait(5)
+        return {n: (0.0, 0.0) for n in np.unique(edges)}
+    monkeypatch.setattr(layout, 'compute_layout', blocked)
+    engines = []
+    for _ in range(2):
+        engine = LayoutEngine(lambda: None, workers=1, sync_edges=0, cache=SharedResultStore(str(tmp_path / 'cache')),
+                              board=JobBoard(str(tmp_path / 'jobs')))
+        engine._pool = ThreadPoolExecutor(1)
+        engines.append(engine)
+    return engines, release
+
+
+def test_workers_wait_for_a_layout_another_worker_computes(tmp_path, monkeypatch):
+    (a, b), release = shared_engines(tmp_path, monkeypatch)
+    edges = np.array([[0, 1], [1, 2]])
+    assert a.request(edges, 'spring', session='s')[1] is False
+    assert b.request(edges, 'spring', coarse=False, session='s') == (None, False)  # A poll lands on b
+    assert b.request(edges, 'spring', session='t')[1] is False  # Another page, same view
+    assert len(a.jobs) == 1 and not b.jobs
+    release.set()
+    a._pool.shutdown(wait=True)
+    pos, final = b.request(edges, 'spring', coarse=False, session='s')
+    assert final and set(pos) == {0, 1, 2}
+
+
+def test_workers_do_not_cancel_jobs_others_wait_for(tmp_path, monkeypatch):
+    (a, b), release = shared_engines(tmp_path, monkeypatch)
+    views = [np.array([[i, i + 1]]) for i in range(4)]
+    key = ['spring:' + fingerprint(v) for v in views]
+    a.request(views[0], 'spring')  # Keeps a's worker busy
+    a.request(views[1], 'spring', session='s')
+    b.request(views[1], 'spring', coarse=False, session='t')  # t polls it on b
+    a.request(views[2], 'spring', session='s')
+    assert not a.jobs[key[1]].cancelled()  # t still waits for it
+    b.request(views[3], 'spring', session='t')  # Left by t too, but b cannot cancel a's job
+    assert not a.jobs[key[1]].cancelled() and key[3] in b.jobs
+    job = a.jobs[key[2]]
+    a.request(views[3], 'spring', session='s')  # Laid out by b already
+    assert job.cancelled() and key[3] not in a.jobs
+    # A poll for a cancelled job stops instead of starting it again
+    assert b.request(views[2], 'spring', coarse=False, session='s') == (None, True) and key[2] not in b.jobs
+    release.set()
+    a._pool.shutdown(wait=True)
+    b._pool.shutdown(wait=True)
+    assert all(a.cache.get(k) is not None for k in (key[1], key[3]))
+
+
+def test_jobs_of_a_dead_worker_are_stale(tmp_path):
+    board = JobBoard(str(tmp_path))
+    assert board.open('k') and board.pending('k') and not board.open('k')
+    with open(os.path.join(board._job('k'), 'owner'), 'w') as f:
+        f.write('999999999')
+    assert not board.pending('k') and board.open('k')
@@ -0,0 +1,26 @@
+import numpy as np
+from number_search import NumberIndex
+
+
+def test_prefix_search_returns_the_busiest_numbers_first():
+    numbers = [9123, 9124, 9130, 8123, 9120]
+    index = NumberIndex(numbers, [5, 9, 7, 20, 5])
+    assert list(index.search('912')) == [9124, 9120, 9123]  # Ties by number
+    assert list(index.search('9 1-2', limit=1)) == [9124]  # Only digits count
+    assert list(index.search('')) == [8123, 9124, 9130, 9120, 9123]
+    assert list(index.search(None, limit=2)) == [8123, 9124]
+    assert len(index.search('7')) == 0
+
+
+def test_search_matches_a_scan():
+    rng = np.random.default_rng(0)
+    numbers = np.unique(rng.integers(9000000000, 9000100000, 2000))
+    counts = rng.integers(1, 50, len(numbers))
+    index = NumberIndex(numbers, counts)
+    for prefix in ('90000', '900005', '9000099', '1'):
+        hits = sorted(c for n, c in zip(numbers, counts) if str(n).startswith(prefix))[::-1][:10]
+        found = index.search(prefix, limit=10)
+        assert all(str(n).startswith(prefix) for n in found)
+        # Numbers tied at the cut are interchangeable, the counts are not
+        assert list(index.counts[np.searchsorted(index.numbers, found)]) == hits
+    assert index.nbytes >= numbers.nbytes + counts.nbytes
@@ -0,0 +1,58 @@
+import pytest
+from conftest import callback
+
+
+def make_view(ds, date, time):
+    key, message = callback(ds, 'update_filtered_div_caller')(date, [0, ds.max_duration], time, 3,
+                                                                'None', 'None', None, None)
+    assert message == 'Updated'
+    fig, final = ds.plot_network(ds.filtered_view(key), 'spring')
+    return key, [int(n) for n in fig.data[-1].customdata]
+
+
+# Phone number of a node according to the calls of the view
+def number_in_view(view, node):
+    numbers = set(view.loc[view['Caller_node'] == node, 'Caller']) | \
+        set(view.loc[view['Receiver_node'] == node, 'Receiver'])
+    assert len(numbers) == 1
+    return numbers.pop()
+
+
+@pytest.fixture(scope='module')
+def views(ds):
+    return [make_view(ds, '2020-06-02', [0, 48]), make_view(ds, '2020-06-05', [0, 8])]  # Then a few hours only
+
+
+def test_points_resolve_to_the_numbers_of_the_view(ds, views):
+    hover = callback(ds, 'display_hover_data')
+    for key, nodes in views:
+        view = ds.filtered_view(key)
+        assert sorted(nodes) == sorted(set(view['Caller_node']) | set(view['Receiver_node']))
+        for node in nodes:
+            text = hover({'points': [{'customdata': node}]}, key)
+            assert text.splitlines()[0] == 'Selected Number: %d' % number_in_view(view, node)
+            outgoing = int((view['Caller_node'] == node).sum())
+            assert 'No. of Outgoing Calls: %d\n' % outgoing in text
+
+
+def test_selection_lists_the_selected_numbers(ds, views):
+    key, nodes = views[0]
+    view = ds.filtered_view(key)
+    selection = {'points': [{'customdata': n} for n in nodes[:3]]}
+    text = callback(ds, 'display_selected_data')(selection, key, 'components', 2)
+    listed = {int(line) for line in text.split() if line.isdigit()}
+    assert {number_in_view(view, n) for n in nodes[:3]} <= listed
+
+
+def test_points_of_a_previous_view_resolve_against_the_current_one(ds, views):
+    (old, old_nodes), (key, nodes) = views
+    view = ds.filtered_view(key)
+    hover = callback(ds, 'display_hover_data')
+    for node in old_nodes:
+        text = hover({'points': [{'customdata': node}]}, key)
+        if node in nodes:
+            # Node ids are the same in every view, the number is too
+            assert text.splitlines()[0] == 'Selected Number: %d' % number_in_view(view, node)
+        else:
+            assert text == 'Hover data...'
+    assert any(n not in nodes for n in old_nodes) and any(n in nodes for n in old_nodes)
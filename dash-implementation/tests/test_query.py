@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+from query import CallIndex
+
+
+# Filter callback semantics, by a full scan
+def scan(df, start, end, duration_range, option, callers, receivers):
+    mask = ((df['Timestamp'] >= start) & (df['Timestamp'] < end) &
+            (df['Duration'] >= duration_range[0]) & (df['Duration'] <= duration_range[1]))
+    made = df['Caller_node'].isin(callers or [])
+    received = df['Receiver_node'].isin(receivers or [])
+    if option == 1 and callers is not None:
+        mask &= made
+    elif option == 2 and receivers is not None:
+        mask &= received
+    elif option == 3 and (callers is not None or receivers is not None):
+        mask &= made | received
+    elif option == 4 and callers is not None and receivers is not None:
+        mask &= made & received
+    return df[mask].reset_index(drop=True)
+
+
+windows = [(pd.Timestamp('2020-06-01'), pd.Timestamp('2020-06-08')),
+           (pd.Timestamp('2020-06-02 06:00'), pd.Timestamp('2020-06-04 18:30'))]
+selections = [(None, None), ([3, 5, 7], None), (None, [1, 2]), ([0, 4], [4, 9, 11])]
+
+
+@pytest.mark.parametrize('start, end', windows)
+@pytest.mark.parametrize('option', [1, 2, 3, 4])
+@pytest.mark.parametrize('callers, receivers', selections)
+def test_select_matches_scan(calls, start, end, option, callers, receivers):
+    index = CallIndex(calls)
+    got = index.select(start, end, (20, 120), option, callers, receivers)
+    pd.testing.assert_frame_equal(got, scan(calls, start, end, (20, 120), option, callers, receivers))
+
+
+def test_take_returns_rows_in_the_given_order(calls):
+    index = CallIndex(calls)
+    rows = np.array([7, 3, 250, 0])
+    pd.testing.assert_frame_equal(index.take(rows), calls.take(rows).reset_index(drop=True))
+    assert len(index.take([])) == 0
+
+
+def test_node_queries(calls):
+    index = CallIndex(calls)
+    node = int(calls['Caller_node'].iloc[0])
+    ends = (calls['Caller_node'] == node) | (calls['Receiver_node'] == node)
+    pd.testing.assert_frame_equal(index.calls_of(node), calls[ends].reset_index(drop=True))
+    assert index.call_count(node) == (calls['Caller_node'] == node).sum() + (calls['Receiver_node'] == node).sum()
+    assert len(index.calls_of(10**6)) == 0
+
+
+def test_appended_segments_match_one_index(calls, monkeypatch):
+    import query
+    monkeypatch.setattr(query, 'max_segments', 3)
+    # Interleaved batches, so rows of every segment fall in the same windows
+    index = CallIndex(calls.iloc[::5])
+    for i in range(1, 5):
+        index = index.append(calls.iloc[i::5])
+    assert len(index.segments) <= 3 and index.version == 4
+    start, end = windows[1]
+    for option, (callers, receivers) in zip([3, 1, 4], selections[1:]):
+        got = index.select(start, end, (0, 150), option, callers, receivers)
+        expected = scan(calls, start, end, (0, 150), option, callers, receivers)
+        pd.testing.assert_frame_equal(got.astype({'TowerID': str, 'IMEI': str}),
+                                      expected.astype({'TowerID': str, 'IMEI': str}))
+    assert len(index.edges()) == len(CallIndex(calls).edges())
@@ -0,0 +1,53 @@
+import numpy as np
+import raster
+from raster import Raster, clip, tile_size
+
+
+def test_clip_keeps_the_visible_part_of_segments():
+    a = np.array([[-10.0, 5.0], [2.0, 2.0], [20.0, 20.0], [5.0, -5.0]])
+    b = np.array([[20.0, 5.0], [8.0, 8.0], [30.0, 30.0], [5.0, 15.0]])
+    _, _, t0, t1 = clip(a, b, 10)
+    assert np.allclose(t0[[0, 1, 3]], [1 / 3, 0, 0.25])
+    assert np.allclose(t1[[0, 1, 3]], [2 / 3, 1, 0.75])
+    assert t0[2] > t1[2]  # Entirely outside
+
+
+def test_tiles_cover_the_visible_range():
+    r = Raster({0: (0.0, 0.0), 1: (100.0, 100.0)}, [0], [1], [10], 100)
+    assert r.tiles() == (0, [(0, 0)])
+    z, tiles = r.tiles((0, 10), (0, 10))
+    assert z > 0 and 0 < len(tiles) <= 36
+    for x, y in tiles:
+        corner, width = r.tile_bounds(z, x, y)
+        assert corner[0] < 10 and corner[0] + width > 0 and corner[1] < 10 and corner[1] + width > 0
+    # A range too wide for the tile limit drops to a coarser zoom level
+    assert r.tiles((0, 100), (0, 100), across=64, limit=4)[0] <= 1
+
+
+def test_render_draws_edges_and_leaves_empty_tiles_transparent():
+    pos = {0: (0.0, 0.0), 1: (1.0, 0.0), 2: (0.0, 1.0)}
+    r = Raster(pos, [0, 0, 0], [1, 1, 2], [10, 30, 100], 100)
+    assert len(r) == 2  # One segment per pair
+    image = r.render(0, 0, 0)
+    assert image.shape == (tile_size, tile_size, 4)
+    assert (image[..., 3] > 0).sum() > tile_size  # Both edges cross many pixels
+    # The horizontal edge takes the colour of its mean duration (20 of 100)
+    x, y = np.floor((np.array([0.5, 0.0]) - r.origin) * tile_size / r.size).astype(int)
+    assert np.allclose(image[tile_size - 1 - y, x, :3], raster.colours[int(255 * 0.2), :3])
+    assert not r.render(3, 7, 7)[..., 3].any()  # Corner tile away from every edge
+    assert r.png(0, 0, 0).startswith(b'\x89PNG')
+
+
+def test_render_splits_samples_into_chunks(monkeypatch):
+    rng = np.random.default_rng(0)
+    pos = {n: tuple(rng.uniform(0, 1, 2)) for n in range(50)}
+    src, dst = rng.integers(0, 50, 400), rng.integers(0, 50, 400)
+    r = Raster(pos, src, dst, rng.integers(1, 100, 400), 100)
+    whole = r.render(1, 0, 0)
+    monkeypatch.setattr(raster, 'max_samples', 100)
+    assert np.array_equal(r.render(1, 0, 0), whole)
+
+
+def test_nbytes_counts_the_segment_arrays():
+    r = Raster({n: (float(n), 0.0) for n in range(10)}, np.arange(9), np.arange(1, 10), np.ones(9), 1)
+    assert r.nbytes >= 9 * (2 * 16 + 2 * 8)
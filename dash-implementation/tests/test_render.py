@@ -0,0 +1,43 @@
+import numpy as np
+from render import duration_bins, edge_traces, node_trace, node_positions, rgba, viridis, webgl_threshold
+
+
+def test_duration_bins_match_the_colours_of_the_original_per_call_colour_map():
+    max_duration = 150
+    durations = np.arange(max_duration + 1)
+    # The original figure coloured every call viridis(Duration / max Duration) on the 12 colour map
+    original = [rgba(viridis(d / max_duration)) for d in durations]
+    assert [rgba(viridis(int(b))) for b in duration_bins(durations, max_duration)] == original
+    assert set(duration_bins(durations, max_duration)) == set(range(12))
+
+
+def test_edges_are_one_trace_per_bin_of_distinct_nan_separated_segments():
+    nodes, xy = node_positions({7: (0.0, 0.0), 3: (1.0, 0.0), 5: (0.0, 2.0)})
+    # Calls 3 -> 7 twice in the lowest bin, once in the top bin, and 5 -> 3
+    traces = edge_traces(nodes, xy, [3, 3, 3, 5], [7, 7, 7, 3], [1, 2, 100, 1], 100)
+    assert [t['line']['color'] for t in traces] == [rgba(viridis(0)), rgba(viridis(11))]
+    low, high = traces
+    assert len(low['x']) == 2 * 3  # 3 -> 7 once, 5 -> 3 once
+    assert np.isnan(low['x'][2::3]).all() and np.isnan(low['y'][2::3]).all()
+    segments = set(zip(low['x'][0::3], low['x'][1::3], low['y'][0::3], low['y'][1::3]))  # (x0, x1, y0, y1)
+    assert segments == {(1.0, 0.0, 0.0, 0.0), (0.0, 1.0, 2.0, 0.0)}
+    assert list(high['x'][:2]) == [1.0, 0.0] and list(high['y'][:2]) == [0.0, 0.0]
+    assert all(t['type'] == 'scatter' and t['mode'] == 'lines' for t in traces)
+    assert len(edge_traces(nodes, xy, [3], [7], [1], 100, every_bin=True)) == 12
+
+
+def test_large_figures_switch_to_webgl():
+    n = webgl_threshold + 1
+    pos = {i: (float(i), 0.0) for i in range(n + 1)}
+    nodes, xy = node_positions(pos)
+    assert edge_traces(nodes, xy, np.arange(n), np.arange(1, n + 1), np.ones(n), 1)[0]['type'] == 'scattergl'
+    assert edge_traces(nodes, xy, np.arange(n - 1), np.arange(1, n), np.ones(n - 1), 1)[0]['type'] == 'scatter'
+    assert node_trace(xy, nodes)['type'] == 'scattergl'
+    assert node_trace(xy[:10], nodes[:10])['type'] == 'scatter'
+
+
+def test_node_points_carry_their_node_ids():
+    nodes, xy = node_positions({12: (1.0, 2.0), 4: (3.0, 4.0), 9: (5.0, 6.0)})
+    trace = node_trace(xy, nodes)
+    assert list(trace['customdata']) == [4, 9, 12]
+    assert list(zip(trace['x'], trace['y'])) == [(3.0, 4.0), (5.0, 6.0), (1.0, 2.0)]
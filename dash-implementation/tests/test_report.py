@@ -0,0 +1,43 @@
+import pandas as pd
+import pandas.testing as pdt
+from ingest import display_records
+from stats import nodeStats
+from BFSN import Components
+from conftest import random_calls
+from report import report, read_targets, write_table
+
+
+def test_report_matches_the_whole_frame(tmp_path, calls):
+    path = str(tmp_path / 'calls.csv')
+    display_records(calls).to_csv(path, index=False)
+    numbers = [9000000003, 9000000017, 123456789, 9000000003]
+    table = report(path, numbers, workers=0, chunk=1)
+    assert list(table['number']) == numbers
+    assert list(table['status']) == ['ok', 'ok', 'unknown number', 'ok']
+    stats = nodeStats(calls)
+    components = Components(calls)
+    code = dict(zip(calls['Caller'], calls['Caller_node']))
+    for number in numbers[:2]:
+        row = table[table['number'] == number].iloc[0]
+        assert row['incoming'] == stats.loc[code[number], 'incoming']
+        assert row['outgoing'] == stats.loc[code[number], 'outgoing']
+        assert row['componentSize'] == (components.labels == components.labels[code[number]]).sum()
+    # One day of a sparse week leaves some targets without calls
+    sparse = str(tmp_path / 'sparse.csv')
+    display_records(random_calls(40)).to_csv(sparse, index=False)
+    day = report(sparse, list(random_calls(40)['Caller'].unique()), start='2020-06-03', end='2020-06-03', workers=0)
+    assert set(day['status']) == {'ok', 'no calls in window'}
+    assert day.loc[day['status'] != 'ok', 'outgoing'].isna().all()
+    # Chunks handed to worker processes give the same table
+    pdt.assert_frame_equal(report(path, numbers, workers=2, chunk=1), table)
+
+
+def test_targets_and_output_files(tmp_path):
+    targets = tmp_path / 'targets.txt'
+    targets.write_text('number\n9000000003\n+91 9000000017, 9000000003\n12\n')
+    assert read_targets(str(targets)) == [9000000003, 9000000017]
+    table = pd.DataFrame({'number': [1, 2], 'topTalker1': [5, 'None'], 'calls': pd.array([3, None], dtype='Int64')})
+    write_table(table, str(tmp_path / 'out.parquet'))
+    write_table(table, str(tmp_path / 'out.csv'))
+    assert list(pd.read_parquet(tmp_path / 'out.parquet')['topTalker1']) == ['5', 'None']
+    assert list(pd.read_csv(tmp_path / 'out.csv')['number']) == [1, 2]
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+from query import PostingLists
+from result_store import ResultStore, SharedResultStore, sizeof
+from BFSN import Components, Neighbourhood
+from colocation import Colocation
+from clusters import Communities
+from number_search import NumberIndex
+from timeline import SlidingWindow
+
+
+def test_sizeof_counts_the_arrays_of_view_objects(calls):
+    for value in (Components(calls), Neighbourhood(calls), Colocation(calls), Communities(calls),
+                  SlidingWindow(calls), NumberIndex(calls['Caller'].to_numpy(), np.ones(len(calls)))):
+        assert sizeof(value) == value.nbytes > 8 * 40  # At least a word per number
+    # The pair of row indexes cached per view
+    rows = (PostingLists(calls['Caller_node'], 40), PostingLists(calls['Receiver_node'], 40))
+    assert sizeof(rows) > 2 * 8 * len(calls)
+    figure = {'data': [{'x': np.zeros(1000), 'y': np.zeros(1000)}], 'frames': [{'data': [{'x': list(range(1000))}]}]}
+    assert sizeof(figure) > 16000 + 1000 * 8
+
+
+
+def test_sizeof_counts_the_strings_of_object_columns():
+    table = pd.DataFrame({'mostCallsTo': ['9%09d' % i for i in range(1000)]})
+    assert sizeof(table) > 1000 * 10 + 1000 * 8
+    assert sizeof(table['mostCallsTo']) > 1000 * 10
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    store = ResultStore(max_entries=3, max_bytes=10000)
+    for key in 'abc':
+        store.put(key, np.zeros(100))
+    store.get('a')
+    store.put('d', np.zeros(100))
+    assert 'b' not in store and all(k in store for k in 'acd')
+    store.put('e', np.zeros(1200))  # Over the byte budget on its own, kept as the newest entry
+    assert len(store) == 1 and 'e' in store and store.nbytes == 9600
+
+
+def test_shared_store_round_trip(tmp_path):
+    first, second = SharedResultStore(str(tmp_path)), SharedResultStore(str(tmp_path))
+    first.put('view', np.arange(5))
+    assert list(second.get('view')) == [0, 1, 2, 3, 4]
+    assert second.get_or_compute('other', lambda: 'computed') == 'computed' and 'other' in first
@@ -0,0 +1,75 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import sql_store
+from ingest import display_records
+from query import CallIndex
+from test_query import windows, selections
+
+engines = ['sqlite', pytest.param('duckdb', marks=pytest.mark.skipif(
+    not __import__('importlib').util.find_spec('duckdb'), reason='duckdb not installed'))]
+
+
+@pytest.fixture(params=engines)
+def store(request, calls, tmp_path):
+    csv = str(tmp_path / 'calls.csv')
+    display_records(calls).to_csv(csv, index=False)
+    store, subscribers = sql_store.open_store(csv, request.param)
+    yield store
+    store.close()
+
+
+def test_reconnects_after_fork(store, monkeypatch):
+    con = store._connection()
+    assert store._connection() is con
+    monkeypatch.setattr(os, 'getpid', lambda: -1)  # As seen from a forked worker
+    assert store._connection() is not con
+    assert len(store) == 600
+
+
+def test_read_only_store(store):
+    store.close()
+    reader = sql_store.SQLCallStore(store.path, store.engine, read_only=True)
+    assert len(reader) == 600
+    with pytest.raises(Exception):
+        reader.insert(reader.calls_of(0))
+    reader.close()
+
+
+# Categories and the timestamp resolution may differ between backends
+def plain(df):
+    return df.astype({'TowerID': str, 'IMEI': str, 'Timestamp': 'datetime64[ns]'})
+
+
+@pytest.fixture
+def index(store):
+    from ingest import load_calls
+    df, subscribers = load_calls(os.path.splitext(store.path)[0] + '.csv')  # Ids from the store's dictionary
+    return CallIndex(df)
+
+
+@pytest.mark.parametrize('option', [1, 2, 3, 4])
+def test_select_matches_call_index(store, index, option):
+    assert list(store.days) == list(index.days) and store.max_duration == index.max_duration
+    for start, end in windows:
+        for callers, receivers in selections:
+            pd.testing.assert_frame_equal(plain(store.select(start, end, (20, 120), option, callers, receivers)),
+                                          plain(index.select(start, end, (20, 120), option, callers, receivers)))
+
+
+def test_node_queries_match_call_index(store, index):
+    pd.testing.assert_frame_equal(plain(store.calls_of(3)), plain(index.calls_of(3)))
+    np.testing.assert_array_equal(store.edges(), index.edges())
+    start, end = windows[1]
+    for column in ('Caller', 'Receiver'):
+        for got, expected in zip(store.number_counts(start, end, (0, 60), column),
+                                 index.number_counts(start, end, (0, 60), column)):
+            np.testing.assert_array_equal(got, expected)
+
+
+def test_append_matches_call_index(store, index):
+    batch = index.calls_of(5).assign(Timestamp=lambda df: df['Timestamp'] + pd.Timedelta(days=30))
+    store, index = store.append(batch), index.append(batch)
+    assert store.version == index.version == 1 and list(store.days) == list(index.days)
+    pd.testing.assert_frame_equal(plain(store.calls_of(5)), plain(index.calls_of(5)))
@@ -0,0 +1,32 @@
+import numpy as np
+from stats import meanDur, peakHours, ogIc, mostCalls, nodeStats
+from conftest import make_calls
+
+
+def test_peak_hours_call_within_the_hour():
+    # 5 minutes at 10:10 fit in what is left of the hour; an unsigned Duration must not wrap
+    df = make_calls([(9000000001, 9000000002, '01-06-2020', '10:10:00', 5, '1', '1')])
+    assert peakHours(0, df) == {10: 5, 0: 0, 1: 0}
+
+
+def test_peak_hours_spill_over_midnight():
+    df = make_calls([(9000000001, 9000000002, '01-06-2020', '23:50:00', 75, '1', '1')])
+    assert peakHours(0, df) == {0: 60, 23: 10, 1: 5}
+
+
+def test_node_stats_matches_per_node_functions(calls):
+    table = nodeStats(calls)
+    nodes = np.union1d(calls['Caller_node'], calls['Receiver_node'])
+    assert list(table.index) == list(nodes)
+    for node in nodes:
+        row = table.loc[node]
+        assert np.isclose(row['meanDur'], meanDur(node, calls))
+        peaks = peakHours(node, calls)
+        assert [(row['peakHour%d' % i], row['peakMinutes%d' % i]) for i in (1, 2, 3)] == list(peaks.items())
+        assert [row['outgoing'], row['incoming']] == ogIc(node, calls)
+        assert [row['mostCallsTo'], row['mostCallsFrom']] == mostCalls(node, calls)[:2]
+        # mostCalls restarts a total at 1 when a number first called turns up as a receiver, count directly
+        ends = calls[(calls['Caller_node'] == node) | (calls['Receiver_node'] == node)]
+        other = ends['Receiver'].where(ends['Caller_node'] == node, ends['Caller'])
+        counts = other.value_counts(sort=False)
+        assert row['mostCalls'] == counts[counts == counts.max()].index[0]
@@ -0,0 +1,17 @@
+from ingest import display_records, load_calls, cache_paths
+from query import CallIndex
+from stream import LiveData, stream_dir
+
+
+def open_live(csv):
+    df, subscribers = load_calls(csv)
+    return LiveData(CallIndex(df), subscribers, cache_paths(csv)[1], stream_dir(csv))
+
+
+def test_appended_batches_are_replayed_into_their_own_dataset_only(calls, tmp_path):
+    first, second = str(tmp_path / 'calls.csv'), str(tmp_path / 'other.csv')
+    display_records(calls).to_csv(first, index=False)
+    display_records(calls.iloc[:100]).to_csv(second, index=False)
+    assert open_live(first).append_raw(display_records(calls.iloc[:7])) == 7
+    assert len(open_live(first).calls) == len(calls) + 7  # After a restart
+    assert len(open_live(second).calls) == 100
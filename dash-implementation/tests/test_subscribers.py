@@ -0,0 +1,22 @@
+import numpy as np
+import pandas as pd
+from subscribers import SubscriberDict
+
+
+def test_ids_stay_stable_as_numbers_are_added():
+    subscribers = SubscriberDict([300, 100, 200])
+    assert list(subscribers.encode([100, 200, 300, 400])) == [1, 2, 0, -1]
+    assert list(subscribers.add([400, 100, 500, 400])) == [3, 1, 4, 3]
+    assert list(subscribers.encode([300, 100, 200])) == [0, 1, 2]
+    assert list(subscribers.decode([4, 0])) == [500, 300]
+    assert subscribers.number(3) == 400
+
+
+def test_load_or_build_extends_the_saved_dictionary(tmp_path):
+    path = str(tmp_path / 'subscribers.npy')
+    first = SubscriberDict.load_or_build(path, pd.DataFrame({'Caller': [5, 7], 'Receiver': [6, 5]}))
+    assert list(first.numbers) == [5, 6, 7]
+    second = SubscriberDict.load_or_build(path, pd.DataFrame({'Caller': [8, 6], 'Receiver': [5, 4]}))
+    assert list(second.encode([5, 6, 7])) == [0, 1, 2]
+    assert list(SubscriberDict.load(path).numbers) == list(second.numbers) == [5, 6, 7, 8, 4]
+    assert np.asarray(SubscriberDict.load(path).numbers).dtype == np.int64
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+from timeline import SlidingWindow, window_starts, max_frames
+
+
+def window_edges(df, start, end):
+    inside = df[(df['Timestamp'] >= start) & (df['Timestamp'] < end)]
+    g = inside.groupby(['Caller_node', 'Receiver_node'])['Duration'].agg(['size', 'sum'])
+    return {k: (int(v['size']), int(v['sum'])) for k, v in g.iterrows()}
+
+
+def test_sliding_window_matches_a_filter_at_every_step(calls):
+    sliding = SlidingWindow(calls)
+    starts = window_starts('2020-06-01', '2020-06-08', pd.Timedelta('6h'))
+    # Forward with overlapping windows, then jumps back and past the end
+    moves = [(s, s + pd.Timedelta('12h')) for s in starts] + \
+        [(starts[3], starts[5]), (starts[0], starts[1]), (starts[-1], starts[-1] + pd.Timedelta('2D'))]
+    for start, end in moves:
+        sliding.move(start.value, end.value)
+        src, dst, n, total = sliding.edges()
+        assert {(a, b): (c, d) for a, b, c, d in zip(src, dst, n, total)} == window_edges(calls, start, end)
+        nodes, node_calls, _ = sliding.active_nodes()
+        inside = calls[(calls['Timestamp'] >= start) & (calls['Timestamp'] < end)]
+        ends = np.concatenate([inside['Caller_node'], inside['Receiver_node']])
+        assert dict(zip(nodes, node_calls)) == dict(zip(*np.unique(ends, return_counts=True)))
+    assert sliding.nbytes > 0
+
+
+def test_window_starts_stretch_the_step_to_the_frame_limit():
+    starts = window_starts('2020-06-01', '2020-06-02', pd.Timedelta('1h'))
+    assert len(starts) == 24 and starts[1] - starts[0] == pd.Timedelta('1h')
+    starts = window_starts('2020-01-01', '2021-01-01', pd.Timedelta('1h'))
+    assert len(starts) <= max_frames and starts[-1] < pd.Timestamp('2021-01-01')
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+#### Playback Timeline ####
+# A date range played back as a sequence of sliding time windows (say an hour wide,
+# stepping an hour at a time across a week). The calls of the range are sorted by time
+# once. Moving the window only adds the calls that enter it and subtracts the ones that
+# leave it, keeping per-edge and per-node call counts and durations up to date. Every
+# window becomes one animation frame over a single layout of the whole range, so nodes
+# keep their positions while the playback moves.
+
+max_frames = 400  # Longer timelines use a wider step
+playback_options = [{'label': 'Off', 'value': 'off'},
+                    {'label': 'Hourly', 'value': '1h/1h'},
+                    {'label': 'Hourly, 6 hour window', 'value': '1h/6h'},
+                    {'label': 'Every 6 hours', 'value': '6h/6h'},
+                    {'label': 'Daily', 'value': '1D/1D'}]
+
+
+# 'step/width' option value -> (step, width) timedeltas
+def playback_window(value):
+    step, width = value.split('/')
+    return pd.Timedelta(step), pd.Timedelta(width)
+
+
+class SlidingWindow:
+    def __init__(self, df):
+        # df is in time order (CallIndex.select and SQLCallStore.select return it sorted)
+        self.ts = df['Timestamp'].to_numpy().astype('datetime64[ns]').view(np.int64)
+        src = df['Caller_node'].to_numpy(dtype=np.int64)
+        dst = df['Receiver_node'].to_numpy(dtype=np.int64)
+        self.duration = df['Duration'].to_numpy(dtype=np.int64)
+        # Every distinct (caller, receiver) pair of the range is one edge
+        self.nodes, ends = np.unique(np.concatenate([src, dst]), return_inverse=True)
+        ends = ends.ravel()
+        self.src_index, self.dst_index = ends[:len(src)], ends[len(src):]
+        pairs, self.edge = np.unique(self.src_index * len(self.nodes) + self.dst_index, return_inverse=True)
+        self.edge = self.edge.ravel()
+        self.edge_src, self.edge_dst = np.divmod(pairs, len(self.nodes))
+        self.edge_calls = np.zeros(len(pairs), dtype=np.int64)
+        self.edge_duration = np.zeros(len(pairs), dtype=np.int64)
+        self.node_calls = np.zeros(len(self.nodes), dtype=np.int64)
+        self.node_duration = np.zeros(len(self.nodes), dtype=np.int64)
+        self.lo = self.hi = 0  # Rows lo:hi are in the window
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in vars(self).values() if isinstance(a, np.ndarray))
+
+    # Add (sign 1) or subtract (sign -1) the calls of rows a:b
+    def _apply(self, a, b, sign):
+        if a >= b:
+            return
+        rows = slice(a, b)
+        np.add.at(self.edge_calls, self.edge[rows], sign)
+        np.add.at(self.edge_duration, self.edge[rows], sign * self.duration[rows])
+        for ends in (self.src_index[rows], self.dst_index[rows]):
+            np.add.at(self.node_calls, ends, sign)
+            np.add.at(self.node_duration, ends, sign * self.duration[rows])
+
+    # Move the window to start <= Timestamp < end (ns), touching only the rows between the old and new bounds.
+    # Row ranges are signed, so this also holds when the windows do not overlap or move backwards.
+    def move(self, start, end):
+        lo, hi = np.searchsorted(self.ts, [start, end], side='left')
+        if lo > self.lo:
+            self._apply(self.lo, lo, -1)
+        else:
+            self._apply(lo, self.lo, 1)
+        if hi > self.hi:
+            self._apply(self.hi, hi, 1)
+        else:
+            self._apply(hi, self.hi, -1)
+        self.lo, self.hi = int(lo), int(hi)
+
+    # Node ids of the edges with calls in the window, with their call counts and total durations
+    def edges(self):
+        active = np.flatnonzero(self.edge_calls > 0)
+        return (self.nodes[self.edge_src[active]], self.nodes[self.edge_dst[active]],
+                self.edge_calls[active], self.edge_duration[active])
+
+    # Nodes with calls in the window, with their call counts and total durations
+    def active_nodes(self):
+        active = np.flatnonzero(self.node_calls > 0)
+        return self.nodes[active], self.node_calls[active], self.node_duration[active]
+
+
+# Window starts of a playback of start <= Timestamp < end, at most max_frames of them
+def window_starts(start, end, step):
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    frames = max(int(np.ceil((end - start) / step)), 1)
+    if frames > max_frames:
+        step = step * int(np.ceil(frames / max_frames))
+        frames = max(int(np.ceil((end - start) / step)), 1)
+    return [start + i * step for i in range(frames)]
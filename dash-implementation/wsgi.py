@@ -0,0 +1,22 @@
+import os
+import tempfile
+
+#### Production Server ####
+# Multi-worker serving with gunicorn, run from this directory:
+#
+#   gunicorn -c gunicorn.conf.py wsgi:server
+#
+# gunicorn.conf.py preloads this module in the master, so the dataset is loaded once and
+# the forked workers share its memory copy-on-write (the Feather cache is memory-mapped,
+# so its pages are shared through the page cache as well). Filter results and layouts go
+# to a shared cache directory, so a request can land on any worker; so do the layout jobs in
+# progress, so a worker polling for a layout another one computes waits for it (layout.py).
+# Live ingestion (CDR_SPOOL, CDR_STREAM_PORT) is only started by the development server;
+# here the app does not poll for new calls and opens a database backend read-only.
+
+os.environ.setdefault('CDR_SHARED_CACHE', os.path.join(tempfile.gettempdir(), 'cdr-viz-cache'))
+os.environ['CDR_WSGI'] = '1'
+
+from dash_script import app
+
+server = app.server
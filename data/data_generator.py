@@ -1,72 +1,137 @@
-import random
-import os
-import csv
-import time
+import argparse
+import numpy as np
+import pandas as pd
+
+# Synthetic CDR generator. Rows are drawn with NumPy in chunks and streamed to CSV or
+# Parquet, so the size of a dataset is only bounded by disk space. The same seed and
+# options always give the same dataset. The chunk size is one of those options: rows are
+# drawn a chunk at a time, so another --chunk gives another dataset from the same seed.
+#
+#   python data_generator.py -n 1000 -o data.csv
+#   python data_generator.py -n 100000000 --subscribers 2000000 -o calls.parquet
 
 n=1000 #records
 start_date="1-6-2020"
 start_time="1:30:45"
 end_date="20-6-2020"
 end_time="21:30:55"
-towerIDS=list(range(100,999))
+towerIDS=np.arange(100,999)
 
+fields=["Caller","Receiver","Date","Time","Duration","TowerID","IMEI"]
 
+# Relative call volume per hour of the day: quiet nights, busy evenings
+diurnal_profile=np.array([2,1,1,1,1,2,4,7,9,10,10,10,10,10,9,9,10,11,12,12,11,9,6,4],dtype=float)
 
 
+class Subscribers:
+    def __init__(self,rng,count,communities,alpha,shared_imei):
+        # Unique 10 digit numbers
+        numbers=np.unique(rng.integers(7000000000,10000000000,size=count+count//10+10))
+        self.numbers=rng.permutation(numbers)[:count]
+        # Power law activity: a few subscribers make most of the calls
+        self.activity=rng.pareto(alpha,size=count)+1
+        # Subscribers ordered by community, with the cumulative activity used for sampling
+        self.community=np.sort(rng.integers(0,communities,size=count))
+        self.cdf=np.cumsum(self.activity)
+        bounds=np.searchsorted(self.community,np.arange(communities+1))
+        cdf0=np.concatenate([[0.],self.cdf])
+        self.low,self.high=cdf0[bounds[:-1]],cdf0[bounds[1:]]
+        # Each community lives around a band of towers
+        self.home_tower=towerIDS[(self.community*len(towerIDS))//communities+rng.integers(0,max(len(towerIDS)//communities,1),size=count)]
+        # One handset per subscriber, a few handsets shared between subscribers
+        self.imei=rng.integers(10**14,10**15,size=count)
+        shared=rng.random(count)<shared_imei
+        self.imei[shared]=self.imei[rng.integers(0,count,size=int(shared.sum()))]
 
-start=start_date+" "+start_time
-end=end_date+" "+end_time
-def str_time_prop(start, end, format, prop):
-    stime = time.mktime(time.strptime(start, format))
-    etime = time.mktime(time.strptime(end, format))
-    ptime = stime + prop * (etime - stime)
-    return time.localtime(ptime)
+    def __len__(self):
+        return len(self.numbers)
 
+    # Subscribers drawn in proportion to their activity, restricted to communities if given
+    def sample(self,rng,size,communities=None):
+        if communities is None:
+            u=rng.random(size)*self.cdf[-1]
+        else:
+            u=self.low[communities]+rng.random(size)*(self.high[communities]-self.low[communities])
+        return np.minimum(np.searchsorted(self.cdf,u,side='right'),len(self)-1)
 
-def random_date(start, end, prop):
-    return str_time_prop(start, end, '%d-%m-%Y %H:%M:%S', prop)
-def getDate(t):
-    return time.strftime("%d-%m-%Y",t)
-def getTime(t):
-    return time.strftime("%H:%M:%S",t)    
 
-fields=["Caller","Receiver","Date","Time","Duration","TowerID","IMEI"]
-def phoneNumber():
-    return random.randint(7000000000,9999999999)
-def imei():
-    tmp=""
-    for i in range(15):
-        x=random.randint(0,9)
-        tmp+=str(x)
-    return tmp
+# Yields DataFrames of at most chunk rows with the columns of data.csv
+def generate(n,subscribers=None,seed=0,start=None,end=None,communities=None,alpha=2.0,
+             p_community=0.8,mobility=0.1,shared_imei=0.01,max_duration=100,chunk=10**6):
+    rng=np.random.default_rng(seed)
+    subscribers=subscribers or max(int(n/5),2)
+    communities=communities or max(subscribers//50,1)
+    subs=Subscribers(rng,subscribers,communities,alpha,shared_imei)
+    start=pd.to_datetime(start or start_date+" "+start_time,dayfirst=True)
+    end=pd.to_datetime(end or end_date+" "+end_time,dayfirst=True)
+    first_day=start.normalize()
+    days=pd.date_range(first_day,end.normalize(),freq='D')
+    day_str=np.array(days.strftime("%d-%m-%Y"))
+    seconds=np.arange(86400)
+    time_str=np.array(["%02d:%02d:%02d"%(h,m,s) for h,m,s in zip(seconds//3600,seconds//60%60,seconds%60)])
+    lo=int((start-first_day).total_seconds())
+    hi=int((end-first_day).total_seconds())
+    hour_p=diurnal_profile/diurnal_profile.sum()
+
+    for offset in range(0,n,chunk):
+        size=min(chunk,n-offset)
+        caller=subs.sample(rng,size)
+        # Mostly call within the own community
+        local=rng.random(size)<p_community
+        receiver=np.where(local,subs.sample(rng,size,subs.community[caller]),subs.sample(rng,size))
+        receiver=np.where(receiver==caller,(receiver+1)%len(subs),receiver)
+        # Call time: uniform day, hour from the diurnal profile, redrawn until inside [start, end]
+        t=np.full(size,-1)
+        todo=np.arange(size)
+        while len(todo):
+            s=rng.integers(0,len(days),size=len(todo))*86400+rng.choice(24,size=len(todo),p=hour_p)*3600+rng.integers(0,3600,size=len(todo))
+            t[todo]=s
+            todo=todo[(s<lo)|(s>hi)]
+        # Mostly connect through the home tower
+        tower=np.where(rng.random(size)<mobility,rng.choice(towerIDS,size=size),subs.home_tower[caller])
+        yield pd.DataFrame({"Caller":subs.numbers[caller],
+                            "Receiver":subs.numbers[receiver],
+                            "Date":day_str[t//86400],
+                            "Time":time_str[t%86400],
+                            "Duration":rng.integers(1,max_duration+1,size=size),
+                            "TowerID":tower,
+                            "IMEI":subs.imei[caller]},columns=fields)
+
 
-nums=[]
-calls=[]
-for i in range(int(n/5)):
-    nums.append(phoneNumber())
-for x in nums:
-    num_calls=random.randint(0,10)
-    while(num_calls):
-        y=random.choice(nums)
-        if(y!=x):
-            num_calls-=1
-            calls.append([x,y])
+# Stream the generated chunks to path, as Parquet if path ends with .parquet else as CSV
+def write(path,n,**options):
+    if path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer=None
+        for df in generate(n,**options):
+            table=pa.Table.from_pandas(df,preserve_index=False)
+            if writer is None:
+                writer=pq.ParquetWriter(path,table.schema)
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+    else:
+        with open(path,'w',newline='') as file:
+            for i,df in enumerate(generate(n,**options)):
+                df.to_csv(file,header=i==0,index=False)
 
-for i in range(len(calls)):
-    t=random_date(start,end,random.random())
-    calls[i].append(getDate(t))
-    calls[i].append(getTime(t))
-    calls[i].append(random.randint(1,100))
-    calls[i].append(random.choice(towerIDS))
-    calls[i].append(imei())
-print(calls)
-print(len(calls))
 
-with open('data.csv','w',newline='') as file:
-    writer=csv.DictWriter(file,fieldnames=fields)
-    writer.writeheader()
-    for i in range(len(calls)):
-        tmp={}
-        for j in range(len(fields)):
-            tmp[fields[j]]=calls[i][j]
-        writer.writerow(tmp)
+if __name__=='__main__':
+    parser=argparse.ArgumentParser(description='Generate synthetic call data records')
+    parser.add_argument('-n','--records',type=int,default=n)
+    parser.add_argument('-o','--output',default='data.csv',help='.csv or .parquet')
+    parser.add_argument('--seed',type=int,default=0)
+    parser.add_argument('--subscribers',type=int,help='default: records/5')
+    parser.add_argument('--communities',type=int,help='default: subscribers/50')
+    parser.add_argument('--alpha',type=float,default=2.0,help='power law exponent of subscriber activity')
+    parser.add_argument('--p-community',type=float,default=0.8,help='probability of calling within the community')
+    parser.add_argument('--mobility',type=float,default=0.1,help='probability of a call away from the home tower')
+    parser.add_argument('--shared-imei',type=float,default=0.01,help='fraction of subscribers sharing a handset')
+    parser.add_argument('--start',help='first call time, default '+start_date+' '+start_time)
+    parser.add_argument('--end',help='last call time, default '+end_date+' '+end_time)
+    parser.add_argument('--chunk',type=int,default=10**6,help='rows generated and written at a time (changes the dataset, like the seed)')
+    args=parser.parse_args()
+    write(args.output,args.records,seed=args.seed,subscribers=args.subscribers,communities=args.communities,
+          alpha=args.alpha,p_community=args.p_community,mobility=args.mobility,shared_imei=args.shared_imei,
+          start=args.start,end=args.end,chunk=args.chunk)